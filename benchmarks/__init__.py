@@ -0,0 +1,7 @@
+"""
+benchmarks: performance measurements for `rematch`.
+
+Run the suite with `python -m benchmarks` from the repository root; see
+`python -m benchmarks --help`.  Results are printed as a table and can be
+written out as JSON to track regressions between releases.
+"""
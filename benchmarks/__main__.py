@@ -0,0 +1,157 @@
+"""
+Run the benchmark suite: `python -m benchmarks [--output results.json]`.
+
+For every workload and engine mode this records
+    compile latency: the time to build a Regex, split into parse, patch and
+                     lower, and the peak memory allocated while doing so
+    match throughput: characters matched per second (best of --repeat runs,
+                      with lazy DFA caches warm), next to stdlib `re` where
+                      the syntax overlaps
+and, for generated patterns of growing length, the time each compile phase
+takes per token (see `scaling`).
+"""
+
+import json
+import platform
+import re
+import sys
+import tracemalloc
+from argparse import ArgumentParser
+from time import perf_counter
+
+import rematch
+from rematch import Regex, parse, patch, lower
+
+from .scaling import measure_scaling
+from .workloads import workloads
+
+MODES = ('lazy', 'dfa', 'nfa', 'codegen', 'glushkov')
+
+
+def best_time(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        began = perf_counter()
+        func()
+        best = min(best, perf_counter() - began)
+    return best
+
+
+def measure_compile(pattern, mode, repeat):
+    tree = parse(pattern)
+    nfa = patch(tree)
+    phases = {
+        'parse_s': best_time(lambda: parse(pattern), repeat),
+        'patch_s': best_time(lambda: patch(tree), repeat),
+        'lower_s': best_time(lambda: lower(*nfa), repeat),
+        'compile_s': best_time(lambda: Regex(pattern, mode=mode), repeat),
+    }
+    tracemalloc.start()
+    Regex(pattern, mode=mode)
+    phases['compile_peak_bytes'] = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return phases
+
+
+def measure_match(workload, mode, repeat):
+    RE = Regex(workload.pattern, mode=mode)
+    inputs = workload.inputs
+    run = RE.search if workload.kind == 'search' else RE
+    chars = sum(map(len, inputs))
+
+    def match_all():
+        for string in inputs:
+            run(string)
+    match_all()
+    elapsed = best_time(match_all, repeat)
+    tracemalloc.start()
+    match_all()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'chars': chars, 'match_s': elapsed,
+            'chars_per_s': chars / elapsed if elapsed else None,
+            'match_peak_bytes': peak}
+
+
+def measure_re(workload, repeat):
+    if workload.re_pattern is None:
+        return None
+    compiled = re.compile(workload.re_pattern)
+    run = compiled.search if workload.kind == 'search' else compiled.fullmatch
+    chars = sum(map(len, workload.inputs))
+
+    def match_all():
+        for string in workload.inputs:
+            run(string)
+    elapsed = best_time(match_all, repeat)
+    return chars / elapsed if elapsed else None
+
+
+def get_args(argv=None):
+    parser = ArgumentParser(prog='python -m benchmarks',
+                            description='rematch benchmark suite')
+    parser.add_argument('--output', '-o', metavar='FILE',
+                        help='write the results as JSON to FILE')
+    parser.add_argument('--filter', '-k', default='',
+                        help='only run workloads whose name contains this')
+    parser.add_argument('--modes', nargs='+', default=MODES, choices=MODES)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--quick', action='store_true',
+                        help='shrink every input for a fast smoke run')
+    parser.add_argument('--no-scaling', dest='scaling', action='store_false',
+                        help='skip the compile time scaling measurements')
+    return parser.parse_args(argv)
+
+
+def run(args):
+    results = []
+    for workload in workloads(scale=0.05 if args.quick else 1.0):
+        if args.filter not in workload.name:
+            continue
+        re_rate = measure_re(workload, args.repeat)
+        for mode in args.modes:
+            result = {'workload': workload.name, 'mode': mode,
+                      'kind': workload.kind, 're_chars_per_s': re_rate}
+            try:
+                result.update(measure_compile(workload.pattern, mode,
+                                              args.repeat))
+                result.update(measure_match(workload, mode, args.repeat))
+            except rematch.DFASizeError as err:
+                result['error'] = str(err)
+            results.append(result)
+            report(result)
+    scaling = []
+    if args.scaling:
+        sizes = (1000, 10000) if args.quick else (1000, 10000, 100000)
+        for result in measure_scaling(sizes):
+            print('{kind:<16} {tokens:>7} tokens  compile {compile_s:9.4f}s '
+                  '{us_per_token:7.2f} us/token'.format(**result))
+            scaling.append(result)
+    return {'rematch_version': rematch.__version__,
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'results': results, 'scaling': scaling}
+
+
+def report(result):
+    if 'error' in result:
+        print('{workload:<16} {mode:<8} error: {error}'.format(**result))
+        return
+    line = ('{workload:<16} {mode:<8} compile {compile_s:9.6f}s '
+            '{compile_peak_bytes:>9}B  {chars_per_s:>12,.0f} chars/s')
+    if result['re_chars_per_s']:
+        line += '  (re: {re_chars_per_s:,.0f})'
+    print(line.format(**result))
+    sys.stdout.flush()
+
+
+def main(argv=None):
+    args = get_args(argv)
+    summary = run(args)
+    if args.output:
+        with open(args.output, 'w') as fp:
+            json.dump(summary, fp, indent=2)
+
+
+if __name__ == '__main__':
+    main()
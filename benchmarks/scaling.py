@@ -0,0 +1,54 @@
+"""
+scaling.py: how compile time grows with the length of the pattern.
+
+Generated patterns of increasing size are compiled phase by phase; the time
+per token should stay flat if every phase is linear.
+"""
+
+import random
+from time import perf_counter
+
+from rematch import Regex, parse, patch, lower
+from rematch.prefilter import prefilter
+
+
+def generated(kind, tokens, rng):
+    """ A pattern of about `tokens` tokens of the given kind. """
+    if kind == 'literal':
+        return ''.join(rng.choice('abcdefgh') for _ in range(tokens))
+    if kind == 'alternation':
+        return '|'.join(''.join(rng.choice('abcdefgh') for _ in range(5))
+                        for _ in range(tokens // 6))
+    if kind == 'nested':
+        depth = tokens // 3
+        return '(' * depth + 'a' + ')*' * depth
+    raise ValueError('unknown pattern kind {!r}'.format(kind))
+
+
+KINDS = ('literal', 'alternation', 'nested')
+
+
+def measure_scaling(sizes, kinds=KINDS):
+    rng = random.Random(2016)
+    results = []
+    for kind in kinds:
+        for tokens in sizes:
+            pattern = generated(kind, tokens, rng)
+            began = perf_counter()
+            tree = parse(pattern)
+            parsed = perf_counter()
+            prefilter(tree)
+            filtered = perf_counter()
+            nfa = patch(tree)
+            patched = perf_counter()
+            lower(*nfa)
+            lowered = perf_counter()
+            Regex(pattern)
+            total = perf_counter() - lowered
+            results.append({
+                'kind': kind, 'tokens': len(pattern),
+                'parse_s': parsed - began, 'prefilter_s': filtered - parsed,
+                'patch_s': patched - filtered, 'lower_s': lowered - patched,
+                'compile_s': total,
+                'us_per_token': 1e6 * total / len(pattern)})
+    return results
@@ -0,0 +1,96 @@
+"""
+threads.py: how matching throughput scales with the number of threads that
+share one Regex: `python -m benchmarks.threads [--threads 1 2 4 8]`.
+
+Every thread matches its own slice of the inputs against the same Regex
+object, as the worker threads of a server would.  Under the GIL the threads
+take turns, so the throughput stays flat at best; on a free-threaded build
+of CPython (3.13t and later) it should grow with the thread count, up to the
+number of cores, since matching takes no lock.
+"""
+
+import os
+import random
+import sys
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from threading import Barrier
+from time import perf_counter
+
+from rematch import Regex
+
+MODES = ('lazy', 'dfa', 'codegen', 'glushkov')
+PATTERN = '.*(error|warn(ing)?).*[0-9]+ms.*'
+
+
+def gil_enabled():
+    """ False on a free-threaded interpreter running without the GIL. """
+    is_enabled = getattr(sys, '_is_gil_enabled', None)
+    return True if is_enabled is None else is_enabled()
+
+
+def lines(count, rng):
+    words = ['request', 'error', 'warning', 'ok', 'served', 'in', '12ms',
+             'user', 'timeout', '/index.html', '200', '503']
+    return [' '.join(rng.choice(words) for _ in range(rng.randrange(5, 20)))
+            for _ in range(count)]
+
+
+def measure_threads(mode, threads, inputs, repeat=3, pattern=PATTERN):
+    """ The best throughput, in characters per second, of `threads` threads
+    matching `inputs` between them against one shared Regex.
+    """
+    regex = Regex(pattern, mode=mode)
+    # warm the lazy DFA's cache, so the threads measure matching alone
+    for string in inputs:
+        regex(string)
+    slices = [inputs[number::threads] for number in range(threads)]
+    chars = sum(map(len, inputs))
+    best = float('inf')
+    with ThreadPoolExecutor(threads) as pool:
+        for _ in range(repeat):
+            barrier = Barrier(threads)
+
+            def match_slice(strings):
+                barrier.wait()
+                began = perf_counter()
+                for string in strings:
+                    regex(string)
+                return began, perf_counter()
+            futures = [pool.submit(match_slice, strings) for strings in slices]
+            times = [future.result() for future in futures]
+            best = min(best, max(end for _, end in times) -
+                       min(began for began, _ in times))
+    return chars / best if best else None
+
+
+def get_args(argv=None):
+    parser = ArgumentParser(prog='python -m benchmarks.threads',
+                            description='shared Regex throughput by thread '
+                                        'count')
+    parser.add_argument('--threads', type=int, nargs='+',
+                        default=(1, 2, 4, 8))
+    parser.add_argument('--modes', nargs='+', default=MODES, choices=MODES)
+    parser.add_argument('--lines', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=3)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = get_args(argv)
+    inputs = lines(args.lines, random.Random(2016))
+    print('python {}, GIL {}, {} CPUs'.format(
+        sys.version.split()[0], 'enabled' if gil_enabled() else 'disabled',
+        os.cpu_count()))
+    for mode in args.modes:
+        base = None
+        for threads in args.threads:
+            rate = measure_threads(mode, threads, inputs, args.repeat)
+            base = base or rate
+            print('{:<8} {:>3} threads {:>12,.0f} chars/s  x{:.2f}'.format(
+                mode, threads, rate, rate / base))
+            sys.stdout.flush()
+
+
+if __name__ == '__main__':
+    main()
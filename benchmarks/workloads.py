@@ -0,0 +1,75 @@
+"""
+workloads.py: the representative patterns and inputs the suite measures.
+
+Each Workload pairs a rematch pattern with the inputs it is run against and,
+where the syntax overlaps, the equivalent stdlib `re` pattern.  Inputs are
+generated from a fixed seed so runs are comparable.
+"""
+
+import random
+from collections import namedtuple
+
+Workload = namedtuple('Workload', 'name pattern inputs kind re_pattern')
+Workload.__doc__ = """ A pattern and the inputs to time it on.
+
+Attributes:
+    name (str): a short identifier
+    pattern (str): the rematch pattern
+    inputs (list): the strings to match
+    kind (str): 'match' for whole string matching (`Regex.__call__`), or
+                'search' for `Regex.search`
+    re_pattern (str or None): the same language in `re` syntax, if any
+"""
+
+WORDS = ('error warning timeout connection refused reset user admin login '
+         'session token expired denied granted request response status '
+         'server client upstream downstream cache miss hit retry').split()
+
+
+def log_lines(rng, count, width=80):
+    lines = []
+    for _ in range(count):
+        words = []
+        while sum(map(len, words)) + len(words) < width:
+            words.append(rng.choice(WORDS))
+        lines.append(' '.join(words)[:width])
+    return lines
+
+
+def workloads(scale=1.0):
+    """ Build the list of Workloads.
+
+    Arguments:
+        scale (float): multiplies the size of every input, so that a quick
+                       smoke run (`--quick`) and a full run share the code
+    """
+    rng = random.Random(2016)
+    lines = log_lines(rng, int(2000 * scale))
+    n = 16
+    alternatives = ['{}{}'.format(word, i) for i in range(4)
+                    for word in WORDS]
+    long_text = ''.join(rng.choice('ab') for _ in range(int(200000 * scale)))
+    blocklist = ['{}-{:05d}'.format(rng.choice(WORDS), i)
+                 for i in range(int(20000 * scale))]
+    return [
+        Workload('literal', 'error.*timeout', lines, 'match',
+                 'error.*timeout'),
+        Workload('literal-search', 'timeout', lines, 'search', 'timeout'),
+        Workload('alternation', '|'.join(alternatives),
+                 [rng.choice(alternatives + WORDS) for _ in
+                  range(int(2000 * scale))], 'match', '|'.join(alternatives)),
+        Workload('blocklist-search', '|'.join(blocklist),
+                 [line + ' ' + rng.choice(blocklist) for line in lines],
+                 'search', '|'.join(blocklist)),
+        Workload('nested-stars', '((a*)*b*)*c', ['ab' * 20 + 'c', 'ab' * 20],
+                 'match', None),
+        # (a?){n}a{n} against a{n}: exponential for backtracking engines
+        Workload('pathological', '(a?){{{0}}}a{{{0}}}'.format(n), ['a' * n],
+                 'match', '(a?){{{0}}}a{{{0}}}'.format(n)),
+        Workload('counted', r'[a-z]{1,64}\d{3,}', ['x' * 60 + '1234'] * 200,
+                 'match', r'[a-z]{1,64}\d{3,}'),
+        Workload('long-input', '(a|b)*abb(a|b)*', [long_text + 'abb'],
+                 'match', '(a|b)*abb(a|b)*'),
+        Workload('long-search', 'bbbbbbbbbbbbbbbbbbbba', [long_text],
+                 'search', 'bbbbbbbbbbbbbbbbbbbba'),
+    ]
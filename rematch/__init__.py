@@ -1,6 +1,21 @@
 __version__ = '1.0.dev0'
 
-from .parser import (LiteralExpr, NullString, StarExpr, ChoiceExpr, ConcatExpr,
-                     TreeNode, parse, walk_tree, level_first_walk)
+from .parser import (LiteralExpr, StringExpr, TrieExpr, NullString,
+                     StarExpr, ChoiceExpr, ConcatExpr, DotExpr, CharClassExpr,
+                     RepeatExpr, GroupExpr, TreeNode, parse, walk_tree,
+                     level_first_walk)
+from .charset import CharSet
 from .patcher import State, Arrow, DotArrow, Epsilon, patch
-from .regex import Regex, transition, E_set, partition
+from .regex import Regex, Match, transition, E_set, partition
+from .dfa import LazyDFA, DFA, DFASizeError
+from .alphabet import Alphabet
+from .trie import Trie
+from .compact import Program, lower
+from .pike import PikeVM
+from .glushkov import Glushkov
+from .cache import (compile, match, fullmatch, search, finditer, findall,
+                    purge, cache_info)
+from .regexset import RegexSet
+from .bundle import Bundle, write_bundle
+from .stream import Stream
+from .stats import Stats
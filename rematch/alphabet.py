@@ -0,0 +1,128 @@
+"""
+alphabet.py: partition the input alphabet into equivalence classes.
+
+A DFA over the whole of unicode would need a column per code point.  Instead
+the code points are split into intervals at every boundary that some arrow
+label in the automaton cares about, and intervals that every label treats the
+same way are merged into a single class.  Any two characters of the same
+class take the same transition out of every state, so tables only need one
+column per class.
+
+The engines never see characters, only integer codes: the code points of a
+`str`, or the byte values of a bytes-like object (`codes` and `code_array`
+convert inputs without copying bytes).
+"""
+
+from array import array
+from bisect import bisect_right
+
+MAX_CODE = 0x10ffff
+
+
+def codes(data):
+    """ Iterate over the codes of `data`.
+
+    Arguments:
+        data: a `str`, or anything supporting the buffer protocol (`bytes`,
+              `bytearray`, `memoryview`, `mmap.mmap`, ...)
+
+    Returns:
+        an iterable of ints: code points for a str, byte values otherwise
+    """
+    if isinstance(data, str):
+        return map(ord, data)
+    if isinstance(data, (bytes, bytearray)):
+        return data
+    return memoryview(data).cast('B')
+
+
+def code_array(data):
+    """ Like `codes`, but the result supports indexing.
+
+    A str is re-encoded as UTF-32 so that its code points can be indexed
+    without a Python level loop; bytes-like objects are used in place.
+    """
+    if isinstance(data, str):
+        encoded = data.encode('utf-32-le', 'surrogatepass')
+        return memoryview(encoded).cast('I')
+    if isinstance(data, (bytes, bytearray)):
+        return data
+    return memoryview(data).cast('B')
+
+
+class Alphabet(object):
+    """ The equivalence classes of characters for a set of arrow labels.
+
+    Class 0 always holds the characters no label mentions explicitly (the
+    characters that only '.' can match).
+
+    Arguments:
+        labels (iterable): each label is an iterable of `(lo, hi)` inclusive
+                           code point ranges that the label matches
+
+    Attributes:
+        bounds (list): the sorted first code point of every interval
+        interval_class (list): the class of every interval
+        representatives (list): one code belonging to every class
+        byte_classes (bytes or array): the class of each of the 256 byte
+                                       values: bytes if there are at most
+                                       256 classes, else an array of ints
+                                       (a bytes pattern that names every
+                                       byte has 257, counting class 0)
+    """
+    def __init__(self, labels):
+        labels = [list(spans) for spans in labels]
+        bounds = {0}
+        for spans in labels:
+            for lo, hi in spans:
+                bounds.add(lo)
+                if hi < MAX_CODE:
+                    bounds.add(hi + 1)
+        self.bounds = sorted(bounds)
+
+        signatures = [set() for _ in self.bounds]
+        for index, spans in enumerate(labels):
+            for lo, hi in spans:
+                first = bisect_right(self.bounds, lo) - 1
+                last = bisect_right(self.bounds, hi)
+                for interval in range(first, last):
+                    signatures[interval].add(index)
+
+        classes = {frozenset(): 0}
+        self.representatives = [None]
+        self.interval_class = []
+        for lo, signature in zip(self.bounds, signatures):
+            signature = frozenset(signature)
+            cls = classes.get(signature)
+            if cls is None:
+                cls = classes[signature] = len(classes)
+                self.representatives.append(lo)
+            elif self.representatives[cls] is None:
+                self.representatives[cls] = lo
+            self.interval_class.append(cls)
+        if self.representatives[0] is None:
+            # every character is mentioned by some label, so nothing ever
+            # falls in class 0; keep a representative for it anyway
+            self.representatives[0] = self.representatives[-1]
+        self._memo = {}
+        byte_classes = [self(code) for code in range(256)]
+        if len(self.representatives) <= 256:
+            self.byte_classes = bytes(byte_classes)
+        else:
+            self.byte_classes = array('I', byte_classes)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_memo'] = {}
+        return state
+
+    def __len__(self):
+        return len(self.representatives)
+
+    def __call__(self, code):
+        """ Return the class of the character (or byte) `code`. """
+        cls = self._memo.get(code)
+        if cls is None:
+            interval = bisect_right(self.bounds, code) - 1
+            cls = self._memo[code] = self.interval_class[interval]
+        return cls
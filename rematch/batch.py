@@ -0,0 +1,58 @@
+"""
+batch.py: match one pattern against a large batch of strings on a process
+pool.
+
+Each worker process receives the compiled Regex once, through the pool
+initializer, as its compact pickle (the `compact.Program` tables -- see
+`Regex.__getstate__`); after that only the strings and the results cross
+process boundaries.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, islice
+
+DEFAULT_CHUNKSIZE = 1024
+
+_worker_regex = None
+
+
+def _init_worker(regex):
+    global _worker_regex
+    _worker_regex = regex
+
+
+def _match_chunk(strings):
+    return [_worker_regex(string) for string in strings]
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    chunk = list(islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, size))
+
+
+def match_many(regex, strings, workers=None, chunksize=DEFAULT_CHUNKSIZE):
+    """ Match `regex` against every string in `strings`.
+
+    Arguments:
+        regex (Regex): the compiled pattern
+        strings (iterable): the inputs
+        workers (int): the number of worker processes; defaults to the number
+                       of CPUs.  With a single worker the strings are matched
+                       in this process, without a pool.
+        chunksize (int): the number of strings sent to a worker at a time
+
+    Returns:
+        list: a bool for each string, in order
+    """
+    if chunksize < 1:
+        raise ValueError('chunksize must be positive, got {}'
+                         .format(chunksize))
+    if workers == 1:
+        return [regex(string) for string in strings]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(regex,)) as pool:
+        results = pool.map(_match_chunk, _chunks(strings, chunksize))
+        return list(chain.from_iterable(results))
@@ -0,0 +1,389 @@
+"""
+bundle.py: save compiled patterns in a binary file, and load them back
+without parsing or patching them again.
+
+`dumps` turns a Regex into a record: a short JSON header with the pattern,
+its options and prefilter literals, followed by the tables of its
+`compact.Program` (with the epsilon closures already computed) and of its
+full `dfa.DFA` if one was built, as little-endian 32 bit integers.
+
+A bundle file holds many records and an index of them.  `Bundle` maps the
+file into memory and decodes a record the first time it is asked for, so
+opening even a large bundle costs almost nothing.  The NFA tables of a
+decoded pattern are memoryviews over the mapping rather than copies, so
+processes forked after a bundle is opened share its pages.
+
+Record layout (offsets relative to the start of the record):
+
+    magic b'RMXR', format version (u16), reserved (u16), header size (u32)
+    the JSON header, padded with spaces to a multiple of 4 bytes
+    the tables, each a run of int32s (int8s for the arrow kinds) padded to
+        a multiple of 4 bytes; the header gives their offsets, from the end
+        of the header, and lengths
+
+Bundle layout:
+
+    magic b'RMXB', format version (u16), reserved (u16), count (u32),
+        index offset (u64)
+    the records, each starting at a multiple of 8
+    the index: for each record its offset and size (u64 each), the offset
+        (u64) and size (u32) of its key, and its flags (u32: 1 for a bytes
+        pattern); the keys (the patterns, UTF-8 or raw bytes) follow the
+        index
+"""
+
+import json
+import mmap
+import struct
+import sys
+import threading
+from array import array
+
+from .alphabet import Alphabet
+from .charset import CharSet
+from .compact import Program
+from .dfa import DFA
+from .regex import Regex
+from .trie import Trie
+
+VERSION = 1
+RECORD_MAGIC = b'RMXR'
+BUNDLE_MAGIC = b'RMXB'
+RECORD_HEADER = struct.Struct('<4sHHI')
+BUNDLE_HEADER = struct.Struct('<4sHHIQ')
+INDEX_ENTRY = struct.Struct('<QQQII')
+BYTES_FLAG = 1
+
+# the Program tables stored in every record, in order
+TABLES = ('accept', 'index', 'kinds', 'labels', 'targets', 'eps_index',
+          'eps_targets')
+# tables can be used in place on little-endian machines only
+IN_PLACE = sys.byteorder == 'little'
+
+
+def _pad(data, size):
+    return data + b' ' * (-len(data) % size)
+
+
+def _text(value, byte_mode):
+    return value.decode('latin-1') if byte_mode else value
+
+
+def _data(value, byte_mode):
+    return value.encode('latin-1') if byte_mode else value
+
+
+def _flatten(closure):
+    """ The closures of a Program as two flat tables: the slice of `targets`
+    holding each state's closure, and `targets`.  States without a closure
+    have an empty slice marked by a -1 end.
+    """
+    index, targets = array('i', [0]), array('i')
+    for states in closure:
+        if states is None:
+            index.append(-1)
+        else:
+            targets.extend(states)
+            index.append(len(targets))
+    return index, targets
+
+
+def dumps(regex):
+    """ Serialize a compiled Regex.
+
+    Arguments:
+        regex (Regex): the pattern; its full DFA is included if it was built
+                       (always, in 'dfa' and 'codegen' modes)
+
+    Returns:
+        bytes: the record
+    """
+    program = regex.program
+    byte_mode = regex.byte_mode
+    tables = [(name, 'b' if name == 'kinds' else 'i',
+               getattr(program, name)) for name in TABLES]
+    closure_index, closure_targets = _flatten(program.closure)
+    tables.append(('closure_index', 'i', closure_index))
+    tables.append(('closure_targets', 'i', closure_targets))
+    header = {
+        'pattern': _text(regex.pattern, byte_mode),
+        'byte_mode': byte_mode,
+        'mode': regex.mode,
+        'cache_size': regex.cache_size,
+        'max_states': regex.max_states,
+        'optimize': (regex.optimize if isinstance(regex.optimize, bool)
+                     else sorted(regex.optimize)),
+        'required': [_text(literal, byte_mode) for literal in regex.required],
+        'prefix': _text(regex.prefix, byte_mode),
+        'trie': None if regex.trie is None else list(regex.trie.words),
+        'start': program.start,
+        'classes': [charset.spans for charset in program.classes],
+        'dfa': None,
+    }
+    dfa = regex._full_dfa
+    if dfa is not None:
+        header['dfa'] = {'accepting': [bool(value)
+                                       for value in dfa.accepting],
+                         'start': dfa.start, 'dead': dfa.dead,
+                         'build_time': dfa.build_time,
+                         'subset_states': dfa.subset_states}
+        tables.append(('dfa_table', 'i', dfa.table))
+
+    blobs = []
+    layout = header['tables'] = {}
+    offset = 0
+    for name, typecode, table in tables:
+        blob = array(typecode, table)
+        if not IN_PLACE:
+            blob.byteswap()
+        blob = _pad(blob.tobytes(), 4)
+        layout[name] = [offset, len(table)]
+        offset += len(blob)
+        blobs.append(blob)
+    encoded = _pad(json.dumps(header, separators=(',', ':')).encode('utf-8'),
+                   4)
+    return b''.join([RECORD_HEADER.pack(RECORD_MAGIC, VERSION, 0,
+                                        len(encoded)), encoded] + blobs)
+
+
+def loads(data):
+    """ Decode a record made by `dumps` back into a Regex.
+
+    Arguments:
+        data (bytes-like): the record; if it is a memoryview (such as a slice
+                           of a mapped bundle) the NFA tables are used in
+                           place, without copying
+
+    Returns:
+        Regex: the compiled pattern, ready to match
+
+    Raises:
+        ValueError: if `data` isn't a record of a supported version
+    """
+    view = memoryview(data)
+    if len(view) < RECORD_HEADER.size:
+        raise ValueError('not a compiled rematch pattern')
+    magic, version, _, size = RECORD_HEADER.unpack_from(view)
+    if magic != RECORD_MAGIC:
+        raise ValueError('not a compiled rematch pattern')
+    if version != VERSION:
+        raise ValueError('unsupported compiled pattern format version {}'
+                         .format(version))
+    start = RECORD_HEADER.size
+    header = json.loads(bytes(view[start:start + size]).decode('utf-8'))
+    layout = header['tables']
+    start += size
+
+    def table(name):
+        offset, length = layout[name]
+        offset += start
+        typecode = 'b' if name == 'kinds' else 'i'
+        width = 1 if typecode == 'b' else 4
+        chunk = view[offset:offset + length * width]
+        if IN_PLACE:
+            return chunk.cast(typecode)
+        result = array(typecode, bytes(chunk))
+        result.byteswap()
+        return result
+
+    closure_index = table('closure_index')
+    closure_targets = table('closure_targets')
+    closure = []
+    begin = 0
+    for end in closure_index[1:]:
+        if end < 0:
+            closure.append(None)
+        else:
+            closure.append(tuple(closure_targets[begin:end]))
+            begin = end
+    classes = [CharSet(spans) for spans in header['classes']]
+    program = Program(header['start'], *([table(name) for name in TABLES[:5]]
+                                         + [classes]
+                                         + [table(name)
+                                            for name in TABLES[5:]]),
+                      closure=closure)
+
+    byte_mode = header['byte_mode']
+    optimize = header['optimize']
+    words = header['trie']
+    state = {
+        'pattern': _data(header['pattern'], byte_mode),
+        'mode': header['mode'],
+        'byte_mode': byte_mode,
+        'cache_size': header['cache_size'],
+        'max_states': header['max_states'],
+        'optimize': optimize if isinstance(optimize, bool)
+        else tuple(optimize),
+        'required': tuple(_data(literal, byte_mode)
+                          for literal in header['required']),
+        'prefix': _data(header['prefix'], byte_mode),
+        'trie': None if words is None else Trie(words),
+        'program': program,
+    }
+    regex = Regex.__new__(Regex)
+    dfa = header['dfa']
+    if dfa is not None:
+        # the Alphabet is cheap to build again, and comes out the same
+        dfa = DFA(Alphabet(program.spans()), array('l', table('dfa_table')),
+                  dfa['accepting'], dfa['start'], dfa['dead'],
+                  build_time=dfa['build_time'],
+                  subset_states=dfa['subset_states'], byte_mode=byte_mode)
+        state['dfa'] = dfa
+    regex.__setstate__(state)
+    if dfa is not None:
+        regex._full_dfa = dfa
+        regex._alphabet = dfa.alphabet
+    return regex
+
+
+def write_bundle(path, regexes):
+    """ Write compiled patterns to a bundle file.
+
+    Arguments:
+        path (str): the file to write
+        regexes (iterable): Regex objects, or patterns to compile with the
+                            default options
+
+    Returns:
+        int: the number of patterns written
+    """
+    entries = []
+    with open(path, 'wb') as stream:
+        stream.write(b'\0' * BUNDLE_HEADER.size)
+        offset = BUNDLE_HEADER.size
+        for regex in regexes:
+            if not isinstance(regex, Regex):
+                regex = Regex(regex)
+            record = dumps(regex)
+            padding = -offset % 8
+            stream.write(b'\0' * padding)
+            offset += padding
+            stream.write(record)
+            key = regex.pattern
+            if not regex.byte_mode:
+                key = key.encode('utf-8')
+            flags = BYTES_FLAG if regex.byte_mode else 0
+            entries.append((offset, len(record), key, flags))
+            offset += len(record)
+        padding = -offset % 8
+        stream.write(b'\0' * padding)
+        index_offset = offset + padding
+        key_offset = index_offset + INDEX_ENTRY.size * len(entries)
+        for record_offset, size, key, flags in entries:
+            stream.write(INDEX_ENTRY.pack(record_offset, size, key_offset,
+                                          len(key), flags))
+            key_offset += len(key)
+        for _, _, key, _ in entries:
+            stream.write(key)
+        stream.seek(0)
+        stream.write(BUNDLE_HEADER.pack(BUNDLE_MAGIC, VERSION, 0,
+                                        len(entries), index_offset))
+    return len(entries)
+
+
+class Bundle(object):
+    """ A bundle file of compiled patterns, decoded on demand.
+
+    Patterns are looked up by position (`bundle[3]`) or by pattern
+    (`bundle.get('error.*timeout')`); either way a record is only decoded
+    the first time it is asked for.  Decoded patterns keep using the mapped
+    file, so it stays mapped until the Bundle and every Regex loaded from it
+    are gone; `close` only drops the Bundle's own references.
+
+    Arguments:
+        path (str): a file written by `write_bundle`
+
+    Raises:
+        ValueError: if the file isn't a bundle of a supported version
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as stream:
+            self._map = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+        if len(self._view) < BUNDLE_HEADER.size:
+            raise ValueError('{} is not a rematch bundle'.format(path))
+        magic, version, _, count, index_offset = BUNDLE_HEADER.unpack_from(
+            self._view)
+        if magic != BUNDLE_MAGIC:
+            raise ValueError('{} is not a rematch bundle'.format(path))
+        if version != VERSION:
+            raise ValueError('unsupported bundle format version {}'
+                             .format(version))
+        self._count = count
+        self._index_offset = index_offset
+        self._loaded = [None] * count
+        self._keys = None
+        # decoding a record, or indexing the patterns, happens once even
+        # when several threads ask at the same time
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '<Bundle {!r}: {} patterns>'.format(self.path, self._count)
+
+    def __len__(self):
+        return self._count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _entry(self, position):
+        return INDEX_ENTRY.unpack_from(
+            self._view, self._index_offset + position * INDEX_ENTRY.size)
+
+    def __getitem__(self, position):
+        """ The Regex at `position`, decoded on first use. """
+        if position < 0:
+            position += self._count
+        if not 0 <= position < self._count:
+            raise IndexError('bundle index out of range')
+        regex = self._loaded[position]
+        if regex is None:
+            with self._lock:
+                regex = self._loaded[position]
+                if regex is None:
+                    offset, size, _, _, _ = self._entry(position)
+                    regex = loads(self._view[offset:offset + size])
+                    self._loaded[position] = regex
+        return regex
+
+    def __iter__(self):
+        for position in range(self._count):
+            yield self[position]
+
+    def pattern(self, position):
+        """ The pattern at `position`, without decoding its record. """
+        _, _, offset, size, flags = self._entry(position)
+        key = bytes(self._view[offset:offset + size])
+        return key if flags & BYTES_FLAG else key.decode('utf-8')
+
+    def get(self, pattern, default=None):
+        """ The Regex compiled from `pattern` (str or bytes), or `default`.
+        """
+        if self._keys is None:
+            with self._lock:
+                if self._keys is None:
+                    # (type, pattern) keys keep 'a' and b'a' apart
+                    keys = {}
+                    for position in range(self._count):
+                        key = self.pattern(position)
+                        keys[type(key), key] = position
+                    self._keys = keys
+        position = self._keys.get((type(pattern), pattern))
+        if position is None:
+            return default
+        return self[position]
+
+    def close(self):
+        """ Drop the Bundle's references to the mapped file. """
+        self._loaded = [None] * self._count
+        self._view.release()
+        try:
+            self._map.close()
+        except BufferError:
+            # decoded patterns still use the mapping, which goes away with
+            # the last of them
+            pass
@@ -0,0 +1,92 @@
+"""
+cache.py: module level entry points backed by a cache of compiled patterns.
+
+Building a `Regex` parses the pattern, patches together its NFA and lowers
+that to a `compact.Program`.  `compile` keeps the most recently used Regex
+objects in a bounded LRU cache keyed on the pattern and its options, so code
+that builds the same pattern over and over only pays for a dict lookup.
+
+As with `re`, each function does what the Regex method of the same name
+does: `match` anchors at the start of the string only, `fullmatch` at both
+ends.
+"""
+
+from functools import lru_cache
+
+from .regex import Regex
+
+MAXCACHE = 512
+
+
+@lru_cache(maxsize=MAXCACHE, typed=True)
+def _compile(pattern, options):
+    return Regex(pattern, **dict(options))
+
+
+def compile(pattern, **options):
+    """ Return a (possibly cached) Regex for `pattern`.
+
+    Arguments:
+        pattern (str or Regex): the regular expression; a Regex is returned
+                                as is
+        options: keyword arguments for `Regex`, e.g. `mode`
+
+    Returns:
+        Regex: a compiled pattern, shared with every other caller that asked
+        for the same pattern and options
+    """
+    if isinstance(pattern, Regex):
+        if options:
+            raise ValueError('cannot pass options with a compiled Regex')
+        return pattern
+    optimize = options.get('optimize')
+    if optimize is not None and not isinstance(optimize, bool):
+        # any iterable of names will do for Regex, but the key must hash,
+        # and the order of the names makes no difference
+        options['optimize'] = tuple(sorted(set(optimize)))
+    return _compile(pattern, tuple(sorted(options.items())))
+
+
+def match(pattern, string, **options):
+    """ Return the longest Match of `pattern` at the start of `string`, or
+    None (see `Regex.match`).
+    """
+    return compile(pattern, **options).match(string)
+
+
+def fullmatch(pattern, string, **options):
+    """ Return a Match if `pattern` matches the whole of `string`, or None
+    (see `Regex.fullmatch`).
+    """
+    return compile(pattern, **options).fullmatch(string)
+
+
+def search(pattern, string, **options):
+    """ Return the leftmost-longest Match of `pattern` in `string`, or None.
+    """
+    return compile(pattern, **options).search(string)
+
+
+def finditer(pattern, string, **options):
+    """ Iterate over the non-overlapping Matches of `pattern` in `string`. """
+    return compile(pattern, **options).finditer(string)
+
+
+def findall(pattern, string, **options):
+    """ Return the text of every non-overlapping match of `pattern`. """
+    return compile(pattern, **options).findall(string)
+
+
+def purge():
+    """ Empty the compiled pattern cache. """
+    _compile.cache_clear()
+
+
+def cache_info():
+    """ Statistics for the compiled pattern cache.
+
+    Returns:
+        namedtuple: `(hits, misses, maxsize, currsize)`, as for
+        `functools.lru_cache`
+    """
+    return _compile.cache_info()
@@ -0,0 +1,106 @@
+"""
+charset.py: the sets of characters matched by character classes.
+
+A class like `[^\\x00-\\uffff]` stands for most of unicode, so it can't be
+stored as a set of characters.  A CharSet keeps the sorted, disjoint ranges of
+code points it contains instead, and tests membership with `bisect` over
+their bounds -- O(log k) for k ranges -- or, for ASCII codes, with a single
+shift of an integer bitset.
+"""
+
+from bisect import bisect_right
+
+from .alphabet import MAX_CODE
+
+ASCII = 128
+
+
+def normalize(spans):
+    """ Sort `(lo, hi)` ranges and merge those that overlap or touch. """
+    merged = []
+    for lo, hi in sorted(spans):
+        if merged and lo <= merged[-1][1] + 1:
+            if hi > merged[-1][1]:
+                merged[-1] = (merged[-1][0], hi)
+        else:
+            merged.append((lo, hi))
+    return tuple(merged)
+
+
+class CharSet(object):
+    """ An immutable set of code points, stored as ranges.
+
+    Membership is tested on integer codes (see `alphabet.codes`).
+
+    Arguments:
+        spans (iterable): `(lo, hi)` inclusive ranges of code points, in any
+                          order; they may overlap
+        negate (bool): if True, the set holds every code point *not* in
+                       `spans`
+
+    Attributes:
+        spans (tuple): the sorted, disjoint, non-adjacent ranges of the set
+        los, his (tuple): the first and last code point of every range
+        ascii (int): a bitset of the members below 128
+    """
+    __slots__ = ('spans', 'los', 'his', 'ascii')
+
+    def __init__(self, spans, negate=False):
+        spans = normalize(spans)
+        if negate:
+            spans = complement(spans)
+        self.spans = spans
+        self.los = tuple(lo for lo, _ in spans)
+        self.his = tuple(hi for _, hi in spans)
+        bits = 0
+        for lo, hi in spans:
+            if lo >= ASCII:
+                break
+            for code in range(lo, min(hi, ASCII - 1) + 1):
+                bits |= 1 << code
+        self.ascii = bits
+
+    @classmethod
+    def from_chars(cls, chars):
+        """ The CharSet of the characters of the string `chars`. """
+        return cls((ord(ch), ord(ch)) for ch in chars)
+
+    def __reduce__(self):
+        return (CharSet, (self.spans,))
+
+    def __contains__(self, code):
+        if code < ASCII:
+            return self.ascii >> code & 1
+        i = bisect_right(self.los, code)
+        return i > 0 and code <= self.his[i - 1]
+
+    def __iter__(self):
+        for lo, hi in self.spans:
+            yield from range(lo, hi + 1)
+
+    def __len__(self):
+        return sum(hi - lo + 1 for lo, hi in self.spans)
+
+    def __eq__(self, other):
+        if not isinstance(other, CharSet):
+            return NotImplemented
+        return self.spans == other.spans
+
+    def __hash__(self):
+        return hash(self.spans)
+
+    def __repr__(self):
+        return 'CharSet({!r})'.format(self.spans)
+
+
+def complement(spans):
+    """ The ranges of every code point not in the normalized `spans`. """
+    result = []
+    nxt = 0
+    for lo, hi in spans:
+        if lo > nxt:
+            result.append((nxt, lo - 1))
+        nxt = hi + 1
+    if nxt <= MAX_CODE:
+        result.append((nxt, MAX_CODE))
+    return tuple(result)
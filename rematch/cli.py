@@ -2,34 +2,322 @@
 
 """
 cli interface to the regex matching engine
+
+    rematch [--mode MODE] PATTERN STRING [STRING ...]
+
+prints each STRING with whether PATTERN matches the whole of it.
+
+    rematch --grep [options] PATTERN [PATH ...]
+
+scans the lines of every file (directories are walked recursively; '-', or
+no path at all, is standard input) and prints those in which PATTERN finds a
+match, like grep.  Files are read as bytes through a large buffer; each line
+is decoded as UTF-8 for matching (bytes that aren't valid UTF-8 are kept as
+they are, see the 'surrogateescape' error handler) and printed back exactly
+as it was read.  Lines are matched whole against `.*(PATTERN).*`, which runs
+on the DFA engines, rather than searched, which only the NFA can do.
+
+Selected lines are written as soon as they are read, and flushed one by one
+unless the output is a regular file, so `tail -f log | rematch -g error` keeps
+up with the log.  With `-j N` files are spread across N worker processes,
+each of which gets the compiled pattern once (as in `batch.match_many`);
+they hand back the whole output of a file at a time, which is printed in
+the order the files were given.  `--stats` reports the compile
+time and the throughput on standard error, which makes this an end-to-end
+benchmark of the engine as well.
 """
 
 from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
 import logging
+import os
+import stat
 import sys
 
-from .regex import Regex
+from .parser import parse
+from .regex import Regex, MODES
+
+# the read buffer of every input, in bytes
+BUFFER_SIZE = 1 << 20
+STDIN = '-'
+STDIN_NAME = '(standard input)'
 
+_worker_regex = None
+_worker_options = None
 
-def get_args():
-    parser = ArgumentParser()
+
+def get_args(argv=None):
+    parser = ArgumentParser(prog='rematch',
+                            description='match strings against a pattern, '
+                                        'or with --grep print the lines of '
+                                        'files matching it')
     parser.add_argument('--debug', action='store_true')
+    parser.add_argument('-g', '--grep', action='store_true',
+                        help='scan the lines of files (or standard input) '
+                             'instead of matching strings')
+    parser.add_argument('-c', '--count', action='store_true',
+                        help='print the number of matching lines of each '
+                             'input instead')
+    parser.add_argument('-l', '--files-with-matches', action='store_true',
+                        help='print the name of each input with a match '
+                             'instead')
+    parser.add_argument('-v', '--invert-match', action='store_true',
+                        help='select the lines without a match')
+    parser.add_argument('-n', '--line-number', action='store_true',
+                        help='prefix each line with its line number')
+    parser.add_argument('-j', '--jobs', type=int, default=1, metavar='N',
+                        help='scan files in N processes')
+    parser.add_argument('--mode', default='lazy', choices=MODES,
+                        help='the matching engine')
+    parser.add_argument('--stats', action='store_true',
+                        help='report compile time and throughput on stderr')
     parser.add_argument('pattern')
-    parser.add_argument('strings', nargs='+')
-    return parser.parse_args()
+    parser.add_argument('arguments', nargs='*', metavar='STRING',
+                        help='the strings to match; with --grep, the files '
+                             'and directories to scan')
+    args = parser.parse_args(argv)
+    if args.jobs < 1:
+        parser.error('-j needs at least one process')
+    if args.grep:
+        args.paths = args.arguments
+    else:
+        if (args.count or args.files_with_matches or args.invert_match or
+                args.line_number or args.jobs > 1):
+            parser.error('-c, -l, -v, -n and -j need --grep')
+        if not args.arguments:
+            parser.error('the following arguments are required: STRING')
+    return args
 
 
-def cli():
-    args = get_args()
+def walk(paths):
+    """ Yield the files to scan: `paths`, with directories replaced by the
+    files under them, in sorted order.
+    """
+    for path in paths:
+        if path != STDIN and os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    yield os.path.join(root, name)
+        else:
+            yield path
+
+
+def line_pattern(pattern):
+    """ A pattern matching the whole of every line `pattern` finds a match
+    in.  `pattern` must be valid: the parentheses around it have to pair up
+    with each other.
+    """
+    return '.*(' + pattern + ').*'
+
+
+def scan(regex, stream, name, options, write, flush=None):
+    """ Select the lines of a binary stream.
+
+    Arguments:
+        regex (Regex): the pattern whole lines are matched against (see
+                       `line_pattern`)
+        stream (iterable): the lines, as bytes
+        name (bytes): the prefix of output lines, or None
+        options (Namespace): the parsed arguments
+        write (callable): called with each piece of output, as bytes, as
+                          soon as it is known
+        flush (callable): called after each selected line, if given
+
+    Returns:
+        selected, lines, size (tuple): the number of lines selected, and the
+        lines and bytes read
+    """
+    invert = options.invert_match
+    listing = options.files_with_matches
+    printing = not (listing or options.count)
+    numbered = options.line_number
+    prefix = b'' if name is None else name + b':'
+    selected = lines = size = 0
+    for raw in stream:
+        lines += 1
+        size += len(raw)
+        line = raw.decode('utf-8', 'surrogateescape')
+        if line.endswith('\n'):
+            line = line[:-1]
+        if regex(line) != invert:
+            selected += 1
+            if listing:
+                break
+            if printing:
+                if not raw.endswith(b'\n'):
+                    raw += b'\n'
+                if numbered:
+                    write(b'%s%d:%s' % (prefix, lines, raw))
+                else:
+                    write(prefix + raw if prefix else raw)
+                if flush is not None:
+                    flush()
+    if listing:
+        if selected:
+            write((name or b'') + b'\n')
+    elif options.count:
+        write(prefix + b'%d\n' % selected)
+    return selected, lines, size
+
+
+def scan_path(path, regex, options, named, write, flush=None):
+    """ Scan the file at `path` (or standard input).
+
+    Returns:
+        selected, lines, size, error (tuple): as for `scan`, with the message
+        of the OSError that stopped the scan, or None
+    """
+    display = STDIN_NAME if path == STDIN else path
+    name = os.fsencode(display) if named or options.files_with_matches \
+        else None
+    try:
+        if path == STDIN:
+            stream = open(sys.stdin.fileno(), 'rb', buffering=BUFFER_SIZE,
+                          closefd=False)
+        else:
+            stream = open(path, 'rb', buffering=BUFFER_SIZE)
+        with stream:
+            return scan(regex, stream, name, options, write, flush) + (None,)
+    except OSError as err:
+        return 0, 0, 0, '{}: {}'.format(display, err.strerror or err)
+
+
+def _init_worker(regex, options):
+    global _worker_regex, _worker_options
+    _worker_regex, _worker_options = regex, options
+
+
+def _scan_worker(job):
+    # the output of a whole file goes back to the parent in one piece
+    path, named = job
+    out = []
+    result = scan_path(path, _worker_regex, _worker_options, named,
+                       out.append)
+    return (b''.join(out),) + result
+
+
+def _written(results, stdout):
+    """ Write out the output of each of the workers' `results`, yielding
+    the rest of each.
+    """
+    for output, *result in results:
+        stdout.write(output)
+        yield tuple(result)
+
+
+def interactive(stdout):
+    """ False if `stdout` is a regular file, which needn't be flushed line
+    by line.
+    """
+    try:
+        return not stat.S_ISREG(os.fstat(stdout.fileno()).st_mode)
+    except (AttributeError, OSError, ValueError):
+        # io.BytesIO and the like have no file descriptor
+        return True
+
+
+def grep(regex, options, stdout):
+    """ Scan every input, writing the output to the binary `stdout`.
+
+    Returns:
+        int: the exit status -- 0 if a line was selected, 1 if none was, 2 if
+        an input couldn't be read
+    """
+    began = perf_counter()
+    paths = list(walk(options.paths or [STDIN]))
+    named = len(paths) > 1 or any(path != STDIN and os.path.isdir(path)
+                                  for path in options.paths)
+    jobs = [(path, named) for path in paths]
+    if options.jobs > 1 and len(paths) > 1:
+        pool = ProcessPoolExecutor(max_workers=options.jobs,
+                                   initializer=_init_worker,
+                                   initargs=(regex, options))
+        results = _written(pool.map(_scan_worker, jobs), stdout)
+    else:
+        pool = None
+        flush = stdout.flush if interactive(stdout) else None
+        results = (scan_path(path, regex, options, named, stdout.write, flush)
+                   for path, named in jobs)
+    selected = lines = size = 0
+    errors = 0
+    try:
+        for found, read, length, error in results:
+            if error is not None:
+                errors += 1
+                print('rematch: {}'.format(error), file=sys.stderr)
+            selected += found
+            lines += read
+            size += length
+    finally:
+        stdout.flush()
+        if pool is not None:
+            pool.shutdown()
+    if options.stats:
+        elapsed = perf_counter() - began
+        print('rematch: scanned {:,} bytes in {:,} lines of {} input{} in '
+              '{:.3f}s: {:,.0f} lines/s, {:,.0f} bytes/s; {:,} selected'
+              .format(size, lines, len(paths), '' if len(paths) == 1 else 's',
+                      elapsed, lines / elapsed if elapsed else 0,
+                      size / elapsed if elapsed else 0, selected),
+              file=sys.stderr)
+    if errors:
+        return 2
+    return 0 if selected else 1
+
+
+def match_strings(regex, strings):
+    """ Print whether `regex` matches each of `strings`. """
+    strlen = max(len(string) for string in strings)
+    out_fmt = '{:>' + str(strlen) + '}: {}'
+    for string in strings:
+        print(out_fmt.format(string, regex(string)))
+    return 0
+
+
+def main(argv=None, stdout=None):
+    """ Run the command line.
+
+    Arguments:
+        argv (list): the arguments, by default `sys.argv[1:]`
+        stdout: the binary stream to print matching lines to, by default
+                standard output
+
+    Returns:
+        int: the exit status
+    """
+    args = get_args(argv)
     if args.debug:
         logging.basicConfig(level=logging.DEBUG)
-    pattern = args.pattern
     try:
-        match = Regex(pattern)
-        strlen = max(len(string) for string in args.strings)
-        out_fmt = '{:>' + str(strlen) + '}: {}'
-        for string in args.strings:
-            print(out_fmt.format(string, match(string)))
-    except Exception as err:
-        print('Error...')
-        logging.debug('%s: %s %s' % sys.exc_info())
+        if not args.grep:
+            began = perf_counter()
+            regex = Regex(args.pattern, mode=args.mode)
+        else:
+            # parsed alone first: `line_pattern` needs it to be well formed
+            parse(args.pattern)
+            began = perf_counter()
+            regex = Regex(line_pattern(args.pattern), mode=args.mode)
+        compiled = perf_counter() - began
+    except ValueError as err:
+        print('rematch: bad pattern {!r}: {}'.format(args.pattern, err),
+              file=sys.stderr)
+        return 2
+    if args.stats:
+        print('rematch: compiled {!r} in {:.6f}s ({} mode, {} NFA states)'
+              .format(args.pattern, compiled, args.mode,
+                      regex.program.n), file=sys.stderr)
+    if not args.grep:
+        return match_strings(regex, args.arguments)
+    if stdout is None:
+        stdout = sys.stdout.buffer
+    return grep(regex, args, stdout)
+
+
+def cli():
+    sys.exit(main())
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,258 @@
+"""
+codegen.py: turn a `dfa.DFA` into a specialized Python function.
+
+Walking the transition table costs a class lookup, a row lookup and a loop
+iteration for every character.  The function generated here has one block of
+code per DFA state instead, and most blocks consume several characters at a
+time with string methods that run in C:
+
+    * a state that loops on every character but one jumps to the next
+      occurrence of that character with `str.find`; other self-loops skip
+      their characters in a tight `while` loop
+    * a chain of states each leaving on a single character (the states of a
+      literal run) is checked with one `str.startswith`
+    * the other transitions are comparisons against character ranges, with
+      the most common target (often the dead state) left to `else`
+
+The block to run is picked by a binary search over the state number, and a
+block returns as soon as the dead state, or a state every continuation of
+which accepts, is reached.
+"""
+
+from .alphabet import MAX_CODE
+
+# the most single characters tested one by one rather than with `in`
+MAX_COMPARISONS = 3
+# the most characters a self-loop may take to be skipped with `lstrip`, and
+# how many characters are stripped at a time
+MAX_STRIP = 256
+WINDOW = 256
+
+
+def _ranges(dfa, state, byte_mode):
+    """ The inclusive `(lo, hi)` code ranges leading to each target of
+    `state`, as a dict keyed by target.
+    """
+    alphabet = dfa.alphabet
+    ncls = len(alphabet)
+    row = dfa.table[state * ncls:(state + 1) * ncls]
+    top = 0xff if byte_mode else MAX_CODE
+    bounds = alphabet.bounds + [MAX_CODE + 1]
+    ranges = {}
+    for k, cls in enumerate(alphabet.interval_class):
+        lo, hi = bounds[k], min(bounds[k + 1] - 1, top)
+        if lo > top:
+            break
+        spans = ranges.setdefault(row[cls], [])
+        if spans and spans[-1][1] == lo - 1:
+            spans[-1] = (spans[-1][0], hi)
+        else:
+            spans.append((lo, hi))
+    return ranges
+
+
+def _size(spans):
+    return sum(hi - lo + 1 for lo, hi in spans)
+
+
+def _codes(spans):
+    return [code for lo, hi in spans for code in range(lo, hi + 1)]
+
+
+class _Writer(object):
+    """ Collects the lines of the generated source. """
+
+    def __init__(self, byte_mode):
+        self.byte_mode = byte_mode
+        self.lines = []
+
+    def emit(self, depth, line):
+        self.lines.append('    ' * depth + line)
+
+    def char(self, code):
+        return repr(code) if self.byte_mode else repr(chr(code))
+
+    def string(self, codes):
+        if self.byte_mode:
+            return repr(bytes(codes))
+        return repr(''.join(map(chr, codes)))
+
+    def test(self, spans, c='c'):
+        """ A condition on `c` that is true for the codes in `spans`. """
+        singles = [lo for lo, hi in spans if lo == hi]
+        terms = []
+        if len(singles) > MAX_COMPARISONS:
+            terms.append('{} in {}'.format(c, self.string(singles)))
+            singles = ()
+        for lo, hi in spans:
+            if lo != hi:
+                terms.append('{} <= {} <= {}'.format(self.char(lo), c,
+                                                     self.char(hi)))
+            elif lo in singles:
+                terms.append('{} == {}'.format(c, self.char(lo)))
+        return ' or '.join(terms)
+
+
+def generate(dfa, byte_mode=False, name='match'):
+    """ Write the source of a function that runs `dfa` over a whole string.
+
+    Arguments:
+        dfa (DFA): the automaton
+        byte_mode (bool): if True the function reads `bytes` or `bytearray`
+                          input, otherwise `str`
+        name (str): the name of the function
+
+    Returns:
+        str: the source of `name(text)`, which returns True if `dfa` accepts
+        the whole of `text`
+    """
+    n = dfa.num_states
+    accepting = [bool(value) for value in dfa.accepting]
+    ranges = [_ranges(dfa, state, byte_mode) for state in range(n)]
+    dead = dfa.dead
+    out = _Writer(byte_mode)
+    out.emit(0, 'def {}(text):'.format(name))
+    out.emit(1, 'n = len(text)')
+    out.emit(1, 'i = 0')
+    out.emit(1, 'state = {}'.format(dfa.start))
+    out.emit(1, 'while True:')
+
+    def literal(state):
+        """ The code a state must leave on, and where to, if every other
+        code leads to the dead state; None otherwise.
+        """
+        targets = ranges[state]
+        live = [target for target in targets if target != dead]
+        if len(live) != 1 or state in targets:
+            return None
+        spans = targets[live[0]]
+        if len(spans) != 1 or spans[0][0] != spans[0][1]:
+            return None
+        return spans[0][0], live[0]
+
+    def block(state, depth):
+        accept = accepting[state]
+        if state == dead:
+            out.emit(depth, 'return False')
+            return
+        if dfa.is_universal(state):
+            out.emit(depth, 'return True')
+            return
+        targets = dict(ranges[state])
+        loop = targets.pop(state, None)
+        if loop is not None:
+            rest = [span for spans in targets.values() for span in spans]
+            if _size(rest) == 1:
+                out.emit(depth, 'i = text.find({}, i)'.format(
+                    out.string([rest[0][0]])))
+                out.emit(depth, 'if i < 0:')
+                out.emit(depth + 1, 'return {}'.format(accept))
+                # the code found is the only way out
+                out.emit(depth, 'i += 1')
+                target, = targets
+                out.emit(depth, 'state = {}'.format(target) if target != dead
+                         else 'return False')
+                return
+            elif _size(loop) <= MAX_STRIP:
+                # strip the looping characters a window at a time: a long
+                # run is skipped at C speed, without copying the whole rest
+                chars = out.string(_codes(loop))
+                out.emit(depth, 'if i < n and text[i] in {}:'.format(chars))
+                out.emit(depth + 1, 'while True:')
+                out.emit(depth + 2, 'chunk = text[i:i + {}]'.format(WINDOW))
+                out.emit(depth + 2, 'left = len(chunk.lstrip({}))'.format(
+                    chars))
+                out.emit(depth + 2, 'i += len(chunk) - left')
+                out.emit(depth + 2, 'if left or i == n:')
+                out.emit(depth + 3, 'break')
+                out.emit(depth, 'if i == n:')
+                out.emit(depth + 1, 'return {}'.format(accept))
+            else:
+                if _size(rest) <= MAX_STRIP:
+                    test = 'text[i] not in {}'.format(
+                        out.string(_codes(rest)))
+                else:
+                    test = out.test(loop, 'text[i]')
+                out.emit(depth, 'while i < n and ({}):'.format(test))
+                out.emit(depth + 1, 'i += 1')
+                out.emit(depth, 'if i == n:')
+                out.emit(depth + 1, 'return {}'.format(accept))
+            if not targets:
+                return
+        else:
+            out.emit(depth, 'if i == n:')
+            out.emit(depth + 1, 'return {}'.format(accept))
+            found = literal(state)
+            if found is not None:
+                # follow the run of single character states
+                run, target = [found[0]], found[1]
+                seen = {state, target}
+                while not accepting[target]:
+                    found = literal(target)
+                    if found is None or found[1] in seen:
+                        break
+                    run.append(found[0])
+                    target = found[1]
+                    seen.add(target)
+                if len(run) > 1:
+                    out.emit(depth, 'if not text.startswith({}, i):'.format(
+                        out.string(run)))
+                    out.emit(depth + 1, 'return False')
+                    out.emit(depth, 'i += {}'.format(len(run)))
+                    out.emit(depth, 'state = {}'.format(target))
+                    out.emit(depth, 'continue')
+                    return
+        out.emit(depth, 'c = text[i]')
+        out.emit(depth, 'i += 1')
+        # the target reached on the most codes is left to `else`
+        default = max(targets, key=lambda target: (target == dead,
+                                                   _size(targets[target])))
+        keyword = 'if'
+        for target in sorted(targets):
+            if target == default:
+                continue
+            out.emit(depth, '{} {}:'.format(keyword,
+                                            out.test(targets[target])))
+            out.emit(depth + 1, 'state = {}'.format(target) if target != dead
+                     else 'return False')
+            keyword = 'elif'
+        if keyword == 'elif':
+            out.emit(depth, 'else:')
+            depth += 1
+        out.emit(depth, 'state = {}'.format(default) if default != dead
+                 else 'return False')
+
+    # a binary search for the block of the current state
+    pending = [(0, n, 2)]
+    while pending:
+        lo, hi, depth = pending.pop()
+        if hi is None:
+            out.emit(depth, 'else:')
+        elif hi - lo == 1:
+            block(lo, depth)
+        else:
+            middle = (lo + hi) // 2
+            out.emit(depth, 'if state < {}:'.format(middle))
+            pending.append((middle, hi, depth + 1))
+            pending.append((None, None, depth))
+            pending.append((lo, middle, depth + 1))
+    return '\n'.join(out.lines) + '\n'
+
+
+def build(dfa, byte_mode=False, filename='<rematch>'):
+    """ Generate and compile the matching function of `dfa`.
+
+    Arguments:
+        dfa, byte_mode: as for `generate`
+        filename (str): the file name tracebacks show for the function
+
+    Returns:
+        function: `match(text)` (see `generate`), with its source as the
+        `source` attribute
+    """
+    source = generate(dfa, byte_mode)
+    namespace = {}
+    exec(compile(source, filename, 'exec'), namespace)
+    function = namespace['match']
+    function.source = source
+    return function
@@ -0,0 +1,333 @@
+"""
+compact.py: lower the State/Arrow graph built by `patcher.patch` into flat,
+integer indexed tables.
+
+The object graph is convenient to build but expensive to run: every step of
+the simulation calls arrow objects, checks their types, and chases epsilon
+arrows through `regex.E_set`.  A `Program` holds the same NFA as `array`
+vectors instead -- states are integers, arrows are rows in a handful of
+parallel arrays, and the epsilon closure of every state the matcher can land
+on is computed once, ahead of time.
+"""
+
+from array import array
+
+from .alphabet import code_array
+from .patcher import Epsilon, DotArrow, CharClassArrow, reachable
+
+# arrow kinds
+LITERAL, DOT, CLASS = 0, 1, 2
+
+
+class Program(object):
+    """ An NFA as flat integer tables.
+
+    States are numbered `0..n-1`.  The labelled arrows leaving state `s` are
+    the rows `index[s]` to `index[s + 1]` of `kinds`, `labels` and `targets`;
+    its epsilon arrows are the rows `eps_index[s]` to `eps_index[s + 1]` of
+    `eps_targets`.  A label is the code of a LITERAL arrow, or the position
+    in `classes` of the CharSet of a CLASS arrow; DOT arrows match any
+    code and ignore their label.  Codes are code points, or byte values for
+    patterns compiled in byte mode (see `alphabet.codes`).
+
+    Attributes:
+        n (int): the number of states
+        start (int): the start state
+        accept (array): the tag of each accept state (1 unless `lower` was
+                        given other tags), 0 for the rest
+        index, kinds, labels, targets (array): the labelled arrows
+        classes (tuple): the `charset.CharSet`s used by CLASS arrows
+        eps_index, eps_targets (array): the epsilon arrows
+        closure (list): for each state the matcher can be moved to (the start
+                        state and the targets of labelled arrows), the tuple
+                        of states in its epsilon closure that matter to the
+                        matcher -- those with labelled arrows, or that accept;
+                        None for every other state
+        initial (tuple): the closure of the start state
+
+    The tables may be any sequences of integers that support indexing, such
+    as the memoryviews `bundle.loads` maps straight from a file, and the
+    closures may be given too rather than computed again.
+    """
+    __slots__ = ('n', 'start', 'accept', 'index', 'kinds', 'labels',
+                 'targets', 'classes', 'eps_index', 'eps_targets', 'closure',
+                 'initial')
+
+    def __init__(self, start, accept, index, kinds, labels, targets, classes,
+                 eps_index, eps_targets, closure=None):
+        self.n = len(accept)
+        self.start = start
+        self.accept = accept
+        self.index = index
+        self.kinds = kinds
+        self.labels = labels
+        self.targets = targets
+        self.classes = tuple(classes)
+        self.eps_index = eps_index
+        self.eps_targets = eps_targets
+        if closure is None:
+            closure = [None] * self.n
+            for state in set(targets) | {start}:
+                closure[state] = self._closure(state)
+        self.closure = closure
+        self.initial = self.closure[start]
+
+    def __reduce__(self):
+        # the closures are cheap to recompute, so they aren't pickled; tables
+        # mapped from a bundle are copied into arrays
+        return (Program, (self.start, as_array('l', self.accept),
+                          as_array('l', self.index), as_array('b', self.kinds),
+                          as_array('l', self.labels),
+                          as_array('l', self.targets), self.classes,
+                          as_array('l', self.eps_index),
+                          as_array('l', self.eps_targets)))
+
+    def __repr__(self):
+        return '<Program: {} states, {} arrows, {} epsilons>'.format(
+            self.n, len(self.targets), len(self.eps_targets))
+
+    def _closure(self, state):
+        """ The states worth tracking in the epsilon closure of `state`, in
+        the order a depth first search following epsilons in order finds
+        them.
+        """
+        index, eps_index, eps_targets = self.index, self.eps_index, \
+            self.eps_targets
+        seen = {state}
+        stack = [state]
+        found = []
+        while stack:
+            current = stack.pop()
+            if index[current] != index[current + 1] or self.accept[current]:
+                found.append(current)
+            for k in range(eps_index[current + 1] - 1,
+                           eps_index[current] - 1, -1):
+                target = eps_targets[k]
+                if target not in seen:
+                    seen.add(target)
+                    stack.append(target)
+        return tuple(found)
+
+    def spans(self):
+        """ Yield the `(lo, hi)` code point ranges of every labelled arrow
+        that splits the alphabet (see `alphabet.Alphabet`).
+        """
+        for kind, label in zip(self.kinds, self.labels):
+            if kind == LITERAL:
+                yield [(label, label)]
+            elif kind == CLASS:
+                yield self.classes[label].spans
+
+    def accepting(self, states):
+        """ Return True if any of `states` is an accept state. """
+        accept = self.accept
+        return any(accept[state] for state in states)
+
+    def step(self, states, code):
+        """ The frozenset of states reached from `states` on `code`. """
+        index, kinds, labels, targets, classes, closure = (
+            self.index, self.kinds, self.labels, self.targets, self.classes,
+            self.closure)
+        reached = set()
+        for state in states:
+            for k in range(index[state], index[state + 1]):
+                kind = kinds[k]
+                if (kind == DOT or
+                        kind == LITERAL and labels[k] == code or
+                        kind == CLASS and code in classes[labels[k]]):
+                    reached.update(closure[targets[k]])
+        return frozenset(reached)
+
+    def match(self, codes):
+        """ Simulate the NFA over the whole of `codes`.
+
+        The active state sets are kept in two preallocated sparse sets that
+        are swapped after every character, so the loop itself allocates
+        nothing.
+        """
+        index, kinds, labels, targets, classes, closure = (
+            self.index, self.kinds, self.labels, self.targets, self.classes,
+            self.closure)
+        n = self.n
+        dense, sparse = [0] * n, [0] * n
+        next_dense, next_sparse = [0] * n, [0] * n
+        size = 0
+        for state in self.initial:
+            sparse[state] = size
+            dense[size] = state
+            size += 1
+        for code in codes:
+            next_size = 0
+            for i in range(size):
+                state = dense[i]
+                for k in range(index[state], index[state + 1]):
+                    kind = kinds[k]
+                    if (kind == DOT or
+                            kind == LITERAL and labels[k] == code or
+                            kind == CLASS and code in classes[labels[k]]):
+                        for target in closure[targets[k]]:
+                            j = next_sparse[target]
+                            if j < next_size and next_dense[j] == target:
+                                continue
+                            next_sparse[target] = next_size
+                            next_dense[next_size] = target
+                            next_size += 1
+            if not next_size:
+                return False
+            dense, next_dense = next_dense, dense
+            sparse, next_sparse = next_sparse, sparse
+            size = next_size
+        accept = self.accept
+        return any(accept[dense[i]] for i in range(size))
+
+    def search(self, text, pos=0, prefix=None, codes=None):
+        """ Find the leftmost-longest match in `text`, starting at `pos`.
+
+        Rather than restarting the simulation at every offset, a fresh copy
+        of the start closure is seeded at each position of a single pass.
+        Every active state remembers the earliest offset it was reached from
+        -- a state reached from two offsets has the same future either way,
+        so the later one is dropped -- which keeps the cost at
+        O(len(text) * n) however many offsets are tried.  Once a match is
+        found no more offsets are seeded, and the pass ends when the last
+        thread that could still extend (or beat) it dies.
+
+        If every match starts with `prefix`, the scan jumps straight to its
+        next occurrence (found with `text.find`) whenever no thread is alive.
+
+        `codes` is `alphabet.code_array(text)`, for callers searching the
+        same text over and over; by default it is computed here, which
+        copies a str.
+
+        Returns:
+            (start, end) tuple, or None if there is no match
+        """
+        index, kinds, labels, targets, classes, closure, accept = (
+            self.index, self.kinds, self.labels, self.targets, self.classes,
+            self.closure, self.accept)
+        n = self.n
+        dense, sparse, starts = [0] * n, [0] * n, [0] * n
+        next_dense, next_sparse, next_starts = [0] * n, [0] * n, [0] * n
+        size = 0
+        best_start = best_end = -1
+        if codes is None:
+            codes = code_array(text)
+        length = len(codes)
+        find = getattr(text, 'find', None) if prefix else None
+        i = pos
+        while True:
+            if best_start < 0:
+                if find is not None and not size:
+                    i = find(prefix, i)
+                    if i < 0:
+                        break
+                for state in self.initial:
+                    j = sparse[state]
+                    if j < size and dense[j] == state:
+                        continue
+                    sparse[state] = size
+                    dense[size] = state
+                    starts[state] = i
+                    size += 1
+            for j in range(size):
+                state = dense[j]
+                if accept[state]:
+                    start = starts[state]
+                    if best_start < 0 or start < best_start or (
+                            start == best_start and i > best_end):
+                        best_start, best_end = start, i
+            if best_start >= 0:
+                # threads that began after the best match can't beat it
+                kept = 0
+                for j in range(size):
+                    state = dense[j]
+                    if starts[state] <= best_start:
+                        sparse[state] = kept
+                        dense[kept] = state
+                        kept += 1
+                size = kept
+                if not size:
+                    break
+            if i >= length:
+                break
+            code = codes[i]
+            next_size = 0
+            for j in range(size):
+                state = dense[j]
+                for k in range(index[state], index[state + 1]):
+                    kind = kinds[k]
+                    if (kind == DOT or
+                            kind == LITERAL and labels[k] == code or
+                            kind == CLASS and code in classes[labels[k]]):
+                        for target in closure[targets[k]]:
+                            m = next_sparse[target]
+                            if m < next_size and next_dense[m] == target:
+                                continue
+                            next_sparse[target] = next_size
+                            next_dense[next_size] = target
+                            next_starts[target] = starts[state]
+                            next_size += 1
+            dense, next_dense = next_dense, dense
+            sparse, next_sparse = next_sparse, sparse
+            starts, next_starts = next_starts, starts
+            size = next_size
+            i += 1
+        if best_start < 0:
+            return None
+        return best_start, best_end
+
+
+def as_array(typecode, table):
+    """ `table` as an array, copying it if it is another kind of sequence.
+    """
+    if isinstance(table, array):
+        return table
+    return array(typecode, table)
+
+
+def lower(start, accept):
+    """ Lower the NFA graph returned by `patcher.patch` into a Program.
+
+    Arguments:
+        start (State): the start state
+        accept (list or dict): the accept states, or a dict mapping each
+                               accept state to a positive integer tag (see
+                               `regexset.RegexSet`)
+
+    Returns:
+        Program: the same NFA, numbered in breadth first order from `start`
+    """
+    states = reachable(start)
+    ids = {state: number for number, state in enumerate(states)}
+    if not isinstance(accept, dict):
+        accept = dict.fromkeys(accept, 1)
+
+    index, eps_index = array('l', [0]), array('l', [0])
+    kinds, labels, targets = array('b'), array('l'), array('l')
+    eps_targets = array('l')
+    classes, class_ids = [], {}
+    for state in states:
+        for arrow in state:
+            target = ids[arrow.pointsAt]
+            if isinstance(arrow, Epsilon):
+                eps_targets.append(target)
+                continue
+            if isinstance(arrow, DotArrow):
+                kinds.append(DOT)
+                labels.append(0)
+            elif isinstance(arrow, CharClassArrow):
+                charset = arrow.values
+                if charset not in class_ids:
+                    class_ids[charset] = len(classes)
+                    classes.append(charset)
+                kinds.append(CLASS)
+                labels.append(class_ids[charset])
+            else:
+                kinds.append(LITERAL)
+                labels.append(ord(arrow.value))
+            targets.append(target)
+        index.append(len(targets))
+        eps_index.append(len(eps_targets))
+    accept = array('l', (accept.get(state, 0) for state in states))
+    return Program(0, accept, index, kinds, labels, targets, classes,
+                   eps_index, eps_targets)
@@ -0,0 +1,524 @@
+"""
+dfa.py: deterministic automata built on top of the NFA graphs produced by
+`patcher.patch`.
+
+`LazyDFA` runs the subset construction on demand: every set of NFA states the
+matcher reaches is interned as a single DFA state the first time it shows up,
+and its transitions are memoized per input character, so each (state set,
+character) pair is only ever computed once.
+
+Both automata read integer codes (see `alphabet.codes`).  In byte mode their
+transitions are kept in rows of 256 entries indexed directly by byte value.
+
+`DFA` is built ahead of time instead: the full subset construction over the
+classes of an `alphabet.Alphabet`, followed by Hopcroft's minimization.
+Matching with it is one table lookup per character.
+"""
+
+from array import array
+from collections import deque
+from threading import Lock
+from time import perf_counter
+
+DEFAULT_CACHE_SIZE = 1024
+DEFAULT_MAX_STATES = 10000
+
+DEAD, START = 0, 1
+
+
+class _Row(dict):
+    """ Memoized transitions out of one lazy DFA state, keyed by code. """
+    __slots__ = ()
+
+    def __missing__(self, code):
+        return None
+
+
+class _Cache(object):
+    """ One generation of interned DFA states.
+
+    Attributes:
+        ids (dict): maps a frozenset of NFA states to its DFA state id
+        sets (list): the frozenset of NFA states for each DFA state id
+        trans (list): the memoized `code -> DFA state id` transitions of
+                      each DFA state id: a `_Row`, or in byte mode a list of
+                      256 entries, None where not yet computed
+        accepting (list): the accept value of each DFA state id
+        universal (dict): memoized `LazyDFA.is_universal` results
+    """
+    __slots__ = ('ids', 'sets', 'trans', 'accepting', 'universal', 'row')
+
+    def __init__(self, byte_mode=False):
+        self.row = (lambda: [None] * 256) if byte_mode else _Row
+        self.ids = {}
+        self.sets = []
+        self.trans = []
+        self.accepting = []
+        self.universal = {}
+
+
+class LazyDFA(object):
+    """ A DFA constructed lazily from an NFA, one state set at a time.
+
+    The number of cached DFA states is bounded by `cache_size`.  When a new
+    state set would overflow the cache, the whole cache is flushed and
+    rebuilt from the set currently being matched, so patterns whose subset
+    construction blows up degrade to (roughly) NFA speed instead of
+    exhausting memory.
+
+    A LazyDFA may be shared between threads.  Following a memoized
+    transition takes no lock; computing a new one holds the LazyDFA's lock,
+    and publishes the transition only after the state it leads to is
+    interned, so a thread reading the cache never sees a transition to a
+    state it can't follow yet.  A flush replaces the cache with a new one,
+    and threads still running in the old generation carry on in it.
+
+    Arguments:
+        start (iterable): the epsilon closed set of NFA start states
+        step (callable): `step(states, code)` must return the frozenset of NFA
+                         states reached from the frozenset `states` on `code`
+        accepting (callable): `accepting(states)` must return a truthy value
+                              if the frozenset of NFA states `states` accepts
+        cache_size (int): the maximum number of DFA states held in the cache
+        byte_mode (bool): if True, inputs are bytes-like and transitions are
+                          kept in 256 entry rows
+
+    Attributes:
+        flushes (int): the number of times the cache has been rebuilt
+    """
+    def __init__(self, start, step, accepting, cache_size=DEFAULT_CACHE_SIZE,
+                 byte_mode=False):
+        if cache_size < 2:
+            raise ValueError('cache_size must be at least 2, got {}'
+                             .format(cache_size))
+        self.start_set = frozenset(start)
+        self.step = step
+        self.accepting = accepting
+        self.cache_size = cache_size
+        self.byte_mode = byte_mode
+        self.flushes = 0
+        self._lock = Lock()
+        self._flush()
+
+    def __getstate__(self):
+        # the lock can't be pickled, and the cache is refilled on use
+        state = self.__dict__.copy()
+        del state['_lock'], state['_cache']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = Lock()
+        self._flush()
+
+    def __len__(self):
+        """ The number of DFA states currently cached. """
+        return len(self._cache.sets)
+
+    def _flush(self):
+        cache = _Cache(self.byte_mode)
+        self._intern(cache, frozenset())
+        self._intern(cache, self.start_set)
+        self._cache = cache
+        return cache
+
+    def _intern(self, cache, states):
+        sid = cache.ids.get(states)
+        if sid is None:
+            sid = len(cache.sets)
+            cache.sets.append(states)
+            cache.trans.append(cache.row())
+            cache.accepting.append(self.accepting(states))
+            cache.ids[states] = sid
+        return sid
+
+    def _compute(self, cache, sid, code):
+        """ Compute, memoize and return the transition from `sid` on `code`.
+
+        Returns:
+            cache, sid (tuple): the cache generation the returned DFA state
+            id belongs to (a fresh one if the cache had to be flushed, or if
+            another thread flushed it first), and the DFA state id itself
+        """
+        with self._lock:
+            nxt = cache.trans[sid][code]
+            if nxt is not None:
+                # another thread got here first
+                return cache, nxt
+            states = self.step(cache.sets[sid], code)
+            if cache is not self._cache:
+                # `cache` was flushed: carry on in the current generation
+                cache = self._cache
+                if states not in cache.ids and \
+                        len(cache.sets) >= self.cache_size:
+                    self.flushes += 1
+                    cache = self._flush()
+                return cache, self._intern(cache, states)
+            if states not in cache.ids and len(cache.sets) >= self.cache_size:
+                self.flushes += 1
+                cache = self._flush()
+                return cache, self._intern(cache, states)
+            nxt = self._intern(cache, states)
+            # published last: `nxt` is fully interned by now
+            cache.trans[sid][code] = nxt
+            return cache, nxt
+
+    def match(self, codes):
+        """ Return True if the DFA accepts the whole of `codes`. """
+        return bool(self.run(codes))
+
+    def run(self, codes):
+        """ Return the accept value of the state the DFA ends up in after
+        reading the whole of `codes`.
+        """
+        cache, sid = self.feed(self.start_position(), codes)
+        return cache.accepting[sid]
+
+    # The methods below, shared with `DFA`, let a `stream.Stream` carry a
+    # position in the automaton from one chunk of input to the next.  A
+    # LazyDFA position is a (cache generation, DFA state id) pair; a flush
+    # between two chunks leaves the old generation intact, so positions
+    # never go stale.
+
+    def start_position(self):
+        return self._cache, START
+
+    def feed(self, position, codes):
+        """ Advance `position` over `codes`, stopping early at the dead
+        state.
+        """
+        cache, sid = position
+        trans = cache.trans
+        for code in codes:
+            nxt = trans[sid][code]
+            if nxt is None:
+                cache, nxt = self._compute(cache, sid, code)
+                trans = cache.trans
+            sid = nxt
+            if sid == DEAD:
+                break
+        return cache, sid
+
+    def accepts(self, position):
+        cache, sid = position
+        return bool(cache.accepting[sid])
+
+    def is_dead(self, position):
+        return position[1] == DEAD
+
+    def is_universal(self, position, alphabet):
+        """ Return True if every continuation from `position` accepts.
+
+        The state sets reachable from `position` are explored over the
+        classes of `alphabet`; if there are more than `cache_size` of them
+        the answer is (conservatively) False.
+        """
+        cache, sid = position
+        universal = cache.universal.get(sid)
+        if universal is None:
+            universal = cache.universal[sid] = is_universal(
+                cache.sets[sid], self.step, self.accepting, alphabet,
+                self.cache_size)
+        return universal
+
+    def scan(self, codes, first=False, limit=None):
+        """ Collect the accept values of every state visited on `codes`.
+
+        Only meaningful for DFAs whose accept values are frozensets (see
+        `regexset.RegexSet`).
+
+        Arguments:
+            codes (iterable): the input
+            first (bool): stop at the first state with a non-empty value
+            limit (int): stop once this many values have been collected
+
+        Returns:
+            frozenset: the union of the accept values
+        """
+        cache = self._cache
+        trans, accepting = cache.trans, cache.accepting
+        sid = START
+        found = accepting[sid]
+        if found and (first or len(found) == limit):
+            return found
+        for code in codes:
+            nxt = trans[sid][code]
+            if nxt is None:
+                cache, nxt = self._compute(cache, sid, code)
+                trans, accepting = cache.trans, cache.accepting
+            if nxt == DEAD:
+                break
+            sid = nxt
+            value = accepting[sid]
+            if value and not value <= found:
+                found = found | value
+                if first or len(found) == limit:
+                    break
+        return found
+
+
+class DFASizeError(ValueError):
+    """ Raised when the subset construction exceeds its state budget. """
+
+
+class DFA(object):
+    """ A complete, minimal DFA over the classes of an Alphabet.
+
+    Attributes:
+        alphabet (Alphabet): maps codes to columns of `table`
+        table (array): the transition table, row major: the successor of
+                       state `s` on class `c` is `table[s * len(alphabet) + c]`
+        rows (list): `table` split into a list per state, which is faster to
+                     index from Python: the successor is `rows[s][c]`.  In
+                     byte mode each row is expanded to 256 entries, indexed
+                     by the byte value itself instead of its class.
+        accepting (list): the accept value of each state
+        start (int): the start state
+        dead (int): the state no input can leave or accept from, or -1
+        build_time (float): seconds spent on construction and minimization
+        subset_states (int): the number of states before minimization
+    """
+    def __init__(self, alphabet, table, accepting, start, dead,
+                 build_time=0.0, subset_states=None, byte_mode=False):
+        self.alphabet = alphabet
+        self.table = table
+        self.byte_mode = byte_mode
+        ncls = len(alphabet)
+        self.rows = [table[row:row + ncls].tolist()
+                     for row in range(0, len(table), ncls)]
+        if byte_mode:
+            classes = alphabet.byte_classes
+            self.rows = [[row[cls] for cls in classes] for row in self.rows]
+        self.accepting = accepting
+        self.start = start
+        self.dead = dead
+        self.build_time = build_time
+        self.subset_states = subset_states
+        self._universal = None
+
+    @property
+    def num_states(self):
+        return len(self.accepting)
+
+    def __len__(self):
+        return self.num_states
+
+    def __repr__(self):
+        return '<DFA: {} states, {} classes, built in {:.3g}s>'.format(
+            self.num_states, len(self.alphabet), self.build_time)
+
+    @classmethod
+    def build(cls, start, step, accepting, alphabet,
+              max_states=DEFAULT_MAX_STATES, byte_mode=False):
+        """ Run the subset construction and minimize the result.
+
+        Arguments:
+            start, step, accepting, byte_mode: as for `LazyDFA`
+            alphabet (Alphabet): the character classes of the NFA
+            max_states (int): the most DFA states the subset construction may
+                              create before giving up
+
+        Raises:
+            DFASizeError: if more than `max_states` states are needed
+        """
+        began = perf_counter()
+        table, accept_values, dead = subset_construction(
+            start, step, accepting, alphabet, max_states)
+        subset_states = len(accept_values)
+        table, accept_values, start, dead = minimize(
+            table, len(alphabet), accept_values, 0, dead)
+        return cls(alphabet, table, accept_values, start, dead,
+                   build_time=perf_counter() - began,
+                   subset_states=subset_states, byte_mode=byte_mode)
+
+    def match(self, codes):
+        """ Return True if the DFA accepts the whole of `codes`. """
+        return bool(self.accepting[self.feed(self.start, codes)])
+
+    # stream positions (see `LazyDFA.start_position`) are plain state numbers
+
+    def start_position(self):
+        return self.start
+
+    def feed(self, state, codes):
+        """ Advance `state` over `codes`, stopping early at the dead state.
+        """
+        rows, dead = self.rows, self.dead
+        if self.byte_mode:
+            for code in codes:
+                state = rows[state][code]
+                if state == dead:
+                    break
+            return state
+        memo, classify = self.alphabet._memo, self.alphabet
+        for code in codes:
+            cls = memo.get(code)
+            if cls is None:
+                cls = classify(code)
+            state = rows[state][cls]
+            if state == dead:
+                break
+        return state
+
+    def accepts(self, state):
+        return bool(self.accepting[state])
+
+    def is_dead(self, state):
+        return state == self.dead
+
+    def is_universal(self, state, alphabet=None):
+        """ Return True if every continuation from `state` accepts. """
+        if self._universal is None:
+            self._universal = universal_states(self.table, len(self.alphabet),
+                                               self.accepting)
+        return bool(self._universal[state])
+
+
+def universal_states(table, ncls, accepting):
+    """ Flag the states of a complete DFA from which every string accepts.
+
+    Returns:
+        bytearray: 1 for each state that can't reach a rejecting state
+    """
+    n = len(accepting)
+    inverse = [[] for _ in range(n)]
+    for state in range(n):
+        row = state * ncls
+        for cls in range(ncls):
+            inverse[table[row + cls]].append(state)
+    universal = bytearray(1 if value else 0 for value in accepting)
+    queue = deque(state for state in range(n) if not universal[state])
+    while queue:
+        for previous in inverse[queue.popleft()]:
+            if universal[previous]:
+                universal[previous] = 0
+                queue.append(previous)
+    return universal
+
+
+def is_universal(states, step, accepting, alphabet, limit):
+    """ Return True if every string read from the NFA state set `states`
+    leads to an accepting set, exploring at most `limit` sets (and answering
+    False beyond that).
+    """
+    seen = {states}
+    queue = [states]
+    for current in queue:
+        if not accepting(current):
+            return False
+        for code in alphabet.representatives:
+            nxt = step(current, code)
+            if nxt not in seen:
+                if len(seen) >= limit:
+                    return False
+                seen.add(nxt)
+                queue.append(nxt)
+    return True
+
+
+def subset_construction(start, step, accepting, alphabet, max_states):
+    """ Build the complete DFA for an NFA, state 0 being the start state.
+
+    Returns:
+        table, accepting, dead (tuple): the row major transition table, the
+        accept value of each state, and the state of the empty NFA state
+        set (or -1 if it is unreachable)
+    """
+    start = frozenset(start)
+    ids = {start: 0}
+    sets = [start]
+    table = array('l')
+    for states in sets:
+        for code in alphabet.representatives:
+            nxt = step(states, code)
+            sid = ids.get(nxt)
+            if sid is None:
+                if len(sets) >= max_states:
+                    raise DFASizeError(
+                        'subset construction needs more than {} DFA states; '
+                        'raise max_states or use a lazy DFA'
+                        .format(max_states))
+                sid = ids[nxt] = len(sets)
+                sets.append(nxt)
+            table.append(sid)
+    accept_values = [accepting(states) for states in sets]
+    return table, accept_values, ids.get(frozenset(), -1)
+
+
+def minimize(table, ncls, accepting, start, dead=-1):
+    """ Minimize a complete DFA with Hopcroft's partition refinement.
+
+    Arguments:
+        table (array): the row major transition table
+        ncls (int): the number of columns (alphabet classes)
+        accepting (list): the accept value of each state; states are only
+                          merged if their accept values are equal
+        start (int): the start state
+        dead (int): the dead state, or -1
+
+    Returns:
+        table, accepting, start, dead (tuple): the minimal DFA, with its
+        states numbered in breadth first order from the start state
+    """
+    n = len(accepting)
+    inverse = [[[] for _ in range(n)] for _ in range(ncls)]
+    for state in range(n):
+        row = state * ncls
+        for cls in range(ncls):
+            inverse[cls][table[row + cls]].append(state)
+
+    groups = {}
+    for state, value in enumerate(accepting):
+        groups.setdefault(value, []).append(state)
+    blocks = [set(group) for group in groups.values()]
+    block_of = [0] * n
+    for index, block in enumerate(blocks):
+        for state in block:
+            block_of[state] = index
+
+    largest = max(range(len(blocks)), key=lambda index: len(blocks[index]))
+    pending = set((index, cls) for index in range(len(blocks))
+                  if index != largest for cls in range(ncls))
+    while pending:
+        splitter, cls = pending.pop()
+        preimage = set()
+        for state in blocks[splitter]:
+            preimage.update(inverse[cls][state])
+        touched = {}
+        for state in preimage:
+            touched.setdefault(block_of[state], set()).add(state)
+        for index, inside in touched.items():
+            block = blocks[index]
+            if len(inside) == len(block):
+                continue
+            outside = block - inside
+            new = len(blocks)
+            blocks[index] = inside
+            blocks.append(outside)
+            for state in outside:
+                block_of[state] = new
+            smaller = index if len(inside) <= len(outside) else new
+            for other in range(ncls):
+                if (index, other) in pending:
+                    pending.add((new, other))
+                else:
+                    pending.add((smaller, other))
+
+    # renumber the blocks breadth first from the start state
+    order = {block_of[start]: 0}
+    queue = deque([block_of[start]])
+    minimal = array('l')
+    values = []
+    while queue:
+        block = queue.popleft()
+        state = next(iter(blocks[block]))
+        values.append(accepting[state])
+        row = state * ncls
+        for cls in range(ncls):
+            target = block_of[table[row + cls]]
+            if target not in order:
+                order[target] = len(order)
+                queue.append(target)
+            minimal.append(order[target])
+    dead = order.get(block_of[dead], -1) if dead >= 0 else -1
+    return minimal, values, 0, dead
@@ -0,0 +1,319 @@
+"""
+glushkov.py: match with the Glushkov automaton of a pattern, its state sets
+held in the bits of a Python int.
+
+The NFA built by `patcher.patch` has a state for every operator and epsilon
+arrows between them, which every step has to follow.  The Glushkov (or
+position) automaton has none: it has one state per position -- per
+character, class or '.' of the pattern -- plus an initial state, and an
+arrow from position p to position q whenever q can follow p in a match.
+Every arrow into q is labelled with q's character, so a step is
+
+    active = follow(active) & masks[character]
+
+where `masks[c]` has the bits of the positions matching `c`.  `follow`
+splits the arrows three ways: arrows to the next position (most of them, in
+a pattern made mostly of concatenations) are a single shift and mask,
+self-loops (`x*` of a single position) are a mask, and the few others
+(the ends of loops and alternatives) are looked up, memoized, from the
+active positions that have them -- the extended Shift-And of Navarro and
+Raffinot.  There is no subset construction, so no risk of DFA blowup either.
+"""
+
+from functools import singledispatch
+
+from .alphabet import Alphabet
+from .parser import (LiteralExpr, StringExpr, TrieExpr, StarExpr, ChoiceExpr,
+                     ConcatExpr, CharClassExpr, DotExpr, NullString,
+                     RepeatExpr, GroupExpr, children, fold)
+from .patcher import repeat_bounds
+
+# the most distinct jump results memoized before the memo is cleared
+MAX_JUMPS = 4096
+
+
+def bits(mask):
+    """ Yield the numbers of the set bits of `mask`, lowest first. """
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class Glushkov(object):
+    """ The Glushkov automaton of an expression tree, run bit-parallel.
+
+    Bit 0 is the initial state; bits 1 to `n` are the positions, numbered
+    left to right through the pattern.
+
+    Arguments:
+        tree (TreeNode): an expression tree from `parser.parse`, optimized
+                         or not
+        byte_mode (bool): if True, inputs are bytes-like
+
+    Attributes:
+        n (int): the number of positions
+        labels (list): what each position matches: a code, a
+                       `charset.CharSet`, or None for '.'; None for bit 0
+        follow (list): for each state, the mask of the positions that can
+                       come next
+        accept (int): the mask of the states a match can end in
+        shift, loops, other (int): the masks of the states with an arrow to
+                                   the next position, to themselves, and
+                                   to anything else
+        jumps (list): for the states in `other`, their other arrows
+    """
+    def __init__(self, tree, byte_mode=False):
+        self.byte_mode = byte_mode
+        self.labels = [None]
+        self.follow = [0]
+        first, last, nullable = fold(
+            tree, lambda node, *parts: build(node, self, *parts),
+            children=glushkov_children)
+        self.n = len(self.labels) - 1
+        self.follow[0] = first
+        self.accept = last | (1 if nullable else 0)
+
+        shift = loops = other = 0
+        self.jumps = [0] * (self.n + 1)
+        for state, follow in enumerate(self.follow):
+            bit = 1 << state
+            if follow & bit << 1:
+                shift |= bit
+                follow &= ~(bit << 1)
+            if follow & bit:
+                loops |= bit
+                follow &= ~bit
+            if follow:
+                other |= bit
+                self.jumps[state] = follow
+        self.shift, self.loops, self.other = shift, loops, other
+        self._jump_memo = {}
+
+        # the mask of every class of characters the positions tell apart
+        self.alphabet = Alphabet(label for label in self._spans())
+        self.class_masks = [self._mask(code)
+                            for code in self.alphabet.representatives]
+        self._masks = {}
+        if byte_mode:
+            self._masks = [self.class_masks[cls]
+                           for cls in self.alphabet.byte_classes]
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_jump_memo'] = {}
+        if not self.byte_mode:
+            state['_masks'] = {}
+        return state
+
+    def __repr__(self):
+        return '<Glushkov: {} positions>'.format(self.n)
+
+    def position(self, label):
+        """ Add a position matching `label`, returning its bit. """
+        self.labels.append(label)
+        self.follow.append(0)
+        return 1 << (len(self.labels) - 1)
+
+    def link(self, last, first):
+        """ Let every position of `last` be followed by those of `first`. """
+        follow = self.follow
+        for state in bits(last):
+            follow[state] |= first
+
+    def _spans(self):
+        for label in self.labels[1:]:
+            if isinstance(label, int):
+                yield [(label, label)]
+            elif label is not None:
+                yield label.spans
+
+    def _mask(self, code):
+        mask = 0
+        for state, label in enumerate(self.labels[1:], 1):
+            if (label is None or label == code or
+                    not isinstance(label, int) and code in label):
+                mask |= 1 << state
+        return mask
+
+    def mask(self, code):
+        """ The mask of the positions matching the character `code`. """
+        masks = self._masks
+        if self.byte_mode:
+            return masks[code]
+        mask = masks.get(code)
+        if mask is None:
+            mask = masks[code] = self.class_masks[self.alphabet(code)]
+        return mask
+
+    def _jump(self, active):
+        """ The positions the arrows outside `shift` and `loops` lead to
+        from `active`, a subset of `other`.
+        """
+        memo = self._jump_memo
+        result = memo.get(active)
+        if result is None:
+            if len(memo) >= MAX_JUMPS:
+                memo.clear()
+            result = 0
+            jumps = self.jumps
+            for state in bits(active):
+                result |= jumps[state]
+            memo[active] = result
+        return result
+
+    def step(self, active, code):
+        """ The states reached from the mask `active` on `code`. """
+        follow = ((active & self.shift) << 1) | (active & self.loops)
+        jump = active & self.other
+        if jump:
+            follow |= self._jump(jump)
+        return follow & self.mask(code)
+
+    def match(self, codes):
+        """ Return True if the automaton accepts the whole of `codes`. """
+        shift, loops, other = self.shift, self.loops, self.other
+        masks, jump_memo, jump = self._masks, self._jump_memo, self._jump
+        mask = self.mask
+        byte_mode = self.byte_mode
+        active = 1
+        for code in codes:
+            follow = ((active & shift) << 1) | (active & loops)
+            jumping = active & other
+            if jumping:
+                found = jump_memo.get(jumping)
+                follow |= found if found is not None else jump(jumping)
+            if byte_mode:
+                active = follow & masks[code]
+            else:
+                found = masks.get(code)
+                active = follow & (found if found is not None
+                                   else mask(code))
+            if not active:
+                return False
+        return bool(active & self.accept)
+
+
+def glushkov_children(node):
+    """ The subtrees `build` needs the positions of before `node`.
+
+    Each copy of the operand of a counted repetition gets positions of its
+    own, so the operand is listed once per copy.
+    """
+    if isinstance(node, RepeatExpr):
+        low, high, repetand = repeat_bounds(node)
+        if high == 0:
+            return ()
+        return (repetand,) * (high if high is not None else max(low, 1))
+    return children(node)
+
+
+def concat(automaton, left, right):
+    """ The `(first, last, nullable)` of `left` followed by `right`. """
+    L_first, L_last, L_nullable = left
+    R_first, R_last, R_nullable = right
+    automaton.link(L_last, R_first)
+    return (L_first | (R_first if L_nullable else 0),
+            R_last | (L_last if R_nullable else 0),
+            L_nullable and R_nullable)
+
+
+def string(automaton, value):
+    part = (0, 0, True)
+    for ch in value:
+        bit = automaton.position(ord(ch))
+        part = concat(automaton, part, (bit, bit, False))
+    return part
+
+
+@singledispatch
+def build(obj, automaton, *parts):
+    """ Add the positions of one expression tree node to `automaton`.
+
+    Arguments:
+        obj (TreeNode): the node
+        automaton (Glushkov): the automaton being built
+        parts: the `(first, last, nullable)` of its children
+
+    Returns:
+        first, last, nullable (tuple): the masks of the positions a match of
+        the node can begin and end with, and whether it can be empty
+    """
+    raise TypeError("No Glushkov handler found for object {}".format(obj))
+
+
+@build.register(LiteralExpr)
+def literal_build(obj, automaton):
+    bit = automaton.position(ord(obj.value))
+    return (bit, bit, False)
+
+
+@build.register(CharClassExpr)
+def charclass_build(obj, automaton):
+    bit = automaton.position(obj.charset)
+    return (bit, bit, False)
+
+
+@build.register(DotExpr)
+def dot_build(obj, automaton):
+    bit = automaton.position(None)
+    return (bit, bit, False)
+
+
+@build.register(NullString)
+def null_build(obj, automaton):
+    return (0, 0, True)
+
+
+@build.register(StringExpr)
+def string_build(obj, automaton):
+    return string(automaton, obj.value)
+
+
+@build.register(TrieExpr)
+def trie_build(obj, automaton):
+    first = last = 0
+    for word in obj.words:
+        W_first, W_last, _ = string(automaton, word)
+        first, last = first | W_first, last | W_last
+    return (first, last, False)
+
+
+@build.register(ConcatExpr)
+def concat_build(obj, automaton, left, right):
+    return concat(automaton, left, right)
+
+
+@build.register(ChoiceExpr)
+def choice_build(obj, automaton, left, right):
+    return (left[0] | right[0], left[1] | right[1], left[2] or right[2])
+
+
+@build.register(GroupExpr)
+def group_build(obj, automaton, operand):
+    return operand
+
+
+@build.register(StarExpr)
+def star_build(obj, automaton, repetand):
+    first, last, _ = repetand
+    automaton.link(last, first)
+    return (first, last, True)
+
+
+@build.register(RepeatExpr)
+def repeat_build(obj, automaton, *copies):
+    """ Counted repetition, `x{m,n}`: the copies follow one another, those
+    past the m-th being optional, and for `x{m,}` the last one repeats.
+    """
+    low, high, _ = repeat_bounds(obj)
+    if not copies:
+        return (0, 0, True)
+    if high is None:
+        first, last, _ = copies[-1]
+        automaton.link(last, first)
+    part = (0, 0, True)
+    for number, (first, last, nullable) in enumerate(copies, 1):
+        part = concat(automaton, part, (first, last,
+                                        nullable or number > low))
+    return part
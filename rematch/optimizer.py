@@ -0,0 +1,301 @@
+"""
+optimizer.py: simplify the expression tree between `parser.parse` and
+`patcher.patch`.
+
+The tree `parse` builds mirrors the text of the pattern: `a|b|c` is a chain
+of ChoiceExprs, `abc` a chain of ConcatExprs each patched into a state and an
+epsilon bridge, and `a+` holds its operand twice.  `optimize` rewrites it
+into an equivalent tree that patches into fewer states and fewer epsilon
+arrows:
+
+    hash_cons: identical subtrees become one shared object, which also lets
+               the other rewrites spot repeats by identity ('x|x', 'xx*')
+    merge_classes: alternatives of single characters merge into one
+                   CharClassExpr ('a|b|[cd]' -> '[a-d]')
+    fuse_literals: runs of literals fuse into a StringExpr, patched as a
+                   chain of arrows with no epsilons between them
+    simplify: redundant constructs go away: '(x*)*', '(x?)*' and '(x*)?'
+              become 'x*', empty strings drop out of concatenations, and
+              'xx*' becomes the single copy repetition 'x{1,}'
+    tries: the literal strings among the alternatives of an alternation (as
+           fused by fuse_literals) gather into a TrieExpr ('foo|bar|baz' ->
+           a trie sharing 'ba'), patched into one State per distinct prefix
+           instead of a chain of Split states fanning out to every
+           alternative
+
+The capturing groups of a tree parsed with `captures=True` are dropped:
+only `pike.PikeVM` reports them, and it runs on the tree as parsed.
+"""
+
+from .charset import CharSet
+from .parser import (LiteralExpr, StringExpr, TrieExpr, StarExpr,
+                     ChoiceExpr, ConcatExpr, CharClassExpr, NullString,
+                     RepeatExpr, GroupExpr, children, fold)
+
+OPTIMIZATIONS = ('hash_cons', 'merge_classes', 'fuse_literals', 'simplify',
+                 'tries')
+
+
+class _Run(object):
+    """ The characters of a literal run still being fused.
+
+    Runs only live between the steps of a single `Optimizer` pass: each one
+    belongs to exactly one parent, which may extend it in place, so fusing
+    a run of n literals costs O(n) rather than copying a string at every
+    step.
+    """
+    __slots__ = ('chars',)
+
+    def __init__(self, chars):
+        self.chars = chars
+
+
+class _Words(object):
+    """ The alternatives of a literal alternation still being gathered.
+
+    Like a `_Run`, it belongs to a single parent, which may add to it in
+    place.
+    """
+    __slots__ = ('words',)
+
+    def __init__(self, words):
+        self.words = words
+
+
+def charset(node):
+    """ The CharSet a single character node matches, or None. """
+    if isinstance(node, LiteralExpr):
+        return CharSet.from_chars(node.value)
+    if isinstance(node, CharClassExpr):
+        return node.charset
+    return None
+
+
+class Optimizer(object):
+    """ One optimization pass over a tree (see the module docstring).
+
+    Arguments:
+        hash_cons, merge_classes, fuse_literals, simplify, tries (bool): the
+            optimizations to apply
+    """
+    def __init__(self, hash_cons=True, merge_classes=True, fuse_literals=True,
+                 simplify=True, tries=True):
+        self.hash_cons = hash_cons
+        self.merge_classes = merge_classes
+        self.fuse_literals = fuse_literals
+        self.simplify = simplify
+        self.tries = tries
+        self.table = {}
+
+    def __call__(self, tree):
+        return self.finish(fold(tree, self.combine))
+
+    def make(self, node):
+        """ Return the shared copy of `node`, whose children are shared
+        already.
+        """
+        if not self.hash_cons:
+            return node
+        subtrees = children(node)
+        if subtrees:
+            # keyed on the identity of the children, so that hashing never
+            # walks a whole subtree
+            key = (type(node), node.right if isinstance(node, RepeatExpr)
+                   else None) + tuple(map(id, subtrees))
+        else:
+            key = (type(node), node.left)
+        return self.table.setdefault(key, node)
+
+    def finish(self, result):
+        """ Turn the literal runs and alternations in `result` into tree
+        nodes.
+        """
+        if isinstance(result, _Words):
+            words = result.words
+            if len(words) == 1:
+                return self.finish(_Run(list(words.pop())))
+            if self.merge_classes and all(len(word) == 1 for word in words):
+                return self.merge(CharSet.from_chars(''.join(words)))
+            return self.make(TrieExpr(words))
+        if isinstance(result, _Run):
+            chars = result.chars
+            if len(chars) == 1:
+                return self.make(LiteralExpr(chars[0]))
+            return self.make(StringExpr(''.join(chars)))
+        if isinstance(result, ChoiceExpr) and isinstance(result.left, _Words):
+            return self.alternate(self.finish(result.left), result.right)
+        if isinstance(result, ConcatExpr) and isinstance(result.right, _Run):
+            return self.make(ConcatExpr(result.left,
+                                        self.finish(result.right)))
+        return result
+
+    def combine(self, node, *results):
+        if isinstance(node, ConcatExpr):
+            return self.concat(*results)
+        if isinstance(node, ChoiceExpr):
+            return self.choice(*results)
+        if isinstance(node, GroupExpr):
+            return results[0]
+        results = [self.finish(result) for result in results]
+        if isinstance(node, StarExpr):
+            return self.star(*results)
+        if isinstance(node, RepeatExpr):
+            return self.repeat(node, *results)
+        return self.make(node)
+
+    def run(self, result):
+        """ `result` as a _Run, if it is a literal one. """
+        if isinstance(result, LiteralExpr):
+            return _Run([result.value])
+        if isinstance(result, StringExpr):
+            return _Run(list(result.value))
+        return result
+
+    def concat(self, left, right):
+        if self.fuse_literals:
+            left, right = self.run(left), self.run(right)
+            if isinstance(right, _Run):
+                # a result ending in a run (a _Run, or a ConcatExpr whose
+                # right side is one) swallows the new characters
+                if isinstance(left, _Run):
+                    left.chars.extend(right.chars)
+                    return left
+                if (isinstance(left, ConcatExpr) and
+                        isinstance(left.right, _Run)):
+                    left.right.chars.extend(right.chars)
+                    return left
+                left = self.finish(left)
+                if self.simplify and isinstance(left, NullString):
+                    return right
+                return ConcatExpr(left, right)
+        left, right = self.finish(left), self.finish(right)
+        if self.simplify:
+            if isinstance(left, NullString):
+                return right
+            if isinstance(right, NullString):
+                return left
+            if isinstance(right, StarExpr) and left is right.repetand:
+                return self.make(RepeatExpr(left, 1, None))
+        return self.make(ConcatExpr(left, right))
+
+    def words(self, result):
+        """ `result` as a new or reused _Words, if it only matches
+        non-empty literal strings.
+        """
+        if isinstance(result, _Words):
+            return result
+        if isinstance(result, _Run):
+            return _Words({''.join(result.chars)})
+        if isinstance(result, (LiteralExpr, StringExpr)):
+            return _Words({result.value})
+        if isinstance(result, TrieExpr):
+            return _Words(set(result.words))
+        return None
+
+    def choice(self, left, right):
+        if self.tries:
+            # the alternatives gathered so far are kept unfinished as the
+            # left branch of an open ChoiceExpr, where the next alternative up
+            # the chain will find them
+            gathered, rest = [], []
+            for result in (left, right):
+                words = self.words(result)
+                if words is not None:
+                    gathered.append(words)
+                elif (isinstance(result, ChoiceExpr) and
+                        isinstance(result.left, _Words)):
+                    gathered.append(result.left)
+                    rest.append(result.right)
+                else:
+                    rest.append(self.finish(result))
+            if gathered:
+                # add the smaller set to the larger, keeping long chains of
+                # alternatives linear
+                words = max(gathered, key=lambda found: len(found.words))
+                for other in gathered:
+                    if other is not words:
+                        words.words.update(other.words)
+                if not rest:
+                    return words
+                return ChoiceExpr(words, self.alternate(*rest)
+                                  if len(rest) == 2 else rest[0])
+        return self.alternate(self.finish(left), self.finish(right))
+
+    def alternate(self, left, right):
+        if self.simplify:
+            if left is right:
+                return left
+            if isinstance(left, StarExpr) and isinstance(right, NullString):
+                return left
+            if isinstance(left, NullString) and isinstance(right, StarExpr):
+                return right
+        if self.merge_classes:
+            # the merged class is kept as the left branch, where the next
+            # alternative up the chain will find it
+            left_set, right_set = charset(left), charset(right)
+            if left_set is not None and right_set is not None:
+                return self.merge(left_set, right_set)
+            if right_set is not None:
+                left, right = right, left
+                left_set, right_set = right_set, left_set
+            if left_set is not None and isinstance(right, ChoiceExpr):
+                inner = charset(right.left)
+                if inner is not None:
+                    return self.make(ChoiceExpr(self.merge(left_set, inner),
+                                                right.right))
+        return self.make(ChoiceExpr(left, right))
+
+    def merge(self, *charsets):
+        merged = CharSet([span for chars in charsets for span in chars.spans])
+        if len(merged.spans) == 1 and merged.spans[0][0] == merged.spans[0][1]:
+            return self.make(LiteralExpr(chr(merged.spans[0][0])))
+        return self.make(CharClassExpr(values=merged))
+
+    def star(self, repetand):
+        if self.simplify:
+            if (isinstance(repetand, ChoiceExpr) and
+                    isinstance(repetand.right, NullString)):
+                repetand = repetand.left
+            if (isinstance(repetand, RepeatExpr) and repetand.min <= 1 and
+                    repetand.max is None):
+                repetand = repetand.repetand
+            if isinstance(repetand, (StarExpr, NullString)):
+                return repetand
+        return self.make(StarExpr(repetand))
+
+    def repeat(self, node, repetand):
+        if self.simplify:
+            bounds = (node.min, node.max)
+            if node.max == 0:
+                return self.make(NullString())
+            if bounds == (1, 1):
+                return repetand
+            if bounds == (0, None):
+                return self.star(repetand)
+        return self.make(RepeatExpr(repetand, node.min, node.max))
+
+
+def optimize(tree, optimizations=True):
+    """ Rewrite an expression tree returned by `parser.parse` into an
+    equivalent one that patches into a smaller NFA.
+
+    Arguments:
+        tree (TreeNode): the tree to optimize
+        optimizations (bool or iterable): the names of the optimizations to
+                                          apply, from OPTIMIZATIONS; True
+                                          applies all of them, False none
+
+    Returns:
+        TreeNode: the optimized tree
+    """
+    if optimizations is True:
+        optimizations = OPTIMIZATIONS
+    elif not optimizations:
+        return tree
+    optimizations = set(optimizations)
+    unknown = optimizations.difference(OPTIMIZATIONS)
+    if unknown:
+        raise ValueError('Unknown optimizations: {}'.format(
+            ', '.join(sorted(unknown))))
+    return Optimizer(**{name: name in optimizations
+                        for name in OPTIMIZATIONS})(tree)
@@ -9,8 +9,26 @@ valued nodes.
 
 from collections import deque, namedtuple
 from functools import reduce
-from itertools import takewhile
-from string import ascii_letters, digits
+from itertools import islice
+from string import ascii_letters, digits, hexdigits
+
+from .charset import CharSet
+
+# the largest count allowed in a counted repetition, '{m,n}'
+MAX_REPEAT = 1000
+
+# single character escapes, and the number of hex digits of numeric ones
+ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', 'f': '\f', 'v': '\v', '0': '\0'}
+HEX_ESCAPES = {'x': 2, 'u': 4, 'U': 8}
+# escapes standing for a whole class of (ASCII) characters
+DIGIT = CharSet.from_chars(digits)
+WORD = CharSet.from_chars(ascii_letters + digits + '_')
+SPACE = CharSet.from_chars(' \t\n\r\f\v')
+CLASS_ESCAPES = {
+    'd': DIGIT, 'D': CharSet(DIGIT.spans, negate=True),
+    'w': WORD, 'W': CharSet(WORD.spans, negate=True),
+    's': SPACE, 'S': CharSet(SPACE.spans, negate=True),
+}
 
 TreeNode = namedtuple('TreeNode', 'left right')
 TreeNode.__doc__ = """ Base class for building Tree like structures.
@@ -40,6 +58,41 @@ class LiteralExpr(TreeNode):
         return self.left
 
 
+class StringExpr(TreeNode):
+    """ A run of literal characters, matched one after the other.
+
+    `parse` never produces these; `optimizer.optimize` fuses runs of
+    LiteralExprs into them.
+    """
+    __slots__ = ()
+
+    def __new__(cls, value):
+        return super(StringExpr, cls).__new__(cls, left=value, right=None)
+
+    @property
+    def value(self):
+        return self.left
+
+
+class TrieExpr(TreeNode):
+    """ An alternation of literal strings, matched through a shared prefix
+    trie.
+
+    `parse` never produces these; `optimizer.optimize` gathers alternatives
+    made only of literals into them.  The left branch holds the sorted tuple
+    of alternatives, none of them empty.
+    """
+    __slots__ = ()
+
+    def __new__(cls, words):
+        return super(TrieExpr, cls).__new__(cls, left=tuple(sorted(words)),
+                                            right=None)
+
+    @property
+    def words(self):
+        return self.left
+
+
 class NullString(TreeNode):
     """ The null string, '' """
     __slots__ = ()
@@ -79,6 +132,31 @@ class ConcatExpr(TreeNode):
         return super(ConcatExpr, cls).__new__(cls, left=left, right=right)
 
 
+class RepeatExpr(TreeNode):
+    """ Counted repetition ('{m}', '{m,}', '{m,n}').
+
+    The right branch holds the `(min, max)` bounds instead of a subtree; max
+    is None for an unbounded repetition.
+    """
+    __slots__ = ()
+
+    def __new__(cls, operand, min, max=None):
+        return super(RepeatExpr, cls).__new__(cls, left=operand,
+                                              right=(min, max))
+
+    @property
+    def repetand(self):
+        return self.left
+
+    @property
+    def min(self):
+        return self.right[0]
+
+    @property
+    def max(self):
+        return self.right[1]
+
+
 class DotExpr(TreeNode):
     __slots__ = ()
 
@@ -86,7 +164,26 @@ class DotExpr(TreeNode):
         return super(DotExpr, cls).__new__(cls, left='.', right=None)
 
 
+class GroupExpr(TreeNode):
+    """ A capturing group ('(...)' when parsing with `captures=True`).
+
+    The right branch holds the number of the group, counted from 1 in the
+    order of the opening parentheses.
+    """
+    __slots__ = ()
+
+    def __new__(cls, operand, index):
+        return super(GroupExpr, cls).__new__(cls, left=operand, right=index)
+
+    @property
+    def index(self):
+        return self.right
+
+
 class CharClassExpr(TreeNode):
+    """ A character class ('[a-z]', '[^0-9]', '\\d', ...): any one of the
+    characters of a `charset.CharSet`.
+    """
     __slots__ = ()
 
     def __new__(cls, values):
@@ -97,78 +194,279 @@ class CharClassExpr(TreeNode):
         return self.left
 
 
-def parse(regex):
+def parse_escape(RE):
+    """ Read the escape sequence following a backslash from the iterator
+    `RE`.
+
+    Returns:
+        a single character (str), or a CharSet for '\\d', '\\w', '\\s' and
+        their negations '\\D', '\\W', '\\S'
+    """
+    ch = next(RE, None)
+    if ch is None:
+        raise ValueError('bad escape (end of pattern)')
+    if ch in HEX_ESCAPES:
+        size = HEX_ESCAPES[ch]
+        number = ''.join(islice(RE, size))
+        if len(number) != size or not all(d in hexdigits for d in number):
+            raise ValueError('bad escape \\{}{}'.format(ch, number))
+        code = int(number, 16)
+        if code > 0x10ffff:
+            raise ValueError('bad escape \\{}{}'.format(ch, number))
+        return chr(code)
+    if ch in CLASS_ESCAPES:
+        return CLASS_ESCAPES[ch]
+    return ESCAPES.get(ch, ch)
+
+
+def parse_class(RE):
+    """ Parse a character class from the iterator `RE`, up to and including
+    its closing ']' (the opening '[' has already been read).
+
+    A leading '^' negates the class, and a ']' right after the '[' (or '[^')
+    or a '-' at either end stand for themselves.
+
+    Returns:
+        CharSet: the characters the class matches
+    """
+    spans = []
+    negate = False
+    ch = next(RE, None)
+    if ch == '^':
+        negate = True
+        ch = next(RE, None)
+    first = True
+    while ch != ']' or first:
+        if ch is None:
+            raise ValueError('unterminated character class')
+        first = False
+        lo = parse_escape(RE) if ch == '\\' else ch
+        ch = next(RE, None)
+        if ch == '-':
+            ch = next(RE, None)
+            if ch == ']':
+                # a trailing '-' is literal
+                spans.append((ord('-'), ord('-')))
+            elif ch is not None:
+                hi = parse_escape(RE) if ch == '\\' else ch
+                if isinstance(lo, CharSet) or isinstance(hi, CharSet) or \
+                        hi < lo:
+                    raise ValueError('bad character range {}-{}'.format(
+                        lo, hi))
+                spans.append((ord(lo), ord(hi)))
+                ch = next(RE, None)
+                continue
+        if isinstance(lo, CharSet):
+            spans.extend(lo.spans)
+        else:
+            spans.append((ord(lo), ord(lo)))
+    return CharSet(spans, negate)
+
+
+def parse_repeat(RE):
+    """ Parse the bounds of a counted repetition from the iterator `RE`, up
+    to and including its closing '}' (the opening '{' has already been
+    read).
+
+    Returns:
+        min, max (tuple): the bounds; max is None if there is no upper bound
+    """
+    text = ''
+    for ch in RE:
+        if ch == '}':
+            break
+        text += ch
+    else:
+        raise ValueError('unterminated repetition {{{}'.format(text))
+    low, comma, high = text.partition(',')
+    if not (low or high) or not all(part.isdigit() for part in (low, high)
+                                    if part):
+        raise ValueError('bad repetition {{{}}}'.format(text))
+    low = int(low) if low else 0
+    if not comma:
+        high = low
+    else:
+        high = int(high) if high else None
+    if max(low, high or 0) > MAX_REPEAT:
+        raise ValueError('repetition count over {} in {{{}}}'.format(
+            MAX_REPEAT, text))
+    if high is not None and high < low:
+        raise ValueError('min repeat greater than max repeat in {{{}}}'
+                         .format(text))
+    return low, high
+
+
+def parse(regex, captures=False):
     """ Turn a string regex into an expression tree.
 
     This function will transform the string representation of a regular
     expression into an expression tree using the LiteralExpr, StarExpr,
     ChoiceExpr, and ConcatExpr classes.  NullString, a special form of a
-    LiteralExpr, is also used.  `parse` handles parentheses and alternation by
-    recursing into the component subexpressions; the rest are handled via a
-    simple stack structure.
+    LiteralExpr, is also used.  `parse` reads the pattern in a single loop,
+    without recursing: the terms of the branch being read are kept on a
+    stack, and opening a group saves that stack, along with the finished
+    branches of the enclosing alternation, on a stack of groups.  So the
+    depth of nesting and the length of the pattern are only limited by
+    memory.
 
     Supported Syntax:
         literals (including the '.' metacharacter)
         The Kleene star (asterisk, '*')
-        Alternation (pipe, '|')
+        Alternation (pipe, '|'); either side may be empty
         The One or More quantifier (plus, '+')
         The Zero or One quantifier (question mark, '?')
-        The backslash for escaping special characters ('\\')
+        Counted repetition ('{m}', '{m,}', '{,n}', '{m,n}'), for counts up to
+            MAX_REPEAT; a literal '{' must be escaped
+        The backslash for escaping special characters ('\\'), and the
+            escapes '\\n', '\\t', '\\r', '\\f', '\\v', '\\0', '\\xhh',
+            '\\uhhhh', '\\Uhhhhhhhh', '\\d', '\\w', '\\s', '\\D', '\\W', '\\S'
+        Character classes ('[abc]'), with ranges ('[a-z]'), negation
+            ('[^0-9]') and escapes
         Parentheses for grouping.
+
+    Arguments:
+        regex (str): the regular expression
+        captures (bool): if True, wrap every parenthesized group in a
+                         GroupExpr, numbered in the order of its opening
+                         parenthesis; otherwise parentheses leave no trace in
+                         the tree
+
+    Raises:
+        ValueError: for malformed escapes, character classes and
+                    repetitions, unbalanced parentheses, and quantifiers
+                    with nothing to repeat
     """
-    # TODO: character class metachars need special handling too
     if not regex:
         return NullString()
     RE = iter(regex)
     stack = deque()
+    branches = []
+    groups = []
+    count = 0
     for ch in RE:
         if ch == '(':
-            stack.append(parse(RE))
+            count += 1
+            groups.append((stack, branches, count))
+            stack, branches = deque(), []
         elif ch == ')':
-            return reduce(ConcatExpr, stack)
+            if not groups:
+                raise ValueError('unbalanced parenthesis')
+            group = alternation(branches, stack)
+            stack, branches, index = groups.pop()
+            if captures:
+                group = GroupExpr(group, index)
+            stack.append(group)
+        elif ch == '|':
+            branches.append(stack)
+            stack = deque()
         elif ch == '.':
             stack.append(DotExpr())
-
         elif ch == '[':
-            values = list(takewhile(lambda x: x != ']', RE))
-            print(values)
-            stack.append(CharClassExpr(values=values))
-
-        elif ch == '*':
-            op = stack.pop()
-            stack.append(StarExpr(op))
-        elif ch == '?':
+            stack.append(CharClassExpr(values=parse_class(RE)))
+        elif ch in '*?+{':
+            if not stack:
+                raise ValueError('nothing to repeat')
             op = stack.pop()
-            stack.append(ChoiceExpr(op, NullString()))
-        elif ch == '+':
-            op = stack.pop()
-            stack.append(ConcatExpr(op, StarExpr(op)))
-        elif ch == '|':
-            left = reduce(ConcatExpr, stack)
-            stack.clear()
-            right = parse(RE)
-            stack.append(ChoiceExpr(left, right))
+            if ch == '*':
+                stack.append(StarExpr(op))
+            elif ch == '?':
+                stack.append(ChoiceExpr(op, NullString()))
+            elif ch == '+':
+                stack.append(ConcatExpr(op, StarExpr(op)))
+            else:
+                stack.append(RepeatExpr(op, *parse_repeat(RE)))
         elif ch == '\\':
-            ch = next(RE)
-            stack.append(LiteralExpr(ch))
+            escaped = parse_escape(RE)
+            if isinstance(escaped, CharSet):
+                stack.append(CharClassExpr(values=escaped))
+            else:
+                stack.append(LiteralExpr(escaped))
         else:
             stack.append(LiteralExpr(ch))
-    stack = reduce(ConcatExpr, stack)
-    return stack
+    if groups:
+        raise ValueError('missing ), unterminated subpattern')
+    return alternation(branches, stack)
+
+
+def concatenation(terms):
+    """ Join the terms of a branch into a left leaning chain of ConcatExprs.
+    """
+    if not terms:
+        return NullString()
+    return reduce(ConcatExpr, terms)
+
+
+def alternation(branches, last):
+    """ Join the branches of an alternation, the last of which is `last`,
+    into a right leaning chain of ChoiceExprs (as in 'a|(b|c)').
+    """
+    tree = concatenation(last)
+    for terms in reversed(branches):
+        tree = ChoiceExpr(concatenation(terms), tree)
+    return tree
+
+
+def children(node):
+    """ The subtrees of an expression tree node, left to right. """
+    if isinstance(node, (ConcatExpr, ChoiceExpr)):
+        return (node.left, node.right)
+    if isinstance(node, (StarExpr, RepeatExpr, GroupExpr)):
+        return (node.left,)
+    return ()
+
+
+def fold(tree, combine, children=children):
+    """ Evaluate an expression tree bottom up, without recursion.
+
+    Arguments:
+        tree (TreeNode): the tree to evaluate
+        combine (callable): called as `combine(node, *results)` for every
+                            node, with the results for its children
+        children (callable): returns the children of a node
+
+    Returns:
+        the result of `combine` for the root of `tree`
+    """
+    results = []
+    stack = [(tree, None)]
+    while stack:
+        node, subtrees = stack.pop()
+        if subtrees is None:
+            subtrees = children(node)
+            if subtrees:
+                stack.append((node, subtrees))
+                stack.extend((child, None) for child in reversed(subtrees))
+                continue
+        if subtrees:
+            args = results[-len(subtrees):]
+            del results[-len(subtrees):]
+        else:
+            args = ()
+        results.append(combine(node, *args))
+    return results[0]
 
 
 def walk_tree(tree):
     """ walks the tree 'in-order' style (not pre or post order). """
     if tree is None:
         yield
-    if isinstance(tree, LiteralExpr):
-        yield tree.value, tree.__class__.__name__
-    else:
-        if tree.left:
-            yield from walk_tree(tree.left)
-        yield tree.__class__.__name__
-        if tree.right:
-            yield from walk_tree(tree.right)
+        return
+    stack = [(tree, False)]
+    while stack:
+        node, visited = stack.pop()
+        if isinstance(node, (LiteralExpr, StringExpr, TrieExpr)):
+            yield node.left, node.__class__.__name__
+        elif visited:
+            yield node.__class__.__name__
+            if isinstance(node, (RepeatExpr, GroupExpr)):
+                yield node.right
+        else:
+            subtrees = children(node)
+            if len(subtrees) == 2:
+                stack.append((subtrees[1], False))
+            stack.append((node, True))
+            if subtrees:
+                stack.append((subtrees[0], False))
 
 
 def level_first_walk(tree):
@@ -178,10 +476,9 @@ def level_first_walk(tree):
     while queue:
         current = queue.popleft()
         yield current.__class__.__name__
-        if isinstance(current, LiteralExpr):
-            yield current.value
+        if isinstance(current, (LiteralExpr, StringExpr, TrieExpr)):
+            yield current.left
             continue
-        if current.left:
-            queue.append(current.left)
-        if current.right:
-            queue.append(current.right)
+        queue.extend(children(current))
+        if isinstance(current, (RepeatExpr, GroupExpr)):
+            yield current.right
@@ -3,11 +3,20 @@ patcher.py: tools to convert an expression tree returned by `parser.parse` into
 an NFA machine-state graph.
 """
 
+from copy import copy
 from itertools import count
 from functools import singledispatch
+from threading import Lock
 
-from .parser import (LiteralExpr, StarExpr, ChoiceExpr, ConcatExpr,
-                     CharClassExpr, DotExpr, NullString, parse)
+from .parser import (LiteralExpr, StringExpr, TrieExpr, StarExpr,
+                     ChoiceExpr, ConcatExpr, CharClassExpr, DotExpr,
+                     NullString, RepeatExpr, GroupExpr, children, fold, parse)
+
+# the most States a counted repetition may expand to
+MAX_REPEAT_STATES = 100000
+
+# guards `State.Index`, which patterns compiled on different threads share
+_INDEX_LOCK = Lock()
 
 
 class State(list):
@@ -22,7 +31,8 @@ class State(list):
 
     def __init__(self, *arrows):
         super(State, self).__init__(arrows)
-        self.id = next(State.Index)
+        with _INDEX_LOCK:
+            self.id = next(State.Index)
 
     def __str__(self):
         return self.__repr__()
@@ -96,25 +106,43 @@ class Epsilon(Arrow):
         return 'Epsilon arrow pointing at {}'.format(self.pointsAt.id)
 
 
+class Save(Epsilon):
+    """ An Epsilon arrow that records the position it is followed at in a
+    capture slot (see `pike.PikeVM`).  The other engines follow it like any
+    other epsilon arrow.
+    """
+    def __init__(self, slot, pointsAt=None):
+        self.slot = slot
+        self.pointsAt = pointsAt
+        self.value = None
+
+    def __str__(self):
+        return 'Save arrow for slot {} pointing at {}'.format(
+            self.slot, self.pointsAt.id)
+
+
 class CharClassArrow(Arrow):
+    """ An arrow labelled with a `charset.CharSet`. """
     def __init__(self, values, pointsAt=None):
         self.values = values
         self.pointsAt = pointsAt
 
     def __call__(self, inp):
-        if inp in self.values:
+        if ord(inp) in self.values:
             return self.pointsAt
         return None
 
 
-@singledispatch
-def patch(obj):
+def patch(tree):
     """ Construct an NFA from an expression tree.
 
-    `patch` calls itself recursively to convert an expression tree into a
-    suitable NFA represented as a graph with three kinds of obects: States,
-    which are collections of outgoing arrows, (labeled) Arrows, and Epsilon
-    arrows.
+    `patch` converts an expression tree into a suitable NFA represented as a
+    graph with three kinds of obects: States, which are collections of
+    outgoing arrows, (labeled) Arrows, and Epsilon arrows.  The tree is
+    walked bottom up with an explicit stack (see `parser.fold`), so deeply
+    nested or very long patterns don't run out of Python stack frames; the
+    fragment for each node is built by `build` from the fragments of its
+    children.
 
     Arguments:
         Tree (tree): a formatted tree of objects (returned by `parser.parse`)
@@ -123,11 +151,36 @@ def patch(obj):
         start, accept (tuple): the first element of the return tuple is the
         NFA's starting State object, the second is a `list` of State objects
         representing the NFA's set of accept states
+
+    Raises:
+        TypeError: if the tree holds anything but expression tree nodes
+    """
+    return fold(tree, build, children=patch_children)
+
+
+def patch_children(node):
+    """ The subtrees `build` needs patched before `node`. """
+    if isinstance(node, RepeatExpr):
+        return (repeat_bounds(node)[2],)
+    return children(node)
+
+
+@singledispatch
+def build(obj, *fragments):
+    """ Build the NFA fragment for one expression tree node.
+
+    Arguments:
+        obj (TreeNode): the node
+        fragments: the `(start, accept)` fragments of its children, which
+                   the new fragment takes over
+
+    Returns:
+        start, accept (tuple): as for `patch`
     """
     raise TypeError("No patch handler found for object {}".format(obj))
 
 
-@patch.register(CharClassExpr)
+@build.register(CharClassExpr)
 def charclass_patch(obj):
     accept = State()
     conn = CharClassArrow(values=obj.charset, pointsAt=accept)
@@ -135,7 +188,7 @@ def charclass_patch(obj):
     return (start, [accept])
 
 
-@patch.register(DotExpr)
+@build.register(DotExpr)
 def dot_patch(obj):
     accept = State()
     conn = DotArrow(pointsAt=accept)
@@ -143,13 +196,13 @@ def dot_patch(obj):
     return (start, [accept])
 
 
-@patch.register(NullString)
+@build.register(NullString)
 def null_patch(obj):
     exit = start = State()
     return (start, [exit])
 
 
-@patch.register(LiteralExpr)
+@build.register(LiteralExpr)
 def literal_patch(obj):
     accept = State()
     conn = Arrow(obj.value, pointsAt=accept)
@@ -157,31 +210,181 @@ def literal_patch(obj):
     return (start, [accept])
 
 
-@patch.register(ConcatExpr)
-def concat_patch(obj):
-    L_start, L_accept = patch(obj.left)
-    R_start, R_accept = patch(obj.right)
+@build.register(StringExpr)
+def string_patch(obj):
+    # a chain of labelled arrows, with no epsilon bridges between them
+    start = current = State()
+    for ch in obj.value:
+        nxt = State()
+        current.append(Arrow(ch, pointsAt=nxt))
+        current = nxt
+    return (start, [current])
+
+
+@build.register(TrieExpr)
+def trie_patch(obj):
+    # alternatives sharing a prefix share its States; every State has at most
+    # one arrow per character, so no Split states or epsilons are needed
+    start = State()
+    edges = {start: {}}
+    accept = []
+    for word in obj.words:
+        current = start
+        for ch in word:
+            nxt = edges[current].get(ch)
+            if nxt is None:
+                nxt = State()
+                current.append(Arrow(ch, pointsAt=nxt))
+                edges[current][ch] = nxt
+                edges[nxt] = {}
+            current = nxt
+        accept.append(current)
+    return (start, accept)
+
+
+@build.register(ConcatExpr)
+def concat_patch(obj, left, right):
+    L_start, L_accept = left
+    R_start, R_accept = right
     bridge = Epsilon(pointsAt=R_start)
     for state in L_accept:
         state.append(bridge)
     return (L_start, R_accept)
 
 
-@patch.register(ChoiceExpr)
-def choice_patch(obj):
-    L_start, L_accept = patch(obj.left)
-    R_start, R_accept = patch(obj.right)
+@build.register(ChoiceExpr)
+def choice_patch(obj, left, right):
+    L_start, L_accept = left
+    R_start, R_accept = right
     L_bridge, R_bridge = Epsilon(pointsAt=L_start), Epsilon(pointsAt=R_start)
     Split = State(L_bridge, R_bridge)
-    return (Split, L_accept + R_accept)
-
-
-@patch.register(StarExpr)
-def star_patch(obj):
-    Rep_start, Rep_accept = patch(obj.repetand)
+    # the order of the accept states doesn't matter; extending the longer
+    # list keeps long chains of alternatives linear
+    if len(L_accept) < len(R_accept):
+        L_accept, R_accept = R_accept, L_accept
+    L_accept.extend(R_accept)
+    return (Split, L_accept)
+
+
+@build.register(GroupExpr)
+def group_patch(obj, operand):
+    # group n starts at slot 2n - 2 and ends at slot 2n - 1
+    O_start, O_accept = operand
+    start = State(Save(2 * obj.index - 2, pointsAt=O_start))
+    end = State()
+    close = Save(2 * obj.index - 1, pointsAt=end)
+    for state in O_accept:
+        state.append(close)
+    return (start, [end])
+
+
+@build.register(StarExpr)
+def star_patch(obj, repetand):
+    # every pass through the repetand loops back through the entrance, which
+    # is the only accept state: nested stars then add one arrow per level,
+    # not one per accept state of every level below
+    Rep_start, Rep_accept = repetand
     eps_in = Epsilon(pointsAt=Rep_start)
     dummy_entrance = State(eps_in)
+    eps_back = Epsilon(pointsAt=dummy_entrance)
     for state in Rep_accept:
-        eps = Epsilon(pointsAt=Rep_start)
-        state.append(eps)
-    return (dummy_entrance, Rep_accept + [dummy_entrance])
+        state.append(eps_back)
+    return (dummy_entrance, [dummy_entrance])
+
+
+def repeat_bounds(obj):
+    """ The bounds and operand of a RepeatExpr, simplified for `build`.
+
+    (x?){m,n} matches the same strings as x{0,n}, whose optional copies can
+    all be skipped in one step.
+
+    Returns:
+        min, max, repetand (tuple)
+    """
+    low, high, repetand = obj.min, obj.max, obj.repetand
+    if (isinstance(repetand, ChoiceExpr) and
+            isinstance(repetand.right, NullString)):
+        low, repetand = 0, repetand.left
+    return low, high, repetand
+
+
+@build.register(RepeatExpr)
+def repeat_patch(obj, first):
+    """ Counted repetition, `x{m,n}`.
+
+    The operand is patched once; the other copies are cloned from that
+    fragment, which costs a pass over its States rather than another walk
+    of the subtree.  The copies past the m-th are optional, laid out like
+    `x(x(x)?)?` rather than `x?x?x?`: the accept states of every copy from
+    the m-th on are accept states of the whole, so skipping the remaining
+    copies is a single step instead of a chain of epsilon arrows through
+    each of them.
+    """
+    low, high, _ = repeat_bounds(obj)
+    if high == 0:
+        return null_patch(NullString())
+    if low == 0 and high is None:
+        return star_patch(obj, first)
+    copies = high if high is not None else low
+    size = len(reachable(first[0]))
+    if size * copies > MAX_REPEAT_STATES:
+        raise ValueError('counted repetition needs more than {} states'
+                         .format(MAX_REPEAT_STATES))
+    fragments = [first] + [clone(*first) for _ in range(copies - 1)]
+
+    if low == 0:
+        start = State(Epsilon(pointsAt=first[0]))
+        accept = [start]
+    else:
+        start, accept = first[0], []
+    for number, (frag_start, frag_accept) in enumerate(fragments, 1):
+        if number > 1:
+            bridge = Epsilon(pointsAt=frag_start)
+            for state in fragments[number - 2][1]:
+                state.append(bridge)
+        if number >= low:
+            accept.extend(frag_accept)
+    if high is None:
+        # x{m,}: the last copy repeats
+        last_start, last_accept = fragments[-1]
+        for state in last_accept:
+            state.append(Epsilon(pointsAt=last_start))
+    return (start, accept)
+
+
+def clone(start, accept):
+    """ Copy the NFA fragment `(start, accept)` returned by `patch`.
+
+    Returns:
+        start, accept (tuple): the copy, sharing no States or Arrows with
+        the original
+    """
+    states = reachable(start)
+    copies = {state: State() for state in states}
+    for state in states:
+        for arrow in state:
+            duplicate = copy(arrow)
+            duplicate.pointsAt = copies[arrow.pointsAt]
+            copies[state].append(duplicate)
+    return (copies[start], [copies[state] for state in accept])
+
+
+def reachable(start):
+    """ All the States reachable from `start`, in breadth first order.
+
+    Arguments:
+        start (State): the entry point of the NFA graph
+
+    Returns:
+        list: every State reachable from `start`, `start` first
+    """
+    seen = {start}
+    order = [start]
+    for state in order:
+        for arrow in state:
+            target = arrow.pointsAt
+            if target not in seen:
+                seen.add(target)
+                order.append(target)
+    return order
+
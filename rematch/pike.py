@@ -0,0 +1,210 @@
+"""
+pike.py: find the spans of capturing groups in linear time with a Pike VM.
+
+The other engines only track which NFA states are active, which is all it
+takes to find where a match starts and ends.  To report where each group
+matched, every active state also carries the positions its thread passed the
+group boundaries at -- the `patcher.Save` arrows of a tree parsed with
+`captures=True`.  As in a Pike VM the threads are kept in priority order,
+and when two reach the same state only the first one is kept, so the
+simulation stays O(len(text) * n) however the groups nest or repeat.
+
+The overall match is still leftmost-longest, as for `Regex.search`.  Where
+the groups could split that match more than one way, they follow the
+highest priority thread: alternatives are tried left to right and
+quantifiers are greedy, as in `re`.  Unlike `re`, a repetition never ends
+with an iteration that matches nothing: `(a*)*` against 'aa' reports group 1
+at (0, 2), where `re` reports the empty (2, 2).
+"""
+
+from array import array
+
+from .alphabet import code_array
+from .compact import LITERAL, DOT, CLASS
+from .parser import GroupExpr, fold
+from .patcher import Epsilon, DotArrow, CharClassArrow, Save, patch, \
+    reachable
+
+
+class PikeVM(object):
+    """ A capture aware NFA simulation over flat tables.
+
+    The labelled arrows are laid out as in `compact.Program`.  The epsilon
+    closure of every state the VM can land on is computed ahead of time as
+    well, in priority order, along with the capture slots the first path to
+    each state passes through.
+
+    Arguments:
+        tree (TreeNode): an expression tree from `parser.parse`, parsed with
+                         `captures=True`
+
+    Attributes:
+        groups (int): the number of capturing groups
+        n (int): the number of states
+        closure (list): for each state the VM can be moved to, the tuple of
+                        `(state, saves)` pairs for the states in its epsilon
+                        closure that matter, in priority order; `saves` are
+                        the slots to set on the way there
+        initial (tuple): the closure of the start state
+    """
+    __slots__ = ('groups', 'n', 'accept', 'index', 'kinds', 'labels',
+                 'targets', 'classes', 'closure', 'initial')
+
+    def __init__(self, tree):
+        # found on the tree: a group repeated zero times has no Save arrows
+        self.groups = fold(tree, lambda node, *found: max(
+            found + ((node.index if isinstance(node, GroupExpr) else 0),)))
+        start, accept = patch(tree)
+        states = reachable(start)
+        ids = {state: number for number, state in enumerate(states)}
+        accept = set(accept)
+        self.n = len(states)
+        self.accept = array('b', (state in accept for state in states))
+
+        index = array('l', [0])
+        kinds, labels, targets = array('b'), array('l'), array('l')
+        classes, class_ids = [], {}
+        epsilons = []
+        for state in states:
+            eps = []
+            for arrow in state:
+                target = ids[arrow.pointsAt]
+                if isinstance(arrow, Epsilon):
+                    eps.append((target, arrow.slot
+                                if isinstance(arrow, Save) else None))
+                    continue
+                if isinstance(arrow, DotArrow):
+                    kinds.append(DOT)
+                    labels.append(0)
+                elif isinstance(arrow, CharClassArrow):
+                    charset = arrow.values
+                    if charset not in class_ids:
+                        class_ids[charset] = len(classes)
+                        classes.append(charset)
+                    kinds.append(CLASS)
+                    labels.append(class_ids[charset])
+                else:
+                    kinds.append(LITERAL)
+                    labels.append(ord(arrow.value))
+                targets.append(target)
+            index.append(len(targets))
+            epsilons.append(eps)
+        self.index, self.kinds, self.labels, self.targets = (
+            index, kinds, labels, targets)
+        self.classes = tuple(classes)
+
+        self.closure = [None] * self.n
+        for state in set(targets) | {0}:
+            self.closure[state] = self._closure(state, epsilons)
+        self.initial = self.closure[0]
+
+    def __repr__(self):
+        return '<PikeVM: {} groups, {} states>'.format(self.groups, self.n)
+
+    def _closure(self, state, epsilons):
+        """ The `(state, saves)` pairs of the closure of `state`, in the order
+        a depth first search following epsilons in priority order first
+        reaches them.
+        """
+        index, accept = self.index, self.accept
+        seen = set()
+        stack = [(state, ())]
+        found = []
+        while stack:
+            current, saves = stack.pop()
+            # a state is claimed by the first path to reach it, so states are
+            # marked when they are visited, not when they are pushed
+            if current in seen:
+                continue
+            seen.add(current)
+            if index[current] != index[current + 1] or accept[current]:
+                found.append((current, saves))
+            for target, slot in reversed(epsilons[current]):
+                if target not in seen:
+                    stack.append((target, saves if slot is None
+                                  else saves + (slot,)))
+        return tuple(found)
+
+    def match(self, text, pos=0, end=None, codes=None):
+        """ Run the VM anchored at `pos`.
+
+        Arguments:
+            text (str or bytes-like): the text to match
+            pos (int): where the match must start
+            end (int): where the match must end; by default it is the
+                       longest match starting at `pos`
+            codes: `alphabet.code_array(text)`, if the caller has it already
+
+        Returns:
+            (end, spans) tuple, with a `(start, end)` span for every group,
+            `(-1, -1)` for those that took no part in the match; or None if
+            there is no match
+        """
+        index, kinds, labels, targets, classes, closure, accept = (
+            self.index, self.kinds, self.labels, self.targets, self.classes,
+            self.closure, self.accept)
+        n = self.n
+        width = 2 * self.groups
+        if codes is None:
+            codes = code_array(text)
+        stop = len(codes) if end is None else end
+        # the threads, in priority order: the state of thread j is dense[j]
+        # and its slots are slots[j * width:(j + 1) * width]; slots are
+        # copied one by one, into storage allocated once
+        dense, sparse, slots = [0] * n, [0] * n, [-1] * (n * width)
+        next_dense, next_sparse, next_slots = [0] * n, [0] * n, \
+            [-1] * (n * width)
+        best_slots = [-1] * width
+        offsets = range(width)
+        size = 0
+        for state, saves in self.initial:
+            sparse[state] = size
+            dense[size] = state
+            for slot in saves:
+                slots[size * width + slot] = pos
+            size += 1
+        found = None
+        i = pos
+        while True:
+            if end is None or i == end:
+                for j in range(size):
+                    if accept[dense[j]]:
+                        found = i
+                        source = j * width
+                        for s in offsets:
+                            best_slots[s] = slots[source + s]
+                        break
+            if i >= stop or not size:
+                break
+            code = codes[i]
+            i += 1
+            next_size = 0
+            for j in range(size):
+                state = dense[j]
+                for k in range(index[state], index[state + 1]):
+                    kind = kinds[k]
+                    if (kind == DOT or
+                            kind == LITERAL and labels[k] == code or
+                            kind == CLASS and code in classes[labels[k]]):
+                        for target, saves in closure[targets[k]]:
+                            m = next_sparse[target]
+                            if m < next_size and next_dense[m] == target:
+                                continue
+                            next_sparse[target] = next_size
+                            next_dense[next_size] = target
+                            base = next_size * width
+                            source = j * width
+                            for s in offsets:
+                                next_slots[base + s] = slots[source + s]
+                            for slot in saves:
+                                next_slots[base + slot] = i
+                            next_size += 1
+            dense, next_dense = next_dense, dense
+            sparse, next_sparse = next_sparse, sparse
+            slots, next_slots = next_slots, slots
+            size = next_size
+        if found is None:
+            return None
+        spans = best_slots
+        return found, [(spans[g], spans[g + 1]) if spans[g + 1] >= 0
+                       else (-1, -1) for g in range(0, width, 2)]
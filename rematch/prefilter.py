@@ -0,0 +1,224 @@
+"""
+prefilter.py: extract the literal strings every match of a pattern must
+contain from its expression tree.
+
+Running an automaton costs a Python loop iteration per character, while
+`str.find` runs at C speed.  If every match of `error.*timeout` has to contain
+both 'error' and 'timeout', a string missing either can be rejected without
+starting the automaton at all, and a search can skip straight to the next
+place its literal prefix occurs.
+"""
+
+from collections import namedtuple
+from difflib import SequenceMatcher
+from functools import singledispatch
+from itertools import product
+from os.path import commonprefix
+
+from .parser import (LiteralExpr, StringExpr, TrieExpr, StarExpr,
+                     ChoiceExpr, ConcatExpr, CharClassExpr, DotExpr,
+                     NullString, RepeatExpr, GroupExpr, fold)
+
+# the largest set of alternative strings tracked exactly; beyond this they are
+# summarized by the factors they share
+MAX_EXACT = 16
+# the longest string tracked; longer literals are trimmed
+MAX_LITERAL = 256
+
+Info = namedtuple('Info', 'exact must prefix suffix')
+Info.__doc__ = """ What is known about the strings a subexpression matches.
+
+Attributes:
+    exact (frozenset or None): every string the subexpression can match, if
+                               there are at most MAX_EXACT of them
+    must (frozenset): strings that appear in every match
+    prefix (str): a string every match begins with
+    suffix (str): a string every match ends with
+"""
+
+
+def commonsuffix(strings):
+    return commonprefix([string[::-1] for string in strings])[::-1]
+
+
+def common_factor(a, b):
+    """ The longest string that is a substring of both `a` and `b`. """
+    matcher = SequenceMatcher(None, a, b, autojunk=False)
+    start, _, size = matcher.find_longest_match(0, len(a), 0, len(b))
+    return a[start:start + size]
+
+
+def factors(info):
+    """ Strings that every match of `info` contains, including its prefix
+    and suffix and those implied by its exact set.
+    """
+    found = {info.prefix, info.suffix}
+    if info.exact is not None:
+        found.add(commonprefix(list(info.exact)))
+        found.add(commonsuffix(list(info.exact)))
+    found.discard('')
+    return info.must | found
+
+
+def analyze(tree):
+    """ Compute the `Info` for an expression tree returned by `parser.parse`.
+
+    The tree is evaluated bottom up without recursion (see `parser.fold`).
+    """
+    return fold(tree, combine)
+
+
+@singledispatch
+def combine(obj, *infos):
+    """ Compute the `Info` for one node from the Infos of its children. """
+    raise TypeError("No prefilter handler found for object {}".format(obj))
+
+
+@combine.register(LiteralExpr)
+def literal_analyze(obj):
+    return Info(frozenset([obj.value]), frozenset(), obj.value, obj.value)
+
+
+@combine.register(StringExpr)
+def string_analyze(obj):
+    value = obj.value
+    return bounded(Info(frozenset([value]), frozenset(), value, value))
+
+
+@combine.register(TrieExpr)
+def trie_analyze(obj):
+    # beyond MAX_EXACT alternatives, only what they all start or end with is
+    # kept: comparing every pair for a common factor would take far longer
+    # than building the trie
+    words = obj.words
+    exact = frozenset(words) if len(words) <= MAX_EXACT else None
+    return bounded(Info(exact, frozenset(), commonprefix(words),
+                        commonsuffix(words)))
+
+
+@combine.register(NullString)
+def null_analyze(obj):
+    return Info(frozenset(['']), frozenset(), '', '')
+
+
+@combine.register(DotExpr)
+def dot_analyze(obj):
+    return Info(None, frozenset(), '', '')
+
+
+@combine.register(CharClassExpr)
+def charclass_analyze(obj):
+    charset = obj.charset
+    if len(charset) > MAX_EXACT:
+        return Info(None, frozenset(), '', '')
+    chars = frozenset(map(chr, charset))
+    affix = next(iter(chars)) if len(chars) == 1 else ''
+    return Info(chars, frozenset(), affix, affix)
+
+
+@combine.register(StarExpr)
+def star_analyze(obj, repetand):
+    return Info(None, frozenset(), '', '')
+
+
+@combine.register(RepeatExpr)
+def repeat_analyze(obj, info):
+    if obj.max == 0:
+        return null_analyze(NullString())
+    if obj.min == 0:
+        return star_analyze(obj, info)
+    # the first `min` copies are required; whatever follows is unknown
+    required = info
+    for _ in range(obj.min - 1):
+        required = concat_info(required, info)
+    if obj.max == obj.min:
+        return required
+    return concat_info(required, Info(None, frozenset(), '', ''))
+
+
+@combine.register(GroupExpr)
+def group_analyze(obj, info):
+    return info
+
+
+@combine.register(ConcatExpr)
+def concat_analyze(obj, left, right):
+    return concat_info(left, right)
+
+
+def concat_info(left, right):
+    """ The Info of a concatenation, from the Infos of its parts. """
+    if left.exact is not None and len(left.exact) == 1:
+        prefix = next(iter(left.exact)) + right.prefix
+    else:
+        prefix = left.prefix
+    if right.exact is not None and len(right.exact) == 1:
+        suffix = left.suffix + next(iter(right.exact))
+    else:
+        suffix = right.suffix
+    if (left.exact is not None and right.exact is not None and
+            len(left.exact) * len(right.exact) <= MAX_EXACT):
+        exact = frozenset(a + b for a, b in product(left.exact, right.exact))
+        return bounded(Info(exact, left.must | right.must, prefix, suffix))
+    # whatever the left side ends with runs straight into whatever the right
+    # side starts with
+    must = factors(left) | factors(right) | {left.suffix + right.prefix}
+    # drop what the new prefix and suffix (counted by `factors`) imply, so
+    # that a long run of literals doesn't pile up its every suffix
+    must = frozenset(s for s in must if s not in prefix and s not in suffix)
+    return bounded(Info(None, must, prefix, suffix))
+
+
+def bounded(info):
+    """ Trim the strings `info` tracks to MAX_LITERAL characters, and its
+    must set to the MAX_EXACT longest strings.
+
+    Otherwise every step along a long run of literals would copy a longer
+    string, taking time quadratic in the length of the pattern.  Any part of
+    a required string is required too, so trimming weakens the prefilter but
+    never makes it wrong.
+    """
+    exact, must = info.exact, info.must
+    if exact is not None and any(len(s) > MAX_LITERAL for s in exact):
+        exact, must = None, factors(info)
+    if any(len(s) > MAX_LITERAL for s in must):
+        must = frozenset(s[:MAX_LITERAL] for s in must)
+    if len(must) > MAX_EXACT:
+        must = frozenset(sorted(must, key=lambda s: (-len(s), s))[:MAX_EXACT])
+    return Info(exact, must, info.prefix[:MAX_LITERAL],
+                info.suffix[-MAX_LITERAL:])
+
+
+@combine.register(ChoiceExpr)
+def choice_analyze(obj, left, right):
+    prefix = commonprefix([left.prefix, right.prefix])
+    suffix = commonsuffix([left.suffix, right.suffix])
+    if (left.exact is not None and right.exact is not None and
+            len(left.exact | right.exact) <= MAX_EXACT):
+        return Info(left.exact | right.exact, frozenset(), prefix, suffix)
+    # whatever is common to a string both branches require is required by
+    # the choice
+    must = set()
+    right_factors = factors(right)
+    for a in factors(left):
+        for b in right_factors:
+            must.add(common_factor(a, b))
+    must.discard('')
+    return Info(None, frozenset(must), prefix, suffix)
+
+
+def prefilter(tree):
+    """ Extract the literals used to prefilter matches of `tree`.
+
+    Returns:
+        required, prefix (tuple): the non-empty strings every match must
+        contain (longest first, none a substring of another), and the string
+        every match starts with ('' if there is none)
+    """
+    info = analyze(tree)
+    found = sorted(factors(info) - {''}, key=lambda s: (-len(s), s))
+    required = []
+    for literal in found:
+        if not any(literal in longer for longer in required):
+            required.append(literal)
+    return tuple(required), info.prefix
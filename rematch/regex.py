@@ -3,35 +3,496 @@ regex.py: tools to run an NFA state machine graph against a string.
 """
 
 from itertools import tee, filterfalse
-from functools import reduce
+from threading import Lock
 
+from .alphabet import Alphabet, codes, code_array
+from .compact import lower
+from .dfa import LazyDFA, DFA, DEFAULT_CACHE_SIZE, DEFAULT_MAX_STATES
 from .patcher import Epsilon, patch
-from .parser import parse
+from .parser import parse, TrieExpr
+from .optimizer import optimize as optimize_tree
+from .prefilter import prefilter
+from .stream import Stream
+from .pike import PikeVM
+from .trie import Trie
+from .stats import Stats, instrument, restore
+from .batch import match_many, DEFAULT_CHUNKSIZE
+from .vector import match_array
+from .codegen import build as build_matcher
+from .glushkov import Glushkov
+
+MODES = ('lazy', 'dfa', 'nfa', 'codegen', 'glushkov')
+# the inputs functions made by `codegen` can read
+GENERATED_TYPES = (str, bytes, bytearray)
 
 
 class Regex(object):
     """ Evaluate the argument against the internally 'compiled' RegEx.
 
     After construction, the Regex object stores the generated NFA
-    internally.  Each time the Regex matching object is run, it keeps a
-    'finger' on each state that the NFA is in.  At the end of the
-    computation, if any 'finger' is on the Match state, the computation
-    returns True.
+    internally, lowered to flat tables (see `compact.Program`).  Each time the
+    Regex matching object is run, it keeps a 'finger' on each state that the
+    NFA is in.  At the end of the computation, if any 'finger' is on the
+    Match state, the computation returns True.
+
+    Strings that lack one of the literals every match must contain (see
+    `prefilter.prefilter`) are rejected with `str.find` before the engine
+    runs, and searches skip ahead to occurrences of the literal prefix.
+    A pattern that is only an alternation of literal strings is searched for
+    with an Aho-Corasick automaton instead (see `trie.Trie`).
+
+    A bytes pattern compiles in byte mode: its characters stand for the byte
+    values 0-255, and it matches `bytes`, `bytearray`, `memoryview` or
+    `mmap.mmap` input in place, without decoding or copying it.
+
+    A Regex may be shared by any number of threads.  Matching, searching and
+    the other queries take no lock: the 'lazy' engine's cache is published
+    so that readers never see a half-built state (see `dfa.LazyDFA`), the
+    other engines are read-only once built, and the few memos they keep are
+    only ever filled with the same values.  Building the `full_dfa` or
+    `pike` on first use happens once, under a per-Regex lock.  Statistics
+    are the exception: `enable_stats` and `disable_stats` swap the engine
+    out from under other threads, and the counters of a `stats.Stats` are
+    updated without a lock, so count on one thread at a time.  A
+    `stream.Stream` holds a position of its own and belongs to one thread.
+
+    Arguments:
+        pattern (str or bytes): the regular expression
+        mode (str): the matching engine, one of
+            'lazy' (default): a DFA built on demand from the NFA (see
+                              `dfa.LazyDFA`), memoizing every transition
+            'dfa': a minimal DFA built ahead of time (see `dfa.DFA`); slower
+                   to construct, fastest to match
+            'nfa': plain NFA simulation, recomputing every transition
+            'codegen': the 'dfa' engine turned into a Python function
+                       specialized to the pattern (see `codegen`), best for
+                       patterns made of literal runs and long self-loops;
+                       inputs other than str, bytes and bytearray still walk
+                       the DFA's table
+            'glushkov': the pattern's epsilon-free position automaton, its
+                        state sets kept as the bits of an int (see
+                        `glushkov.Glushkov`); no DFA is built, so nothing
+                        blows up, and each step is a few integer operations
+        cache_size (int): the maximum number of DFA states the 'lazy' engine
+                          keeps before flushing its cache
+        max_states (int): the maximum number of states the 'dfa' engine's
+                          subset construction may create; exceeding it raises
+                          `dfa.DFASizeError`
+        optimize (bool or iterable): whether to simplify the expression tree
+                                     before building the NFA (see
+                                     `optimizer.optimize`), or the names of
+                                     the optimizations to apply
     """
-    def __init__(self, pattern):
+    def __init__(self, pattern, mode='lazy', cache_size=DEFAULT_CACHE_SIZE,
+                 max_states=DEFAULT_MAX_STATES, optimize=True):
+        if mode not in MODES:
+            raise ValueError('Unknown mode {!r}, expected one of {}'
+                             .format(mode, ', '.join(MODES)))
         self.pattern = pattern
-        start, accept = patch(parse(pattern))
-        self.start = set(E_set(start))  # remove set if not using yeild impl.
-        self.accept = set(accept)
+        self.mode = mode
+        self.cache_size = cache_size
+        self.max_states = max_states
+        self.optimize = optimize
+        self.byte_mode = isinstance(pattern, (bytes, bytearray))
+        tree = self._tree()
+        required, prefix = prefilter(tree)
+        if self.byte_mode:
+            try:
+                required = tuple(literal.encode('latin-1')
+                                 for literal in required)
+                prefix = prefix.encode('latin-1')
+            except UnicodeEncodeError:
+                raise ValueError('bytes pattern {!r} needs characters above '
+                                 '\\xff'.format(pattern))
+        self.required, self.prefix = required, prefix
+        self.trie = Trie(tree.words) if isinstance(tree, TrieExpr) else None
+        self.program = lower(*patch(tree))
+        self.glushkov = (Glushkov(tree, self.byte_mode)
+                         if mode == 'glushkov' else None)
+        self._alphabet = None
+        self._pike = None
+        self._lock = Lock()
+        self.stats = None
+        self._build()
+
+    def _tree(self):
+        """ Parse and optimize the pattern. """
+        pattern = self.pattern
+        if self.byte_mode:
+            pattern = pattern.decode('latin-1')
+        return optimize_tree(parse(pattern), self.optimize)
+
+    def _build(self, dfa=None):
+        """ Set up the matching engine over `self.program`. """
+        program = self.program
+        self._full_dfa = None
+        self.generated = None
+        if self.mode == 'lazy':
+            self.dfa = LazyDFA(program.initial, program.step,
+                               program.accepting, cache_size=self.cache_size,
+                               byte_mode=self.byte_mode)
+            self._match = self.dfa.match
+        elif self.mode in ('dfa', 'codegen'):
+            if dfa is None:
+                dfa = DFA.build(program.initial, program.step,
+                                program.accepting, self.alphabet,
+                                max_states=self.max_states,
+                                byte_mode=self.byte_mode)
+            self.dfa = self._full_dfa = dfa
+            self._alphabet = dfa.alphabet
+            self._match = dfa.match
+            if self.mode == 'codegen':
+                self.generated = build_matcher(
+                    dfa, self.byte_mode,
+                    filename='<rematch {!r}>'.format(self.pattern))
+        elif self.mode == 'glushkov':
+            if self.glushkov is None:
+                self.glushkov = Glushkov(self._tree(), self.byte_mode)
+            self._match = self.glushkov.match
+        else:
+            self._match = program.match
+        self._direct = self.generated
+
+    def __getstate__(self):
+        # Pickle the compiled tables, not the pattern: unpickling skips
+        # parsing and patching entirely.  Lazy DFA caches are left behind and
+        # refill on use; a full DFA is kept since it is costly to rebuild,
+        # but generated code is cheap to make again from it.
+        state = {'pattern': self.pattern, 'mode': self.mode,
+                 'byte_mode': self.byte_mode, 'cache_size': self.cache_size,
+                 'max_states': self.max_states, 'optimize': self.optimize,
+                 'required': self.required,
+                 'prefix': self.prefix, 'trie': self.trie,
+                 'program': self.program}
+        if self.mode in ('dfa', 'codegen'):
+            state['dfa'] = self.dfa
+        if self.mode == 'glushkov':
+            state['glushkov'] = self.glushkov
+        return state
+
+    def __setstate__(self, state):
+        dfa = state.pop('dfa', None)
+        self.glushkov = None
+        self.__dict__.update(state)
+        self._alphabet = None
+        self._pike = None
+        self._lock = Lock()
+        self.stats = None
+        self._build(dfa)
 
     def __call__(self, string):
-        curr = self.start
-        for char in string:
-            next_states = [transition(st, char) for st in curr]
-            if not next_states:
-                break
-            curr = reduce(set.union, next_states)
-        return not curr.isdisjoint(self.accept)
+        if not self._may_match(string):
+            return False
+        if self._direct is not None and type(string) in GENERATED_TYPES:
+            return self._direct(string)
+        return self._match(codes(string))
+
+    def _may_match(self, data, pos=0):
+        """ Check that `data` suits the pattern, and return False if it lacks
+        a literal every match at or after `pos` must contain.
+        """
+        if isinstance(data, str) == self.byte_mode:
+            raise TypeError('cannot use a {} pattern on {} input'.format(
+                'bytes' if self.byte_mode else 'str', type(data).__name__))
+        if self.required:
+            # memoryviews have no find; they just skip the prefilter
+            find = getattr(data, 'find', None)
+            if find is not None:
+                for literal in self.required:
+                    if find(literal, pos) < 0:
+                        return False
+        return True
+
+    def __repr__(self):
+        return 'Regex({!r})'.format(self.pattern)
+
+    @property
+    def alphabet(self):
+        """ The character classes of the pattern (see `alphabet.Alphabet`),
+        built on first use.
+        """
+        if self._alphabet is None:
+            self._alphabet = Alphabet(self.program.spans())
+        return self._alphabet
+
+    @property
+    def full_dfa(self):
+        """ The pattern's complete, minimal `dfa.DFA`: the engine itself in
+        'dfa' and 'codegen' modes, otherwise built (within `max_states`) on
+        first use.
+        """
+        if self._full_dfa is None:
+            with self._lock:
+                if self._full_dfa is None:
+                    program = self.program
+                    self._full_dfa = DFA.build(
+                        program.initial, program.step, program.accepting,
+                        self.alphabet, max_states=self.max_states,
+                        byte_mode=self.byte_mode)
+        return self._full_dfa
+
+    @property
+    def pike(self):
+        """ The `pike.PikeVM` that finds the spans of the pattern's groups,
+        built on first use.
+        """
+        if self._pike is None:
+            with self._lock:
+                if self._pike is None:
+                    pattern = self.pattern
+                    if self.byte_mode:
+                        pattern = pattern.decode('latin-1')
+                    self._pike = PikeVM(parse(pattern, captures=True))
+        return self._pike
+
+    @property
+    def groups(self):
+        """ The number of capturing groups in the pattern. """
+        return self.pike.groups
+
+    def match_array(self, arr, lengths=None):
+        """ Match a whole NumPy array of strings at once.
+
+        The rows advance through the pattern's `full_dfa` in lockstep, one
+        vectorized step per character position (see `vector.match_array`).
+        Requires NumPy.
+
+        Arguments:
+            arr: a 1-D array of fixed width strings (dtype U) for a str
+                 pattern; of fixed width bytes (dtype S), or a padded 2-D
+                 uint8 array of byte codes, for a bytes pattern
+            lengths: the length of each row, if trailing NUL characters
+                     aren't padding
+
+        Returns:
+            numpy.ndarray: a boolean mask, True where the whole row matched
+        """
+        return match_array(self.full_dfa, arr, self.byte_mode, lengths)
+
+    def match_many(self, strings, workers=None, chunksize=DEFAULT_CHUNKSIZE):
+        """ Match every string in `strings`, spread over a process pool.
+
+        See `batch.match_many`.
+
+        Returns:
+            list: a bool for each string, in order
+        """
+        return match_many(self, strings, workers=workers, chunksize=chunksize)
+
+    def enable_stats(self, hook=None):
+        """ Start counting the work done by whole string matching.
+
+        Until `disable_stats` is called, matching runs an instrumented copy
+        of the engine (see `stats.instrument`); while statistics are off it
+        runs untouched, at full speed.  Pickles and copies made by the
+        process pool of `match_many` don't carry statistics.
+
+        Arguments:
+            hook (callable): called as `hook(regex, stats)` after every match,
+                             e.g. to export per pattern metrics
+
+        Returns:
+            Stats: the counters, also available as `self.stats`
+        """
+        if self.stats is not None:
+            self.disable_stats()
+        self.stats = Stats(self.program.n)
+        self._match = instrument(self, self.stats, hook)
+        self._direct = None
+        return self.stats
+
+    def disable_stats(self):
+        """ Stop counting and return to the uninstrumented engine.
+
+        Returns:
+            Stats or None: the final counters
+        """
+        stats, self.stats = self.stats, None
+        if stats is not None:
+            restore(self)
+            if self.mode == 'nfa':
+                self._match = self.program.match
+            elif self.mode == 'glushkov':
+                self._match = self.glushkov.match
+            else:
+                self._match = self.dfa.match
+            self._direct = self.generated
+        return stats
+
+    def stream(self):
+        """ Return a `stream.Stream` to match input fed in chunks. """
+        return Stream(self)
+
+    def match(self, string, pos=0):
+        """ Return the longest match of the pattern starting at `pos`.
+
+        Unlike calling the Regex, the match needn't reach the end of
+        `string`.  This runs the pattern's `pike` VM, so the spans of the
+        groups come with it.
+
+        Returns:
+            Match or None
+        """
+        pos = clamp(string, pos)
+        if not self._may_match(string, pos):
+            return None
+        found = self.pike.match(string, pos)
+        if found is None:
+            return None
+        end, spans = found
+        return Match(self, string, pos, end, spans)
+
+    def fullmatch(self, string, pos=0):
+        """ Return a Match if the whole of `string` from `pos` on matches
+        the pattern.
+
+        Calling the Regex answers the same question as a bool, on the faster
+        engines; this also gives the spans of the groups.
+
+        Returns:
+            Match or None
+        """
+        pos = clamp(string, pos)
+        end = length(string)
+        if pos == 0:
+            # the whole string: let the engine decide, groups come later
+            return Match(self, string, 0, end) if self(string) else None
+        if not self._may_match(string, pos):
+            return None
+        found = self.pike.match(string, pos, end)
+        if found is None:
+            return None
+        return Match(self, string, pos, end, found[1])
+
+    def search(self, string, pos=0):
+        """ Scan `string` for the leftmost-longest match of the pattern.
+
+        Arguments:
+            string (str or bytes-like): the text to search
+            pos (int): the offset to start searching from; as with `re`, it
+                       is clamped to the bounds of `string`
+
+        Returns:
+            Match or None
+        """
+        return self._search(string, clamp(string, pos))
+
+    def _search(self, string, pos, codes=None):
+        """ `search`, reusing `codes`, the `code_array` of `string`, if it
+        is given.
+        """
+        if not self._may_match(string, pos):
+            return None
+        if self.trie is not None:
+            span = self.trie.search(string, pos, codes)
+        else:
+            span = self.program.search(string, pos, self.prefix, codes)
+        if span is None:
+            return None
+        return Match(self, string, *span, codes=codes)
+
+    def finditer(self, string, pos=0):
+        """ Yield a Match for every non-overlapping match in `string`.
+
+        Empty matches are included; as with `re`, the search resumes one
+        character after an empty match, and right at the end of any other.
+        """
+        # converted once: every search of the text shares the copy
+        codes = code_array(string)
+        length = len(codes)
+        pos = min(max(pos, 0), length)
+        while pos <= length:
+            match = self._search(string, pos, codes)
+            if match is None:
+                return
+            yield match
+            start, pos = match.span()
+            if pos == start:
+                pos += 1
+
+    def findall(self, string, pos=0):
+        """ Return the text of every non-overlapping match in `string`. """
+        return [match.group() for match in self.finditer(string, pos)]
+
+
+class Match(object):
+    """ The result of a successful `Regex.search`, `Regex.match` or
+    `Regex.fullmatch`.
+
+    The spans of the groups are found on first use, by running the pattern's
+    `pike` VM over the matched text alone.  Group 0 is the whole match; a
+    group that took no part in the match has the span `(-1, -1)`, and the
+    text None.
+
+    Attributes:
+        re (Regex): the pattern that matched
+        string (str): the text that was searched
+    """
+    __slots__ = ('re', 'string', '_start', '_end', '_spans', '_codes')
+
+    def __init__(self, regex, string, start, end, spans=None, codes=None):
+        self.re = regex
+        self.string = string
+        self._start = start
+        self._end = end
+        self._spans = spans
+        self._codes = codes
+
+    def __repr__(self):
+        return '<Match span={} match={!r}>'.format(self.span(), self.group())
+
+    def _span(self, group):
+        if group == 0:
+            return self._start, self._end
+        if self._spans is None:
+            _, self._spans = self.re.pike.match(self.string, self._start,
+                                                self._end, self._codes)
+        if not isinstance(group, int) or not 0 < group <= len(self._spans):
+            raise IndexError('no such group')
+        return self._spans[group - 1]
+
+    def start(self, group=0):
+        return self._span(group)[0]
+
+    def end(self, group=0):
+        return self._span(group)[1]
+
+    def span(self, group=0):
+        return self._span(group)
+
+    def group(self, *groups):
+        """ The text matched by a group, the whole match by default; with
+        several groups, a tuple of their texts.
+        """
+        texts = []
+        for group in groups or (0,):
+            start, end = self._span(group)
+            texts.append(self.string[start:end] if start >= 0 else None)
+        if len(texts) == 1:
+            return texts[0]
+        return tuple(texts)
+
+    def groups(self, default=None):
+        """ The text matched by every group, or `default` for those that
+        took no part in the match.
+        """
+        return tuple(default if text is None else text for text in
+                     (self.group(group)
+                      for group in range(1, self.re.groups + 1)))
+
+
+def length(data):
+    """ The number of codes in `data` (see `alphabet.codes`). """
+    if isinstance(data, (str, bytes, bytearray)):
+        return len(data)
+    return memoryview(data).nbytes
+
+
+def clamp(data, pos):
+    """ `pos` moved within the bounds of `data`, as `re` treats offsets:
+    a negative one counts as 0 and one past the end as the end.
+    """
+    return min(max(pos, 0), length(data))
 
 
 def transition(state, inp):
@@ -59,6 +520,9 @@ def transition(state, inp):
 def E_set(state, followed=None):
     """ The set E(x), all states reachable from state `x` by following e arrows.
 
+    The epsilon arrows are followed depth first with an explicit stack, so
+    long chains of them don't exhaust the Python stack.
+
     Arguments:
         state (State): the location in the NFA to start searching from
         followed (None): this keyword argument is used internally to avoid
@@ -67,17 +531,24 @@ def E_set(state, followed=None):
     Yields:
         A Generator-Iterator over a stream of State objects.
     """
-    #  Needs to be passed into some kind of constructor that will consume all
-    #  the subgenerators
-    epsilons = [arr for arr in state if isinstance(arr, Epsilon)]
-    if not followed:
-        followed = set(epsilons)
-    else:
-        epsilons = [arr for arr in epsilons if arr not in followed]
-        followed |= set(epsilons)
-    for arrow in epsilons:
-        yield from E_set(arrow(), followed)
-    yield state
+    if followed is None:
+        followed = set()
+
+    def enter(state):
+        epsilons = [arr for arr in state
+                    if isinstance(arr, Epsilon) and arr not in followed]
+        followed.update(epsilons)
+        return state, iter(epsilons)
+
+    stack = [enter(state)]
+    while stack:
+        current, epsilons = stack[-1]
+        arrow = next(epsilons, None)
+        if arrow is None:
+            stack.pop()
+            yield current
+        else:
+            stack.append(enter(arrow()))
 
 
 def partition(pred, iterable):
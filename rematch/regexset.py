@@ -0,0 +1,90 @@
+"""
+regexset.py: match many patterns against a string in a single pass.
+
+A `RegexSet` joins the NFAs of all its patterns under one split state, the
+same way `patcher.choice_patch` joins the two sides of an alternation, and
+tags every accept state with the number of the pattern it belongs to.  The
+lazy DFA built on top of that NFA then tracks which patterns can still match
+at every step, so one scan over the input answers for the whole set.
+"""
+
+from .alphabet import codes
+from .compact import lower
+from .dfa import LazyDFA, DEFAULT_CACHE_SIZE
+from .patcher import State, Epsilon, patch
+from .parser import parse
+from .optimizer import optimize as optimize_tree
+
+
+class RegexSet(object):
+    """ A collection of patterns matched together.
+
+    Arguments:
+        patterns (iterable): the regular expressions, either all str or all
+                             bytes (see `Regex`)
+        cache_size (int): the maximum number of states each of the set's lazy
+                          DFAs keeps before flushing its cache
+        optimize (bool or iterable): as for `Regex`
+
+    Attributes:
+        patterns (list): the patterns, in the order their indices refer to
+    """
+    def __init__(self, patterns, cache_size=DEFAULT_CACHE_SIZE,
+                 optimize=True):
+        self.patterns = list(patterns)
+        self.byte_mode = bool(self.patterns) and isinstance(
+            self.patterns[0], (bytes, bytearray))
+        split = State()
+        accept = {}
+        for number, pattern in enumerate(self.patterns, 1):
+            if self.byte_mode:
+                pattern = pattern.decode('latin-1')
+            start, accepts = patch(optimize_tree(parse(pattern), optimize))
+            split.append(Epsilon(pointsAt=start))
+            for state in accepts:
+                accept[state] = number
+        self.program = program = lower(split, accept)
+        initial = frozenset(program.initial)
+
+        def unanchored_step(states, code):
+            return program.step(states, code) | initial
+
+        self.dfa = LazyDFA(initial, program.step, self._matched,
+                           cache_size=cache_size, byte_mode=self.byte_mode)
+        self.search_dfa = LazyDFA(initial, unanchored_step, self._matched,
+                                  cache_size=cache_size,
+                                  byte_mode=self.byte_mode)
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def __repr__(self):
+        return 'RegexSet({!r})'.format(self.patterns)
+
+    def _matched(self, states):
+        accept = self.program.accept
+        return frozenset(accept[state] - 1 for state in states
+                         if accept[state])
+
+    def match(self, string):
+        """ The indices of the patterns that match the whole of `string`.
+
+        Returns:
+            list: sorted pattern indices
+        """
+        return sorted(self.dfa.run(codes(string)))
+
+    def search(self, string, first=False):
+        """ The indices of the patterns that match somewhere in `string`.
+
+        Arguments:
+            string (str): the text to scan
+            first (bool): stop scanning as soon as any pattern has matched;
+                          the result then holds just the pattern(s) that
+                          matched first
+
+        Returns:
+            list: sorted pattern indices
+        """
+        return sorted(self.search_dfa.scan(codes(string), first=first,
+                                           limit=len(self.patterns)))
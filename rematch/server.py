@@ -0,0 +1,370 @@
+"""
+server.py: answer match requests from a warm process over a Unix domain
+socket.
+
+Compiling a large library of patterns is slow, and every process that uses
+them pays for it again.  `python -m rematch.server --socket PATH` keeps the
+compiled patterns in memory instead (optionally loading them from a bundle,
+see `bundle.write_bundle`) and answers requests from any number of
+short-lived clients:
+
+    python -m rematch.server --socket /tmp/rematch.sock --bundle rules.rmx
+
+Every message, either way, is a 4 byte big-endian length followed by that
+many bytes of UTF-8 encoded JSON.  A request is an object such as
+
+    {"id": 7, "op": "search", "pattern": "error.*timeout", "text": "..."}
+
+where `op` is 'match' (is the whole text a match: a bool), 'search' (the
+`[start, end]` of the leftmost-longest match, or null) or 'findall' (the
+text of every match); 'pos' and 'mode' are optional.  The answer is
+`{"id": 7, "result": ...}`, or `{"id": 7, "error": "..."}` if the pattern or
+the request was bad.  Requests on one connection may be pipelined, and are
+answered as they finish.
+
+Requests for the same pattern that arrive together -- pipelined by one
+client, or sent by several in the same turn of the event loop -- are run as
+one batch, which looks the pattern up (and compiles it, the first time) only
+once.  `Client` is an asyncio client for the protocol.
+"""
+
+import asyncio
+import json
+import struct
+from argparse import ArgumentParser
+from collections import OrderedDict
+
+from .bundle import Bundle
+from .regex import Regex, MODES
+
+HEADER = struct.Struct('>I')
+# the largest message accepted, in bytes
+MAX_MESSAGE = 64 * 1024 * 1024
+# the most compiled patterns kept, besides those of the bundle
+MAXCACHE = 4096
+OPS = ('match', 'search', 'findall')
+
+
+class RemoteError(Exception):
+    """ Raised by `Client` when the server answers a request with an error.
+    """
+
+
+async def read_message(reader):
+    """ Read one message from `reader`.
+
+    Returns:
+        the decoded JSON value, or None at the end of the stream, including
+        a stream that ends partway through a message
+
+    Raises:
+        ValueError: if the message is larger than MAX_MESSAGE
+    """
+    try:
+        header = await reader.readexactly(HEADER.size)
+        size, = HEADER.unpack(header)
+        if size > MAX_MESSAGE:
+            raise ValueError('message of {} bytes is too large'.format(size))
+        body = await reader.readexactly(size)
+    except asyncio.IncompleteReadError:
+        return None
+    return json.loads(body)
+
+
+def write_message(writer, message):
+    """ Queue `message` on `writer`, framed with its length. """
+    data = json.dumps(message, separators=(',', ':')).encode('utf-8')
+    writer.write(HEADER.pack(len(data)) + data)
+
+
+def run(regex, request):
+    """ Carry out one request with the compiled `regex`. """
+    op, text, pos = request['op'], request['text'], request.get('pos', 0)
+    if op == 'match':
+        return regex(text)
+    if op == 'search':
+        found = regex.search(text, pos)
+        return None if found is None else list(found.span())
+    return regex.findall(text, pos)
+
+
+class Server(object):
+    """ A pattern server on a Unix domain socket.
+
+    Arguments:
+        path (str): the socket to listen on
+        bundle (str): a bundle file (see `bundle.Bundle`) to serve patterns
+                      from before compiling them
+        mode (str): the `Regex` mode of patterns compiled by the server,
+                    unless a request asks for another
+
+    Attributes:
+        requests (int): the number of requests answered
+        batches (int): the number of batches they were run in
+    """
+    def __init__(self, path, bundle=None, mode='lazy'):
+        if mode not in MODES:
+            raise ValueError('Unknown mode {!r}, expected one of {}'
+                             .format(mode, ', '.join(MODES)))
+        self.path = path
+        self.mode = mode
+        self.bundle = None if bundle is None else Bundle(bundle)
+        self.requests = 0
+        self.batches = 0
+        self._compiled = OrderedDict()
+        self._pending = {}
+        self._server = None
+        self._connections = set()
+
+    def __repr__(self):
+        return '<Server {!r}: {} requests in {} batches>'.format(
+            self.path, self.requests, self.batches)
+
+    async def start(self):
+        """ Start listening. """
+        self._server = await asyncio.start_unix_server(self._serve,
+                                                       path=self.path)
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        await self._server.serve_forever()
+
+    async def close(self):
+        """ Stop listening, hang up on every client and release the bundle.
+        """
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        connections = list(self._connections)
+        for task, writer in connections:
+            writer.close()
+        await asyncio.gather(*(task for task, _ in connections),
+                             return_exceptions=True)
+        if self.bundle is not None:
+            self.bundle.close()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def compile(self, pattern, mode=None):
+        """ The Regex for `pattern`, from the bundle, the cache of patterns
+        compiled before, or compiled now.
+        """
+        key = (pattern, mode or self.mode)
+        regex = self._compiled.get(key)
+        if regex is not None:
+            self._compiled.move_to_end(key)
+            return regex
+        if self.bundle is not None and mode is None:
+            regex = self.bundle.get(pattern)
+            if regex is not None:
+                return regex
+        regex = Regex(pattern, mode=key[1])
+        self._compiled[key] = regex
+        if len(self._compiled) > MAXCACHE:
+            self._compiled.popitem(last=False)
+        return regex
+
+    def submit(self, request):
+        """ Queue a request for the next batch of its pattern.
+
+        Returns:
+            asyncio.Future: set to the result, or to the exception raised
+        """
+        future = asyncio.get_running_loop().create_future()
+        if not isinstance(request, dict):
+            future.set_exception(ValueError('a request must be an object'))
+            return future
+        key = (request.get('pattern'), request.get('mode'))
+        if not isinstance(key[0], str) or not isinstance(key[1],
+                                                         (str, type(None))):
+            future.set_exception(ValueError('the pattern and mode must be '
+                                            'strings'))
+            return future
+        batch = self._pending.get(key)
+        if batch is None:
+            batch = self._pending[key] = []
+            # requests read before the loop comes round join this batch
+            asyncio.get_running_loop().call_soon(self._flush, key)
+        batch.append((request, future))
+        return future
+
+    def _flush(self, key):
+        batch = self._pending.pop(key)
+        self.batches += 1
+        pattern, mode = key
+        # nothing may escape: a future left unresolved hangs its client
+        try:
+            regex = self.compile(pattern, mode)
+        except Exception as err:
+            for _, future in batch:
+                future.set_exception(err)
+            return
+        for request, future in batch:
+            self.requests += 1
+            try:
+                if request.get('op') not in OPS:
+                    raise ValueError('unknown op {!r}'.format(
+                        request.get('op')))
+                future.set_result(run(regex, request))
+            except Exception as err:
+                future.set_exception(err)
+
+    async def _serve(self, reader, writer):
+        def answer(request_id, future):
+            if writer.is_closing():
+                return
+            error = future.exception()
+            if error is None:
+                write_message(writer, {'id': request_id,
+                                       'result': future.result()})
+            else:
+                write_message(writer, {'id': request_id,
+                                       'error': '{}: {}'.format(
+                                           type(error).__name__, error)})
+
+        connection = (asyncio.current_task(), writer)
+        self._connections.add(connection)
+        try:
+            while True:
+                request = await read_message(reader)
+                if request is None:
+                    break
+                request_id = (request.get('id')
+                              if isinstance(request, dict) else None)
+                self.submit(request).add_done_callback(
+                    lambda future, request_id=request_id:
+                    answer(request_id, future))
+                await writer.drain()
+        except (ValueError, ConnectionError):
+            # a malformed stream can't be resynchronized: drop the client
+            pass
+        finally:
+            self._connections.discard(connection)
+            writer.close()
+
+
+class Client(object):
+    """ An asyncio client for a `Server`.
+
+    Requests may be made concurrently; they share the one connection.
+
+        client = await Client.connect('/tmp/rematch.sock')
+        span = await client.search('error.*timeout', line)
+        await client.close()
+    """
+    def __init__(self, reader, writer):
+        self._reader = reader
+        self._writer = writer
+        self._waiting = {}
+        self._ids = 0
+        self._task = asyncio.get_running_loop().create_task(self._receive())
+
+    @classmethod
+    async def connect(cls, path):
+        """ Connect to the server listening on `path`. """
+        reader, writer = await asyncio.open_unix_connection(path)
+        return cls(reader, writer)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def _receive(self):
+        try:
+            while True:
+                message = await read_message(self._reader)
+                if message is None:
+                    break
+                if not isinstance(message, dict):
+                    continue
+                future = self._waiting.pop(message.get('id'), None)
+                if future is None or future.done():
+                    continue
+                if 'error' in message:
+                    future.set_exception(RemoteError(message['error']))
+                else:
+                    future.set_result(message['result'])
+        finally:
+            for future in self._waiting.values():
+                if not future.done():
+                    future.set_exception(
+                        ConnectionError('the server closed the connection'))
+            self._waiting.clear()
+
+    async def request(self, op, pattern, text, pos=0, mode=None):
+        """ Send a request and wait for its result.
+
+        Raises:
+            RemoteError: if the server couldn't carry out the request
+            ConnectionError: if the connection was lost first
+        """
+        if self._task.done():
+            raise ConnectionError('the connection is closed')
+        self._ids += 1
+        message = {'id': self._ids, 'op': op, 'pattern': pattern,
+                   'text': text}
+        if pos:
+            message['pos'] = pos
+        if mode is not None:
+            message['mode'] = mode
+        future = asyncio.get_running_loop().create_future()
+        self._waiting[self._ids] = future
+        write_message(self._writer, message)
+        await self._writer.drain()
+        return await future
+
+    async def match(self, pattern, text, mode=None):
+        """ True if `pattern` matches the whole of `text`. """
+        return await self.request('match', pattern, text, mode=mode)
+
+    async def search(self, pattern, text, pos=0, mode=None):
+        """ The `(start, end)` of the leftmost-longest match, or None. """
+        span = await self.request('search', pattern, text, pos, mode)
+        return None if span is None else tuple(span)
+
+    async def findall(self, pattern, text, pos=0, mode=None):
+        """ The text of every non-overlapping match. """
+        return await self.request('findall', pattern, text, pos, mode)
+
+    async def close(self):
+        self._writer.close()
+        try:
+            await self._writer.wait_closed()
+        except ConnectionError:
+            pass
+        await self._task
+
+
+def get_args(argv=None):
+    parser = ArgumentParser(prog='python -m rematch.server',
+                            description='serve rematch patterns over a '
+                                        'Unix domain socket')
+    parser.add_argument('--socket', required=True,
+                        help='the path of the socket to listen on')
+    parser.add_argument('--bundle', help='a bundle of compiled patterns to '
+                                         'serve (see rematch.bundle)')
+    parser.add_argument('--mode', default='lazy', choices=MODES,
+                        help='the engine for patterns compiled on demand')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = get_args(argv)
+    server = Server(args.socket, bundle=args.bundle, mode=args.mode)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
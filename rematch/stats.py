@@ -0,0 +1,201 @@
+"""
+stats.py: opt-in counters describing the work a Regex does while matching.
+
+Statistics are off by default and cost nothing then: `Regex.enable_stats`
+swaps the engine's matching function for an instrumented copy built here,
+and `Regex.disable_stats` puts the original back.  The instrumented copies
+follow the same steps as the engines in `compact`, `dfa` and `glushkov`,
+counting as they go, so they run noticeably slower; turn them on to find out
+why a pattern is slow, not all the time.
+"""
+
+from collections import Counter
+
+from .compact import DOT, LITERAL, CLASS
+from .dfa import DEAD
+
+COUNTERS = ('calls', 'matches', 'consumed', 'early_exits', 'transitions',
+            'closures', 'cache_hits', 'cache_misses', 'flushes')
+
+
+class Stats(object):
+    """ Counters accumulated over the runs of an instrumented Regex.
+
+    Only whole string matching (`Regex.__call__`) is counted; strings the
+    prefilter rejects never reach the engine and aren't counted either.
+
+    Attributes:
+        nfa_states (int): the number of states of the compiled NFA
+        calls (int): the number of times the engine ran
+        matches (int): how many of those runs matched
+        consumed (int): the characters (or bytes) read, in total
+        early_exits (int): runs abandoned at the dead state, where no match
+                           was possible whatever input followed
+        transitions (int): arrows tested ('nfa', and 'lazy' cache misses),
+                           table entries read ('dfa') or bit-parallel steps
+                           taken ('glushkov')
+        closures (int): epsilon closures merged into a state set, one for
+                        every arrow that matched
+        active_sizes (Counter): how many steps were taken from NFA state
+                                sets ('nfa' and 'lazy' modes), or sets of
+                                Glushkov states ('glushkov'), of each size
+        cache_hits, cache_misses (int): lazy DFA transitions found in, or
+                                        added to, the cache
+        flushes (int): lazy DFA cache flushes
+    """
+    def __init__(self, nfa_states=0):
+        self.nfa_states = nfa_states
+        self.reset()
+
+    def reset(self):
+        """ Zero every counter. """
+        for name in COUNTERS:
+            setattr(self, name, 0)
+        self.active_sizes = Counter()
+
+    def as_dict(self):
+        """ Return the counters as a plain dict, e.g. to export them. """
+        result = {name: getattr(self, name) for name in COUNTERS}
+        result['nfa_states'] = self.nfa_states
+        result['active_sizes'] = dict(self.active_sizes)
+        return result
+
+    def __repr__(self):
+        return '<Stats: {} calls, {} consumed, {} transitions>'.format(
+            self.calls, self.consumed, self.transitions)
+
+
+def counting_step(program, stats):
+    """ Return a copy of `program.step` that counts transitions and
+    closures into `stats`.
+    """
+    index, kinds, labels, targets, classes, closure = (
+        program.index, program.kinds, program.labels, program.targets,
+        program.classes, program.closure)
+
+    def step(states, code):
+        reached = set()
+        for state in states:
+            first, last = index[state], index[state + 1]
+            stats.transitions += last - first
+            for k in range(first, last):
+                kind = kinds[k]
+                if (kind == DOT or
+                        kind == LITERAL and labels[k] == code or
+                        kind == CLASS and code in classes[labels[k]]):
+                    stats.closures += 1
+                    reached.update(closure[targets[k]])
+        return frozenset(reached)
+    return step
+
+
+def _finish(regex, stats, hook, accepted, dead):
+    stats.calls += 1
+    stats.matches += accepted
+    stats.early_exits += dead
+    if hook is not None:
+        hook(regex, stats)
+    return accepted
+
+
+def instrument(regex, stats, hook=None):
+    """ Build an instrumented replacement for `regex._match`.
+
+    In 'lazy' mode this also swaps the engine's step function for
+    `counting_step`; `restore` undoes it.
+
+    Arguments:
+        regex (Regex): the pattern to instrument
+        stats (Stats): where to count
+        hook (callable): called as `hook(regex, stats)` after every run, e.g.
+                         to export the counters to a metrics system
+
+    Returns:
+        callable: `match(codes)`, returning True if the whole input matched
+
+    Raises:
+        ValueError: if the Regex's mode has no instrumented engine
+    """
+    program = regex.program
+    step = counting_step(program, stats)
+
+    if regex.mode == 'lazy':
+        dfa = regex.dfa
+        dfa.step = step
+
+        def match(codes):
+            flushes = dfa.flushes
+            cache, sid = dfa.start_position()
+            trans, sets = cache.trans, cache.sets
+            sizes = stats.active_sizes
+            for code in codes:
+                stats.consumed += 1
+                sizes[len(sets[sid])] += 1
+                nxt = trans[sid][code]
+                if nxt is None:
+                    stats.cache_misses += 1
+                    cache, nxt = dfa._compute(cache, sid, code)
+                    trans, sets = cache.trans, cache.sets
+                else:
+                    stats.cache_hits += 1
+                sid = nxt
+                if sid == DEAD:
+                    break
+            stats.flushes += dfa.flushes - flushes
+            return _finish(regex, stats, hook, bool(cache.accepting[sid]),
+                           sid == DEAD)
+
+    elif regex.mode in ('dfa', 'codegen'):
+        dfa = regex.dfa
+
+        def match(codes):
+            state, dead = dfa.start, dfa.dead
+            rows, byte_mode, classify = dfa.rows, dfa.byte_mode, dfa.alphabet
+            for code in codes:
+                stats.consumed += 1
+                stats.transitions += 1
+                state = rows[state][code if byte_mode else classify(code)]
+                if state == dead:
+                    break
+            return _finish(regex, stats, hook, dfa.accepts(state),
+                           state == dead)
+
+    elif regex.mode == 'glushkov':
+        automaton = regex.glushkov
+
+        def match(codes):
+            active = 1
+            sizes = stats.active_sizes
+            for code in codes:
+                stats.consumed += 1
+                stats.transitions += 1
+                sizes[bin(active).count('1')] += 1
+                active = automaton.step(active, code)
+                if not active:
+                    break
+            return _finish(regex, stats, hook,
+                           bool(active & automaton.accept), not active)
+
+    elif regex.mode == 'nfa':
+        def match(codes):
+            states = frozenset(program.initial)
+            sizes = stats.active_sizes
+            for code in codes:
+                stats.consumed += 1
+                sizes[len(states)] += 1
+                states = step(states, code)
+                if not states:
+                    break
+            return _finish(regex, stats, hook, program.accepting(states),
+                           not states)
+
+    else:
+        raise ValueError('cannot count the work of {!r} mode'.format(
+            regex.mode))
+    return match
+
+
+def restore(regex):
+    """ Undo `instrument`, returning `regex` to its uncounted engine. """
+    if regex.mode == 'lazy':
+        regex.dfa.step = regex.program.step
@@ -0,0 +1,98 @@
+"""
+stream.py: match a Regex against input that arrives in chunks.
+
+A `Stream` carries its position in the pattern's DFA from one chunk to the
+next instead of buffering the input, so memory use stays constant however
+much input is fed.  It also notices as soon as the outcome can no longer
+change -- when no state is left alive, or when every possible continuation
+accepts -- so callers can stop reading early.
+"""
+
+from .alphabet import codes
+from .dfa import LazyDFA
+
+
+class Stream(object):
+    """ An incremental whole-input matcher, created by `Regex.stream`.
+
+    Streams run on the Regex's DFA; a Regex in 'nfa' or 'glushkov' mode
+    gives each of its streams a private lazy DFA.  Several streams can share
+    one Regex.
+
+    Attributes:
+        regex (Regex): the pattern being matched
+        consumed (int): the number of characters (or bytes) fed so far
+    """
+    def __init__(self, regex):
+        self.regex = regex
+        if regex.mode in ('nfa', 'glushkov'):
+            program = regex.program
+            self._engine = LazyDFA(program.initial, program.step,
+                                   program.accepting,
+                                   byte_mode=regex.byte_mode)
+        else:
+            self._engine = regex.dfa
+        self._position = self._engine.start_position()
+        self.consumed = 0
+        self._finished = False
+        self._decided = None
+        self._check()
+
+    def __repr__(self):
+        return '<Stream {!r}: consumed={} matched={}>'.format(
+            self.regex, self.consumed, self.matched)
+
+    def _check(self):
+        engine, position = self._engine, self._position
+        if engine.is_dead(position):
+            self._decided = False
+        elif (engine.accepts(position) and
+              engine.is_universal(position, self.regex.alphabet)):
+            self._decided = True
+
+    @property
+    def matched(self):
+        """ True or False once the outcome is known, otherwise None.
+
+        The outcome is known early if the input so far can't be extended to
+        a match, or if it matches however it continues; otherwise only once
+        `finish` has been called.
+        """
+        return self._decided
+
+    @property
+    def decided(self):
+        return self._decided is not None
+
+    def feed(self, chunk):
+        """ Match the next piece of input.
+
+        Once the outcome is decided further input is ignored.
+
+        Returns:
+            the value of `matched` after consuming `chunk`
+        """
+        if self._finished:
+            raise ValueError('cannot feed a finished stream')
+        if isinstance(chunk, str) == self.regex.byte_mode:
+            raise TypeError('cannot feed {} to a stream of a {} pattern'
+                            .format(type(chunk).__name__,
+                                    'bytes' if self.regex.byte_mode
+                                    else 'str'))
+        self.consumed += len(chunk)
+        if self._decided is None:
+            self._position = self._engine.feed(self._position, codes(chunk))
+            self._check()
+        return self._decided
+
+    def finish(self):
+        """ Signal the end of the input.
+
+        Returns:
+            bool: True if the whole input matched
+        """
+        if not self._finished:
+            self._finished = True
+            if self._decided is None:
+                self._decided = self._engine.accepts(self._position)
+        return self._decided
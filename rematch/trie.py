@@ -0,0 +1,132 @@
+"""
+trie.py: search for any of a set of literal strings with an Aho-Corasick
+automaton.
+
+A pattern like `foo|bar|baz|...` with thousands of alternatives compiles (see
+`optimizer` and `patcher.trie_patch`) into a trie, so that matching it is
+one arrow per character.  Searching with `Program.search` still seeds a new
+thread at every offset, though, and keeps every alternative that is partly
+matched alive.  A `Trie` follows all of them with a single state: it is the
+node of the longest suffix of the text read so far that starts one of the
+strings, and its failure link gives the next longest on a mismatch, so every
+character costs O(1) amortized whatever the number of strings.
+"""
+
+from .alphabet import code_array
+
+
+class Trie(object):
+    """ An Aho-Corasick automaton over a set of non-empty strings.
+
+    Nodes are numbered from 0, the root.  Codes are code points, or byte
+    values for strings decoded from a bytes pattern (see `alphabet.codes`).
+
+    Arguments:
+        words (iterable): the strings
+
+    Attributes:
+        words (tuple): the strings, sorted
+        goto (list): for each node, a dict of its children by code
+        fail (list): for each node, the node of the longest proper suffix of
+                     its string that is in the trie
+        depth (list): the length of each node's string
+        terminal (list): whether each node's string is one of `words`
+        ends (list): for each node, the length of the longest of `words`
+                     that its string ends with, or 0 if there is none
+    """
+    __slots__ = ('words', 'goto', 'fail', 'depth', 'terminal', 'ends')
+
+    def __init__(self, words):
+        self.words = words = tuple(sorted(words))
+        goto, depth, terminal = [{}], [0], [False]
+        for word in words:
+            node = 0
+            for ch in word:
+                code = ord(ch)
+                nxt = goto[node].get(code)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[node][code] = nxt
+                    goto.append({})
+                    depth.append(depth[node] + 1)
+                    terminal.append(False)
+                node = nxt
+            terminal[node] = True
+        # failure links, breadth first so that every node's link is known
+        # before its children's
+        fail = [0] * len(goto)
+        ends = [depth[node] if terminal[node] else 0
+                for node in range(len(goto))]
+        order = list(goto[0].values())
+        for node in order:
+            for code, child in goto[node].items():
+                link = fail[node]
+                while link and code not in goto[link]:
+                    link = fail[link]
+                link = goto[link].get(code, 0)
+                fail[child] = link
+                if not ends[child]:
+                    ends[child] = ends[link]
+                order.append(child)
+        self.goto, self.fail, self.depth = goto, fail, depth
+        self.terminal, self.ends = terminal, ends
+
+    def __reduce__(self):
+        # the tables are cheap to rebuild, so only the strings are pickled
+        return (Trie, (self.words,))
+
+    def __len__(self):
+        return len(self.words)
+
+    def __repr__(self):
+        return '<Trie: {} strings, {} nodes>'.format(len(self.words),
+                                                     len(self.goto))
+
+    def search(self, text, pos=0, codes=None):
+        """ Find the leftmost-longest occurrence of any string in `text`,
+        starting at `pos`.
+
+        The scan stops at the first offset where some string ends.  A match
+        starting further left can only be one still in progress there, no
+        longer than the current node's string, so the few offsets between
+        the start of that string and the start of the longest one just found
+        are then tried in order with plain trie walks.
+
+        A negative `pos` counts as 0.  `codes` is `alphabet.code_array(text)`,
+        for callers searching the same text over and over.
+
+        Returns:
+            (start, end) tuple, or None if there is no match
+        """
+        goto, fail, ends = self.goto, self.fail, self.ends
+        if codes is None:
+            codes = code_array(text)
+        length = len(codes)
+        node = 0
+        i = max(pos, 0)
+        while not ends[node]:
+            if i >= length:
+                return None
+            code = codes[i]
+            while node and code not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(code, 0)
+            i += 1
+        found = i - ends[node]
+        for start in range(i - self.depth[node], found):
+            end = self.longest(codes, start)
+            if end is not None:
+                return start, end
+        return found, self.longest(codes, found)
+
+    def longest(self, codes, start):
+        """ The end of the longest string at `codes[start:]`, or None. """
+        goto, terminal = self.goto, self.terminal
+        node, end = 0, None
+        for i in range(start, len(codes)):
+            node = goto[node].get(codes[i])
+            if node is None:
+                break
+            if terminal[node]:
+                end = i + 1
+        return end
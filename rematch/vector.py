@@ -0,0 +1,97 @@
+"""
+vector.py: run a DFA over a whole batch of strings at once with NumPy.
+
+With a complete transition table, every string in a batch can advance in
+lockstep: one fancy-indexing step per character position moves all the rows
+at once, so the Python level loop runs once per column instead of once per
+character of every string.  NumPy is optional; it is only imported when this
+module is used.
+"""
+
+DTYPE_ERROR = ('match_array needs a NumPy array of fixed width strings (U), '
+               'bytes (S), or a 2-D uint8 code array; got {}')
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError('match_array requires NumPy (pip install numpy)')
+    return numpy
+
+
+def as_codes(arr, byte_mode, lengths=None):
+    """ Turn a batch of strings into a 2-D array of codes.
+
+    Arguments:
+        arr: a 1-D NumPy array of dtype U (str patterns) or S (bytes
+             patterns), or a 2-D uint8 array of byte codes
+        byte_mode (bool): whether the pattern is a bytes pattern
+        lengths: the length of each row; by default a row ends after its last
+                 non-zero code, the way NumPy pads fixed width strings
+
+    Returns:
+        codes, lengths (tuple): an (n, width) integer array and an (n,)
+        array of lengths
+    """
+    np = _numpy()
+    arr = np.asarray(arr)
+    kind = arr.dtype.kind
+    if kind == 'U' and arr.ndim == 1 and not byte_mode:
+        width = arr.dtype.itemsize // 4
+        codes = arr.view(np.uint32).reshape(len(arr), width)
+    elif kind == 'S' and arr.ndim == 1 and byte_mode:
+        width = arr.dtype.itemsize
+        codes = arr.view(np.uint8).reshape(len(arr), width)
+    elif arr.dtype == np.uint8 and arr.ndim == 2 and byte_mode:
+        codes = arr
+    else:
+        raise TypeError(DTYPE_ERROR.format(
+            '{} array of dtype {} for a {} pattern'.format(
+                arr.ndim, arr.dtype, 'bytes' if byte_mode else 'str')))
+    if lengths is None:
+        nonzero = codes != 0
+        width = codes.shape[1]
+        # one past the last non-zero code of every row (0 for empty rows)
+        last = width - np.argmax(nonzero[:, ::-1], axis=1)
+        lengths = np.where(nonzero.any(axis=1), last, 0)
+    return codes, np.asarray(lengths)
+
+
+def match_array(dfa, arr, byte_mode=False, lengths=None):
+    """ Match every string in `arr` against a `dfa.DFA`.
+
+    Arguments:
+        dfa (DFA): the compiled automaton
+        arr, byte_mode, lengths: as for `as_codes`
+
+    Returns:
+        numpy.ndarray: a boolean mask, True where the whole string matched
+    """
+    np = _numpy()
+    codes, lengths = as_codes(arr, byte_mode, lengths)
+    alphabet = dfa.alphabet
+    ncls = len(alphabet)
+    table = np.frombuffer(dfa.table, dtype=np.dtype(dfa.table.typecode))
+    table = table.reshape(dfa.num_states, ncls)
+    accepting = np.array([bool(value) for value in dfa.accepting])
+    if byte_mode:
+        classify = np.array(list(alphabet.byte_classes), dtype=np.intp)
+    else:
+        bounds = np.array(alphabet.bounds, dtype=np.int64)
+        interval_class = np.array(alphabet.interval_class, dtype=np.intp)
+
+    states = np.full(len(codes), dfa.start, dtype=np.intp)
+    for column in range(codes.shape[1]):
+        live = column < lengths
+        if not live.any():
+            break
+        code = codes[:, column]
+        if byte_mode:
+            cls = classify[code]
+        else:
+            cls = interval_class[np.searchsorted(bounds, code, 'right') - 1]
+        states = np.where(live, table[states, cls], states)
+        if dfa.dead >= 0 and (states == dfa.dead).all():
+            break
+    return accepting[states]
@@ -23,6 +23,9 @@ setup(
         author_email='john@jmsdvl.com',
 
         packages=packages,
+        extras_require={
+            "numpy": ["numpy"],
+        },
         entry_points={
             "console_scripts": [
                 "rematch=rematch.cli:cli",
@@ -0,0 +1,21 @@
+from itertools import count, product
+
+import pytest
+
+from rematch import State
+
+
+@pytest.fixture(autouse=True)
+def reset_state_index():
+    # State ids come from a global counter; restart it so tests that check
+    # ids don't depend on how many patterns earlier tests compiled.
+    State.Index = count()
+
+
+def all_strings(alphabet, maxlen):
+    """ Every string over `alphabet` of at most `maxlen` characters,
+    shortest first.
+    """
+    for n in range(maxlen + 1):
+        for chars in product(alphabet, repeat=n):
+            yield ''.join(chars)
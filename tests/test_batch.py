@@ -0,0 +1,64 @@
+import pickle
+
+import pytest
+
+from rematch import Regex, Program
+
+STRINGS = ['ab', 'aabb', 'abba', '', 'b', 'xabbx', 'ab' * 50 + 'b'] * 30
+
+
+@pytest.mark.parametrize('mode', ['lazy', 'dfa', 'nfa'])
+def test_pickle_round_trip(mode):
+    RE = Regex('(a|b)*abb|ab', mode=mode)
+    clone = pickle.loads(pickle.dumps(RE))
+    assert clone.pattern == RE.pattern
+    assert clone.mode == mode
+    assert isinstance(clone.program, Program)
+    assert clone.program.closure == RE.program.closure
+    for string in STRINGS:
+        assert clone(string) == RE(string)
+    assert clone.search('xxabbx').span() == (2, 5)
+
+
+def test_pickle_does_not_reparse(monkeypatch):
+    RE = Regex('error.*timeout')
+    data = pickle.dumps(RE)
+    import rematch.regex
+
+    def fail(pattern):
+        raise AssertionError('parsed again')
+    monkeypatch.setattr(rematch.regex, 'parse', fail)
+    clone = pickle.loads(data)
+    assert clone.required == RE.required
+    assert clone('error then timeout')
+
+
+def test_pickle_leaves_lazy_cache_behind():
+    RE = Regex('(a|b)*abb')
+    for string in STRINGS:
+        RE(string)
+    clone = pickle.loads(pickle.dumps(RE))
+    assert len(clone.dfa) == 2
+
+
+def test_pickled_dfa_is_not_rebuilt():
+    RE = Regex('(a|b)*abb', mode='dfa')
+    clone = pickle.loads(pickle.dumps(RE))
+    assert clone.dfa.num_states == RE.dfa.num_states
+    assert clone.dfa.build_time == RE.dfa.build_time
+
+
+def test_match_many_in_process():
+    RE = Regex('(a|b)*abb')
+    assert RE.match_many(STRINGS, workers=1) == [RE(s) for s in STRINGS]
+
+
+def test_match_many_on_a_pool():
+    RE = Regex('(a|b)*abb')
+    results = RE.match_many(iter(STRINGS), workers=2, chunksize=7)
+    assert results == [RE(s) for s in STRINGS]
+
+
+def test_match_many_rejects_bad_chunksize():
+    with pytest.raises(ValueError):
+        Regex('a').match_many(['a'], chunksize=0)
@@ -0,0 +1,103 @@
+import pickle
+
+import pytest
+
+from rematch import Bundle, Regex, write_bundle
+from rematch.bundle import dumps, loads
+
+PATTERNS = ['error.*timeout', '(a|b)*abb', 'foo|bar|baz', '[0-9]+\\.[0-9]+',
+            'x(\\w+)@']
+TEXTS = ['an error: timeout', 'aababb', 'a baz', 'v1.25', 'xjoe@', '']
+
+
+def same(regex, copy, texts):
+    for text in texts:
+        assert copy(text) == regex(text)
+        expected, found = regex.search(text), copy.search(text)
+        assert (found and found.span()) == (expected and expected.span())
+        assert copy.findall(text) == regex.findall(text)
+
+
+@pytest.mark.parametrize('mode', ['lazy', 'dfa', 'nfa'])
+def test_round_trip(mode):
+    for pattern in PATTERNS:
+        regex = Regex(pattern, mode=mode)
+        copy = loads(dumps(regex))
+        assert (copy.pattern, copy.mode) == (pattern, mode)
+        assert copy.required == regex.required
+        same(regex, copy, TEXTS)
+
+
+def test_round_trip_keeps_tables():
+    regex = Regex('(a|b)*abb', mode='dfa')
+    copy = loads(dumps(regex))
+    assert list(copy.program.targets) == list(regex.program.targets)
+    assert copy.program.closure == regex.program.closure
+    assert list(copy.dfa.table) == list(regex.dfa.table)
+    assert copy.trie is None
+    assert loads(dumps(Regex('foo|bar'))).trie.words == ('bar', 'foo')
+
+
+def test_bytes_patterns():
+    regex = Regex(b'\xff[a-c]+\x00')
+    copy = loads(dumps(regex))
+    assert copy.pattern == b'\xff[a-c]+\x00'
+    same(regex, copy, [b'x\xffabc\x00', b'\xff\x00'])
+
+
+def test_captures_after_loading():
+    copy = loads(dumps(Regex('x(\\w+)@')))
+    assert copy.search('to xjoe@').group(1) == 'joe'
+
+
+def test_pickle_loaded_regex():
+    copy = pickle.loads(pickle.dumps(loads(dumps(Regex('a[bc]*d')))))
+    assert copy('abcbd')
+    assert not copy('abx')
+
+
+def test_bad_records():
+    with pytest.raises(ValueError):
+        loads(b'nonsense')
+    record = bytearray(dumps(Regex('a')))
+    record[4] = 99
+    with pytest.raises(ValueError):
+        loads(bytes(record))
+
+
+def test_bundle(tmp_path):
+    path = str(tmp_path / 'patterns.rmx')
+    patterns = PATTERNS + [b'abc', 'abc']
+    assert write_bundle(path, patterns) == len(patterns)
+    with Bundle(path) as bundle:
+        assert len(bundle) == len(patterns)
+        assert [bundle.pattern(k) for k in range(len(bundle))] == patterns
+        # nothing is decoded until it is asked for
+        assert bundle._loaded == [None] * len(patterns)
+        regex = bundle.get('(a|b)*abb')
+        assert regex('babb') and not regex('ab')
+        assert bundle[1] is regex
+        assert bundle.get(b'abc').byte_mode
+        assert not bundle.get('abc').byte_mode
+        assert bundle.get('zzz') is None
+        assert [r.pattern for r in bundle] == patterns
+        with pytest.raises(IndexError):
+            bundle[len(patterns)]
+    # patterns loaded from a closed bundle keep working
+    assert regex('abb')
+
+
+def test_bundle_keeps_options(tmp_path):
+    path = str(tmp_path / 'patterns.rmx')
+    write_bundle(path, [Regex('a+b', mode='dfa', optimize=False)])
+    with Bundle(path) as bundle:
+        regex = bundle[0]
+        assert (regex.mode, regex.optimize) == ('dfa', False)
+        assert regex.search('xaab').span() == (1, 4)
+
+
+def test_not_a_bundle(tmp_path):
+    path = tmp_path / 'junk'
+    path.write_bytes(b'not a bundle at all')
+    with pytest.raises(ValueError):
+        Bundle(str(path))
@@ -0,0 +1,118 @@
+import mmap
+import pickle
+
+import pytest
+
+from rematch import Regex, RegexSet
+from rematch.alphabet import codes, code_array
+
+from conftest import all_strings
+
+MODES = ['lazy', 'dfa', 'nfa', 'codegen', 'glushkov']
+
+
+def test_codes():
+    assert list(codes('ab')) == [97, 98]
+    assert list(codes(b'ab')) == [97, 98]
+    assert list(codes(memoryview(b'ab'))) == [97, 98]
+    assert list(code_array('a\U0001f600')) == [97, 0x1f600]
+    assert code_array(bytearray(b'ab'))[1] == 98
+
+
+@pytest.mark.parametrize('mode', MODES)
+def test_bytes_pattern_agrees_with_str_pattern(mode):
+    for pattern in ('ab*(c|d)?', '(a|b)*abb', 'a.c'):
+        text_re = Regex(pattern, mode=mode)
+        bytes_re = Regex(pattern.encode(), mode=mode)
+        assert bytes_re.byte_mode
+        for string in all_strings('abcd', 4):
+            data = string.encode()
+            expected = text_re(string)
+            assert bytes_re(data) == expected
+            assert bytes_re(bytearray(data)) == expected
+            assert bytes_re(memoryview(data)) == expected
+
+
+@pytest.mark.parametrize('mode', MODES)
+def test_high_bytes(mode):
+    RE = Regex(b'\xff.\x00', mode=mode)
+    assert RE(b'\xff\x80\x00')
+    assert not RE(b'\xff\x80\x01')
+
+
+def test_dfa_uses_256_entry_rows():
+    RE = Regex(b'(a|b)*abb', mode='dfa')
+    assert len(RE.dfa.rows) == RE.dfa.num_states
+    assert all(len(row) == 256 for row in RE.dfa.rows)
+    assert len(Regex('(a|b)*abb', mode='dfa').dfa.rows[0]) < 256
+    lazy = Regex(b'(a|b)*abb')
+    assert lazy(b'abb')
+    assert all(len(row) == 256 for row in lazy.dfa._cache.trans)
+
+
+def test_type_mismatch_raises():
+    with pytest.raises(TypeError):
+        Regex(b'a')('a')
+    with pytest.raises(TypeError):
+        Regex('a')(b'a')
+    with pytest.raises(TypeError):
+        Regex(b'a').search('a')
+    with pytest.raises(TypeError):
+        Regex(b'a').stream().feed('a')
+
+
+def test_bytes_prefilter():
+    RE = Regex(b'error.*timeout')
+    assert RE.required == (b'timeout', b'error')
+    assert RE.prefix == b'error'
+    assert not RE(b'error only')
+    assert RE(b'error: timeout')
+
+
+def test_mmap_input(tmp_path):
+    path = tmp_path / 'data.log'
+    path.write_bytes(b'x' * 100000 + b'error after timeout\n' + b'y' * 10)
+    with open(str(path), 'rb') as fp:
+        with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            RE = Regex(b'error.*timeout')
+            match = RE.search(data)
+            assert match.span() == (100000, 100019)
+            assert match.group() == b'error after timeout'
+            assert not RE(data)
+            assert Regex(b'x*error.*\ny*')(data)
+            stream = RE.stream()
+            assert stream.feed(data[:10]) is False
+
+
+def test_bytes_search_findall():
+    RE = Regex(b'ab+')
+    assert RE.findall(b'xabbxab') == [b'abb', b'ab']
+    assert RE.search(memoryview(b'xxab')).span() == (2, 4)
+
+
+def test_bytes_regexset_and_pickle():
+    regex_set = RegexSet([b'ab', b'a.', b'c'])
+    assert regex_set.match(b'ab') == [0, 1]
+    assert regex_set.search(b'xxcab') == [0, 1, 2]
+    clone = pickle.loads(pickle.dumps(Regex(b'a.c', mode='dfa')))
+    assert clone.byte_mode
+    assert clone(b'a\xffc')
+
+
+@pytest.mark.parametrize('mode', ['lazy', 'dfa', 'nfa'])
+def test_byte_classes(mode):
+    RE = Regex(rb'[\x80-\xff]+[^\x00-\x7f]', mode=mode)
+    assert RE(b'\x80\xff\x90')
+    assert not RE(b'\x80a\x90')
+    with pytest.raises(ValueError):
+        Regex(b'\\u0100')
+
+
+@pytest.mark.parametrize('mode', MODES)
+def test_every_byte_named(mode):
+    # one class per byte value, plus class 0 for the codes above them
+    pattern = ''.join('\\x%02x' % i for i in range(256)).encode()
+    RE = Regex(pattern, mode=mode)
+    assert RE(bytes(range(256)))
+    assert not RE(bytes(range(255)) + b'\x00')
+    assert RE.search(b'\x00' + bytes(range(256))).span() == (1, 257)
@@ -0,0 +1,81 @@
+import pytest
+
+import rematch
+from rematch import Regex
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    rematch.purge()
+    yield
+    rematch.purge()
+
+
+def test_compile_returns_a_regex():
+    RE = rematch.compile('a(b|c)*')
+    assert isinstance(RE, Regex)
+    assert RE('abcb')
+
+
+def test_compile_is_cached():
+    RE = rematch.compile('a(b|c)*')
+    assert rematch.compile('a(b|c)*') is RE
+    info = rematch.cache_info()
+    assert info.hits == 1
+    assert info.misses == 1
+    assert info.currsize == 1
+
+
+def test_options_are_part_of_the_key():
+    lazy = rematch.compile('ab')
+    dfa = rematch.compile('ab', mode='dfa')
+    assert lazy is not dfa
+    assert dfa.mode == 'dfa'
+    assert rematch.compile('ab', mode='dfa') is dfa
+
+
+def test_optimizations_as_a_list():
+    RE = rematch.compile('foo|bar', optimize=['tries', 'fuse_literals'])
+    assert RE.trie is not None
+    assert rematch.compile('foo|bar',
+                           optimize=('fuse_literals', 'tries')) is RE
+    assert rematch.compile('foo|bar', optimize=False) is not RE
+
+
+def test_compile_passes_regex_through():
+    RE = Regex('ab')
+    assert rematch.compile(RE) is RE
+    with pytest.raises(ValueError):
+        rematch.compile(RE, mode='dfa')
+
+
+def test_match():
+    assert rematch.fullmatch('a*b', 'aaab').span() == (0, 4)
+    assert rematch.fullmatch('a*b', 'aaa') is None
+    assert rematch.fullmatch('a*b', 'abc') is None
+    assert rematch.fullmatch('a*b', 'b', mode='nfa')
+    # as with `re`, the functions do what the methods of the same name do
+    assert rematch.match('a*b', 'abc').span() == (0, 2)
+    assert rematch.match('a*b', 'cab') is None
+    assert rematch.cache_info().currsize == 2
+
+
+def test_purge():
+    RE = rematch.compile('ab')
+    rematch.purge()
+    assert rematch.cache_info().currsize == 0
+    assert rematch.compile('ab') is not RE
+
+
+def test_cache_is_bounded():
+    for n in range(rematch.cache.MAXCACHE + 10):
+        rematch.compile('a' + str(n))
+    assert rematch.cache_info().currsize == rematch.cache.MAXCACHE
+
+
+def test_search_functions():
+    assert rematch.search('b+', 'abbc').span() == (1, 3)
+    assert rematch.search('d', 'abbc') is None
+    assert rematch.findall('b', 'abbc') == ['b', 'b']
+    assert [m.group() for m in rematch.finditer('a|c', 'abbc')] == ['a', 'c']
+    assert rematch.cache_info().currsize == 4
@@ -0,0 +1,48 @@
+import pickle
+
+from rematch.charset import CharSet, normalize, complement
+from rematch.alphabet import MAX_CODE
+
+
+def test_normalize_merges_overlapping_and_adjacent_spans():
+    assert normalize([(5, 9), (0, 2), (3, 3), (8, 12), (20, 20)]) == \
+        ((0, 3), (5, 12), (20, 20))
+
+
+def test_complement():
+    assert complement(((0, 3), (10, 20))) == ((4, 9), (21, MAX_CODE))
+    assert complement(()) == ((0, MAX_CODE),)
+    assert complement(((0, MAX_CODE),)) == ()
+
+
+def test_membership():
+    charset = CharSet([(ord('a'), ord('z')), (0x400, 0x4ff),
+                       (0x1f600, 0x1f600)])
+    members = [ord('a'), ord('m'), ord('z'), 0x400, 0x450, 0x4ff, 0x1f600]
+    others = [0, ord('A'), ord('{'), 127, 128, 0x3ff, 0x500, 0x1f601, MAX_CODE]
+    for code in members:
+        assert code in charset
+    for code in others:
+        assert code not in charset
+
+
+def test_negation():
+    charset = CharSet([(ord('0'), ord('9'))], negate=True)
+    assert ord('5') not in charset
+    assert ord('a') in charset and 0x10000 in charset
+    assert len(charset) == MAX_CODE + 1 - 10
+
+
+def test_huge_sets_stay_small():
+    charset = CharSet([(0, 0xffff)])
+    assert charset.spans == ((0, 0xffff),)
+    assert len(charset) == 0x10000
+    assert 0xfffe in charset and 0x10000 not in charset
+
+
+def test_equality_hashing_and_pickling():
+    a = CharSet.from_chars('cab')
+    b = CharSet([(ord('a'), ord('c'))])
+    assert a == b and hash(a) == hash(b)
+    assert list(a) == [ord('a'), ord('b'), ord('c')]
+    assert pickle.loads(pickle.dumps(a)) == a
@@ -0,0 +1,123 @@
+import io
+import subprocess
+import sys
+
+import pytest
+
+from rematch import Regex
+from rematch.cli import main
+
+
+@pytest.fixture
+def logs(tmp_path):
+    (tmp_path / 'a.log').write_bytes(b'ok start\nerror: disk timeout\n'
+                                     b'ok done\nerror again\n')
+    sub = tmp_path / 'sub'
+    sub.mkdir()
+    (sub / 'b.log').write_bytes(b'fine\nerror net timeout\xff')
+    (sub / 'c.log').write_bytes(b'all good\n')
+    return tmp_path
+
+
+def run(*argv):
+    out = io.BytesIO()
+    status = main(['--grep'] + list(argv), stdout=out)
+    return status, out.getvalue().decode('utf-8', 'surrogateescape')
+
+
+def test_prints_matching_lines(logs):
+    path = str(logs / 'a.log')
+    assert run('error.*timeout', path) == (0, 'error: disk timeout\n')
+    assert run('-n', 'error', path) == (0, '2:error: disk timeout\n'
+                                           '4:error again\n')
+    assert run('-v', 'error', path) == (0, 'ok start\nok done\n')
+    assert run('-c', 'ok', path) == (0, '2\n')
+    assert run('panic', path) == (1, '')
+
+
+def test_directories_and_file_names(logs):
+    a, b = str(logs / 'a.log'), str(logs / 'sub' / 'b.log')
+    status, out = run('timeout', str(logs))
+    assert status == 0
+    # bytes that aren't UTF-8 are printed back as they were read
+    assert out == ('{}:error: disk timeout\n'
+                   '{}:error net timeout\udcff\n'.format(a, b))
+    assert run('-l', 'timeout', str(logs)) == (0, '{}\n{}\n'.format(a, b))
+    assert run('-c', 'good', str(logs))[1].splitlines() == [
+        a + ':0', b + ':0', str(logs / 'sub' / 'c.log') + ':1']
+
+
+def test_jobs(logs):
+    assert run('-j', '3', '-n', 'error', str(logs)) == run('-n', 'error',
+                                                           str(logs))
+
+
+def test_missing_file(logs, capsys):
+    status, out = run('ok', str(logs / 'a.log'), str(logs / 'missing.log'))
+    assert status == 2
+    assert 'ok start' in out
+    assert 'missing.log' in capsys.readouterr().err
+
+
+def test_bad_pattern(capsys):
+    assert run('(ab', 'x') == (2, '')
+    assert 'bad pattern' in capsys.readouterr().err
+
+
+def test_stats(logs, capsys):
+    run('--stats', 'error', str(logs))
+    err = capsys.readouterr().err
+    assert 'compiled' in err
+    assert 'lines of 3 inputs' in err
+    assert 'lines/s' in err
+
+
+def test_pattern_is_compiled_once(logs, monkeypatch):
+    import rematch.cli
+    compiled = []
+
+    def counting(pattern, **options):
+        compiled.append(pattern)
+        return Regex(pattern, **options)
+    monkeypatch.setattr(rematch.cli, 'Regex', counting)
+    assert run('error', str(logs / 'a.log'))[0] == 0
+    assert compiled == ['.*(error).*']
+
+
+def test_strings(capsys):
+    assert main(['ab*', 'abb', 'ba']) == 0
+    assert capsys.readouterr().out == 'abb: True\n ba: False\n'
+
+
+def test_grep_options_need_grep(capsys):
+    for argv in (['-c', 'a', 'abc'], ['a']):
+        with pytest.raises(SystemExit) as exc:
+            main(argv)
+        assert exc.value.code == 2
+    assert '--grep' in capsys.readouterr().err
+
+
+def test_stdin():
+    process = subprocess.run([sys.executable, '-m', 'rematch.cli', '-g',
+                              '-n', 'b+c'], input=b'abc\nxyz\nbbbc\n',
+                             stdout=subprocess.PIPE)
+    assert process.returncode == 0
+    assert process.stdout == b'1:abc\n3:bbbc\n'
+
+
+def test_lines_are_printed_as_they_are_read():
+    # like `tail -f log | rematch error`: the input stays open
+    process = subprocess.Popen([sys.executable, '-m', 'rematch.cli',
+                                '--grep', 'error'], stdin=subprocess.PIPE,
+                               stdout=subprocess.PIPE)
+    try:
+        process.stdin.write(b'ok\nerror: disk full\n')
+        process.stdin.flush()
+        assert process.stdout.readline() == b'error: disk full\n'
+        process.stdin.write(b'another error\n')
+        process.stdin.flush()
+        assert process.stdout.readline() == b'another error\n'
+    finally:
+        process.stdin.close()
+        process.wait(timeout=30)
+    assert process.returncode == 0
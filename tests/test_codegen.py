@@ -0,0 +1,84 @@
+import pickle
+import random
+
+import pytest
+
+from rematch import Regex
+from rematch.codegen import build, generate
+
+from conftest import all_strings
+from test_optimizer import random_pattern
+
+
+def test_literal_runs_use_startswith():
+    source = generate(Regex('GET /index', mode='dfa').dfa)
+    assert "text.startswith('GET /index', i)" in source
+    match = build(Regex('GET /index', mode='dfa').dfa)
+    assert match('GET /index')
+    assert not match('GET /indey')
+    assert not match('GET /inde')
+    assert not match('GET /indexx')
+
+
+def test_self_loops_jump():
+    # everything but 't' loops, so the state jumps to the next 't'
+    source = generate(Regex('error.*timeout', mode='dfa').dfa)
+    assert "text.find('t', i)" in source
+    source = generate(Regex('[a-z]+@', mode='dfa').dfa)
+    assert 'lstrip' in source
+    match = build(Regex('[a-z]+@', mode='dfa').dfa)
+    assert match('x' * 1000 + '@')
+    assert not match('x' * 1000 + 'Y@')
+    assert not match('@')
+
+
+def test_universal_states_return_early():
+    source = generate(Regex('abc.*', mode='dfa').dfa)
+    assert 'return True' in source
+    assert Regex('abc.*', mode='codegen')('abc' + 'x' * 100)
+
+
+@pytest.mark.parametrize('byte_mode', [False, True])
+def test_agrees_with_dfa(byte_mode):
+    rng = random.Random(21)
+    texts = list(all_strings('abcx', 5))
+    for _ in range(150):
+        pattern = random_pattern(rng, 4)
+        dfa = Regex(pattern, mode='dfa')
+        match = build(dfa.dfa)
+        for text in texts:
+            assert match(text) == dfa(text), (pattern, text, match.source)
+        if byte_mode:
+            match = build(Regex(pattern.encode(), mode='dfa').dfa, True)
+            for text in texts:
+                assert match(text.encode()) == dfa(text), (pattern, text)
+
+
+def test_codegen_mode():
+    regex = Regex('[0-9]+\\.[0-9]+', mode='codegen')
+    assert regex.generated is not None
+    assert 'def match(text):' in regex.generated.source
+    assert regex('3.14')
+    assert not regex('3.')
+    assert regex.search('pi is 3.14!').span() == (6, 10)
+    # memoryviews still walk the DFA table
+    bytes_regex = Regex(b'[0-9]+', mode='codegen')
+    assert bytes_regex(memoryview(b'123'))
+    assert not bytes_regex(memoryview(b'12a'))
+
+
+def test_codegen_mode_pickles():
+    regex = pickle.loads(pickle.dumps(Regex('ab*c', mode='codegen')))
+    assert regex.generated is not None
+    assert regex('abbbc')
+    assert not regex('abbb')
+
+
+def test_codegen_mode_stats():
+    regex = Regex('ab*c', mode='codegen')
+    stats = regex.enable_stats()
+    assert regex('abbc')
+    assert stats.calls == 1
+    regex.disable_stats()
+    assert regex('abbc')
+    assert stats.calls == 1
@@ -0,0 +1,67 @@
+from array import array
+from itertools import product
+
+from rematch import Regex, Program, lower, patch, parse
+from rematch.alphabet import codes
+from rematch.compact import LITERAL, DOT
+
+
+def compile_program(pattern):
+    return lower(*patch(parse(pattern)))
+
+
+def test_lower_literal():
+    program = compile_program('a')
+    assert isinstance(program, Program)
+    assert program.n == 2
+    assert list(program.kinds) == [LITERAL]
+    assert list(program.labels) == [ord('a')]
+    assert list(program.accept) == [0, 1]
+    assert len(program.eps_targets) == 0
+
+
+def test_tables_are_arrays_of_ints():
+    program = compile_program('ab*(c|.)')
+    for table in (program.accept, program.index, program.kinds,
+                  program.labels, program.targets, program.eps_index,
+                  program.eps_targets):
+        assert isinstance(table, array)
+    assert set(program.kinds) == {LITERAL, DOT}
+    assert len(program.index) == len(program.eps_index) == program.n + 1
+
+
+def test_closures_only_hold_states_the_matcher_needs():
+    program = compile_program('a*b')
+    for closure in program.closure:
+        for state in closure or ():
+            assert (program.index[state] != program.index[state + 1] or
+                    program.accept[state])
+    # from the start state, both 'a' and 'b' can be read
+    labels = {program.labels[program.index[state]]
+              for state in program.initial}
+    assert labels == {ord('a'), ord('b')}
+
+
+def test_step():
+    program = compile_program('ab')
+    after_a = program.step(frozenset(program.initial), ord('a'))
+    assert after_a and not program.accepting(after_a)
+    after_ab = program.step(after_a, ord('b'))
+    assert program.accepting(after_ab)
+    assert program.step(after_a, ord('a')) == frozenset()
+
+
+def test_epsilon_cycles():
+    program = compile_program('(a*)*')
+    assert program.match(codes(''))
+    assert program.match(codes('aaa'))
+    assert not program.match(codes('ab'))
+
+
+def test_nfa_mode_runs_on_the_program():
+    for pattern in ('ab*(c|d)?', '(a|b)*abb', 'a?a?aa', 'a.c', ''):
+        nfa, dfa = Regex(pattern, mode='nfa'), Regex(pattern, mode='dfa')
+        for n in range(5):
+            for chars in product('abcd', repeat=n):
+                string = ''.join(chars)
+                assert nfa(string) == dfa(string), (pattern, string)
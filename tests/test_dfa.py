@@ -0,0 +1,93 @@
+import pytest
+
+from rematch import Regex, LazyDFA, DFA, DFASizeError, Alphabet
+
+from conftest import all_strings
+
+
+def test_lazy_is_default_mode():
+    RE = Regex('ab*')
+    assert RE.mode == 'lazy'
+    assert isinstance(RE.dfa, LazyDFA)
+
+
+def test_unknown_mode_raises():
+    with pytest.raises(ValueError):
+        Regex('a', mode='backtrack')
+
+
+def test_lazy_agrees_with_nfa():
+    for pattern in ('ab*(c|d)?', '(a|b)*abb', 'a?a?aa', '(ab|a)(bc|c)', ''):
+        lazy, nfa = Regex(pattern), Regex(pattern, mode='nfa')
+        for string in all_strings('abcd', 5):
+            assert lazy(string) == nfa(string), (pattern, string)
+
+
+def test_transitions_are_memoized():
+    RE = Regex('(a|b)*c')
+    assert RE('ababababc')
+    cached = len(RE.dfa)
+    assert RE('babababac')
+    assert len(RE.dfa) == cached
+    assert RE.dfa.flushes == 0
+
+
+def test_dead_state_exits_early():
+    RE = Regex('ab')
+    assert not RE('b' + 'a' * 1000)
+    # only the (always cached) empty state set and start set were visited
+    assert len(RE.dfa) == 2
+
+
+def test_cache_flushes_when_full():
+    pattern = '(a|b)*a(a|b)(a|b)(a|b)(a|b)'
+    lazy = Regex(pattern, cache_size=4)
+    nfa = Regex(pattern, mode='nfa')
+    for string in all_strings('ab', 9):
+        assert lazy(string) == nfa(string), string
+    assert lazy.dfa.flushes > 0
+    assert len(lazy.dfa) <= 4
+
+
+def test_cache_size_must_hold_dead_and_start_states():
+    with pytest.raises(ValueError):
+        Regex('a', cache_size=1)
+
+
+def test_alphabet_classes():
+    alphabet = Alphabet([[(ord('a'), ord('a'))], [(ord('b'), ord('d'))],
+                         [(ord('c'), ord('c'))]])
+    assert len(alphabet) == 4
+    assert alphabet(ord('z')) == alphabet(0) == 0
+    assert alphabet(ord('b')) == alphabet(ord('d')) != alphabet(ord('c'))
+    assert len({alphabet(code) for code in b'abc'}) == 3
+    assert alphabet.byte_classes[ord('d')] == alphabet(ord('b'))
+
+
+def test_dfa_agrees_with_nfa():
+    for pattern in ('ab*(c|d)?', '(a|b)*abb', 'a?a?aa', '(ab|a)(bc|c)', '',
+                    'a.c', '.*d'):
+        dfa, nfa = Regex(pattern, mode='dfa'), Regex(pattern, mode='nfa')
+        assert isinstance(dfa.dfa, DFA)
+        for string in all_strings('abcd', 5):
+            assert dfa(string) == nfa(string), (pattern, string)
+
+
+def test_dfa_is_minimized():
+    # (a|b)*abb is the textbook example: its minimal DFA has 4 live states
+    RE = Regex('(a|b)*abb', mode='dfa')
+    # plus the dead state that any character other than a or b leads to
+    assert RE.dfa.num_states == 5
+    assert RE.dfa.build_time >= 0
+    # both branches' 'b' states are merged, as are their accept states
+    RE = Regex('ab|cb', mode='dfa')
+    assert RE.dfa.subset_states == 6
+    assert RE.dfa.num_states == 4
+
+
+def test_dfa_size_cap():
+    pattern = '(a|b)*a' + '(a|b)' * 12
+    with pytest.raises(DFASizeError):
+        Regex(pattern, mode='dfa', max_states=100)
+    # the lazy engine copes with the same pattern
+    assert Regex(pattern, cache_size=100)('b' + 'a' * 13)
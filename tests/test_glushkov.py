@@ -0,0 +1,120 @@
+import itertools
+import pickle
+import random
+
+import pytest
+
+from rematch import Glushkov, Regex, parse
+from rematch.alphabet import codes
+from rematch.optimizer import optimize
+
+from test_optimizer import random_pattern
+
+
+def glushkov(pattern, **options):
+    return Glushkov(parse(pattern), **options)
+
+
+def test_positions():
+    automaton = glushkov('a(b|c)*d')
+    assert automaton.n == 4
+    assert automaton.labels[1:] == [ord('a'), ord('b'), ord('c'), ord('d')]
+    # a -> b, b -> b and c, c -> b, c and d
+    assert automaton.follow[0] == 0b10
+    assert automaton.follow[1] == 0b11100
+    assert automaton.follow[3] == 0b11100
+    assert automaton.accept == 0b10000
+
+
+def test_arrows_are_split_three_ways():
+    automaton = glushkov('ab*c')
+    # a -> b is a shift, b -> b a loop, a -> c and b -> c are shifts too
+    assert automaton.shift == 0b0111
+    assert automaton.loops == 0b0100
+    assert automaton.other == 0b0010
+    assert automaton.jumps[1] == 0b1000
+
+
+def test_counted_repetition_copies_positions():
+    assert glushkov('a{3}').n == 3
+    assert glushkov('(ab){2,4}').n == 8
+    assert glushkov('a{2,}').n == 2
+    assert glushkov('a{0}').n == 0
+    for pattern, string, expected in [('a{3}', 'aaa', True),
+                                      ('a{3}', 'aaaa', False),
+                                      ('a{2,}', 'aaaaa', True),
+                                      ('a{2,}', 'a', False),
+                                      ('(ab){0,2}', '', True),
+                                      ('(ab){0,2}', 'ababab', False)]:
+        assert glushkov(pattern).match(codes(string)) == expected
+
+
+def test_classes_and_dot():
+    automaton = glushkov('[0-9]+.x')
+    assert automaton.match(codes('123yx'))
+    assert automaton.match(codes('1\U0001f600x'))
+    assert not automaton.match(codes('1x'))
+
+
+def test_optimized_trees():
+    automaton = Glushkov(optimize(parse('foo|bar|baz')))
+    assert automaton.n == 9
+    assert automaton.match(codes('bar'))
+    assert not automaton.match(codes('ba'))
+
+
+@pytest.mark.parametrize('optimizations', [False, True])
+def test_agrees_with_nfa(optimizations):
+    rng = random.Random(8)
+    strings = [''.join(chars) for n in range(6)
+               for chars in itertools.product('abcx', repeat=n)]
+    for _ in range(150):
+        pattern = random_pattern(rng, 4)
+        plain = Regex(pattern, mode='nfa', optimize=False)
+        automaton = Glushkov(optimize(parse(pattern), optimizations))
+        in_bytes = Glushkov(optimize(parse(pattern), optimizations),
+                            byte_mode=True)
+        for string in strings:
+            expected = plain(string)
+            assert automaton.match(codes(string)) == expected, (pattern,
+                                                                 string)
+            assert in_bytes.match(string.encode()) == expected
+
+
+def test_glushkov_mode():
+    regex = Regex('(a|b)*abb', mode='glushkov')
+    # '(a|b)' is optimized into the class '[ab]'
+    assert regex.glushkov.n == 4
+    assert regex('ababb')
+    assert not regex('abab')
+    assert regex.search('xxabbx').span() == (2, 5)
+    assert Regex('(a|b)*abb').glushkov is None
+
+
+def test_no_blowup():
+    # the DFA of this pattern needs 2**20 states
+    regex = Regex('(a|b)*a(a|b){19}', mode='glushkov')
+    assert regex.glushkov.n == 21
+    assert regex('b' * 50 + 'a' + 'b' * 19)
+    assert not regex('b' * 50 + 'a' + 'b' * 20)
+
+
+def test_pickle():
+    regex = pickle.loads(pickle.dumps(Regex('x[0-9]+y', mode='glushkov')))
+    assert regex('x123y')
+    assert not regex('x12')
+    automaton = pickle.loads(pickle.dumps(glushkov('a.c')))
+    assert automaton.match(codes('abc'))
+
+
+def test_stats_and_streams():
+    regex = Regex('ab*c', mode='glushkov')
+    stats = regex.enable_stats()
+    assert regex('abbc')
+    assert stats.calls == 1
+    regex.disable_stats()
+    assert regex('abbc')
+    stream = regex.stream()
+    stream.feed('ab')
+    stream.feed('bc')
+    assert stream.finish()
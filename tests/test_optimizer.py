@@ -0,0 +1,171 @@
+import itertools
+import random
+import sys
+
+import pytest
+
+from rematch import (Regex, RegexSet, parse, LiteralExpr, StringExpr, TrieExpr,
+                     StarExpr, ChoiceExpr, ConcatExpr, CharClassExpr,
+                     NullString, RepeatExpr)
+from rematch.charset import CharSet
+from rematch.optimizer import OPTIMIZATIONS, optimize
+
+
+def opt(pattern, *names):
+    return optimize(parse(pattern), names or True)
+
+
+def states(pattern, **options):
+    return Regex(pattern, mode='nfa', **options).program.n
+
+
+def test_unknown_optimization_raises():
+    with pytest.raises(ValueError):
+        optimize(parse('a'), ('fuse_literals', 'unroll'))
+
+
+def test_no_optimizations_returns_tree():
+    tree = parse('a|b')
+    assert optimize(tree, False) is tree
+    assert optimize(tree, ()) is tree
+
+
+def test_fuse_literals():
+    assert opt('abc', 'fuse_literals') == StringExpr('abc')
+    assert opt('a', 'fuse_literals') == LiteralExpr('a')
+    assert opt('ab.cd', 'fuse_literals') == ConcatExpr(
+        ConcatExpr(StringExpr('ab'), parse('.')), StringExpr('cd'))
+    # runs inside groups join the run around them
+    assert opt('a(bc)d', 'fuse_literals') == StringExpr('abcd')
+
+
+def test_merge_classes():
+    assert opt('a|b|c', 'merge_classes') == CharClassExpr(
+        values=CharSet.from_chars('abc'))
+    assert opt('a|[b-d]|e', 'merge_classes') == CharClassExpr(
+        values=CharSet([(ord('a'), ord('e'))]))
+    # a class made of a single character is a literal again
+    assert opt('a|a', 'merge_classes') == LiteralExpr('a')
+    # single characters merge across the other alternatives
+    tree = opt('a|bc|d', 'merge_classes')
+    assert isinstance(tree, ChoiceExpr)
+    assert tree.left == CharClassExpr(values=CharSet.from_chars('ad'))
+
+
+def test_simplify():
+    a = LiteralExpr('a')
+    assert opt('((a*)*)*', 'simplify') == StarExpr(a)
+    assert opt('(a?)*', 'simplify') == StarExpr(a)
+    assert opt('(a*)?', 'simplify') == StarExpr(a)
+    assert opt('(a+)*', 'simplify') == StarExpr(a)
+    assert opt('()*', 'simplify') == NullString()
+    assert opt('a()', 'simplify') == a
+    assert opt('a{1}', 'simplify') == a
+    assert opt('a{0}', 'simplify') == NullString()
+    assert opt('a{0,}', 'simplify') == StarExpr(a)
+    assert opt('a|a', 'simplify', 'hash_cons') == a
+
+
+def test_plus_needs_one_copy():
+    tree = opt('(ab|c)+', 'simplify', 'hash_cons')
+    assert isinstance(tree, RepeatExpr)
+    assert (tree.min, tree.max) == (1, None)
+    # without hash consing the two copies of the operand aren't identical
+    assert isinstance(opt('(ab|c)+', 'simplify'), ConcatExpr)
+
+
+def test_hash_cons_shares_subtrees():
+    tree = opt('(ab|cd)x(ab|cd)', 'hash_cons')
+    assert tree.right is tree.left.left
+
+
+def test_fewer_states():
+    for pattern in ('abcdefgh', 'a|b|c|d|e', '((a*)*)*b', '(ab|c)+d',
+                    '(a|b|c)*abb'):
+        assert states(pattern) < states(pattern, optimize=False)
+    big = '|'.join('abcdefghijklmnopqrstuvwxyz' * 100)
+    assert states(big) == 2
+
+
+def test_option_is_kept():
+    assert Regex('ab', optimize=False).optimize is False
+    only = ('merge_classes',)
+    assert states('a|b', optimize=only) < states('a|b', optimize=False)
+    assert states('ab', optimize=only) == states('ab', optimize=False)
+
+
+def random_pattern(rng, depth):
+    if depth == 0 or rng.random() < 0.3:
+        return rng.choice(['a', 'b', 'c', '[ab]', '.', '()'])
+    op = rng.choice(['ab', 'ab', 'a|b', 'a*', 'a?', 'a+', 'a{m,n}'])
+    x = random_pattern(rng, depth - 1)
+    if op == 'ab':
+        return x + random_pattern(rng, depth - 1)
+    if op == 'a|b':
+        return '({}|{})'.format(x, random_pattern(rng, depth - 1))
+    if op == 'a{m,n}':
+        m = rng.randint(0, 2)
+        return '({}){{{},{}}}'.format(x, m, m + rng.randint(0, 2))
+    return '({}){}'.format(x, op[1])
+
+
+@pytest.mark.parametrize('optimizations', [True] + [
+    (name,) for name in OPTIMIZATIONS])
+def test_agrees_with_unoptimized(optimizations):
+    rng = random.Random(17)
+    strings = [''.join(chars) for n in range(5)
+               for chars in itertools.product('abc', repeat=n)]
+    for _ in range(60):
+        pattern = random_pattern(rng, 4)
+        plain = Regex(pattern, mode='nfa', optimize=False)
+        optimized = Regex(pattern, mode='nfa', optimize=optimizations)
+        for string in strings:
+            assert optimized(string) == plain(string), (pattern, string)
+        text = 'x' + rng.choice(strings) + 'cab'
+        expected = plain.search(text)
+        found = optimized.search(text)
+        assert (found and found.span()) == (expected and expected.span())
+
+
+def test_regexset_optimizes():
+    patterns = ['a|b|c', 'abc', '(x*)*y']
+    assert (RegexSet(patterns).program.n <
+            RegexSet(patterns, optimize=False).program.n)
+    assert RegexSet(patterns).match('abc') == [1]
+
+
+def test_deep_patterns():
+    depth = sys.getrecursionlimit() * 10
+    regex = Regex('(' * depth + 'a' + ')*' * depth)
+    assert regex('aaa')
+    regex = Regex('a' * depth + '|b')
+    assert regex('a' * depth)
+    assert not regex('a' * (depth - 1))
+
+
+def test_tries():
+    assert opt('foo|bar|baz', 'fuse_literals', 'tries') == TrieExpr(
+        ['bar', 'baz', 'foo'])
+    # alternatives in nested groups and repeated ones join the same trie
+    assert opt('a|(ab|(abc|ab))', 'fuse_literals', 'tries') == TrieExpr(
+        ['a', 'ab', 'abc'])
+    assert opt('x(foo|bar)*', 'tries', 'fuse_literals') == ConcatExpr(
+        LiteralExpr('x'), StarExpr(TrieExpr(['bar', 'foo'])))
+    # other alternatives stay apart
+    tree = opt('foo|b.|bar', 'fuse_literals', 'tries')
+    assert isinstance(tree, ChoiceExpr)
+    assert TrieExpr(['bar', 'foo']) in tree
+    # the empty string isn't gathered: '(foo|bar)?' is still optional
+    assert opt('(foo|bar)?', 'fuse_literals', 'tries') == ChoiceExpr(
+        TrieExpr(['bar', 'foo']), NullString())
+    # single characters make a class rather than a trie
+    assert opt('a|b|c') == CharClassExpr(values=CharSet.from_chars('abc'))
+    assert opt('a|b|cd') == TrieExpr(['a', 'b', 'cd'])
+    assert opt('a|[b-d]|e') == CharClassExpr(
+        values=CharSet([(ord('a'), ord('e'))]))
+
+
+def test_trie_states():
+    words = ['prefix{:03d}'.format(number) for number in range(200)]
+    pattern = '|'.join(words)
+    assert states(pattern) < states(pattern, optimize=False) / 5
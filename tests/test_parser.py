@@ -1,8 +1,11 @@
+import sys
 from string import ascii_letters, digits
 import pytest
 
 from rematch import (TreeNode, LiteralExpr, NullString, StarExpr, ChoiceExpr,
-                    ConcatExpr, parse, level_first_walk)
+                    ConcatExpr, CharClassExpr, RepeatExpr, GroupExpr, parse,
+                    walk_tree, level_first_walk)
+from rematch.charset import CharSet
 
 CHARS = ascii_letters + digits
 
@@ -93,3 +96,102 @@ def test_complex_expression():
 
 def test_nested_parens_resolved_correctly():
     expr = parse(r'(ab(a|d)e)')
+
+
+def test_parse_char_class():
+    expr = parse('[a-cx-]')
+    assert isinstance(expr, CharClassExpr)
+    assert expr.charset == CharSet.from_chars('abcx-')
+    assert parse('[]a]').charset == CharSet.from_chars(']a')
+    assert parse(r'[\]\\\-]').charset == CharSet.from_chars(']\\-')
+    assert parse(r'[\x41-C\n]').charset == CharSet.from_chars('ABC\n')
+    assert parse(r'[\d_]').charset == CharSet.from_chars(digits + '_')
+
+
+def test_parse_negated_char_class():
+    charset = parse('[^a-z]').charset
+    assert ord('a') not in charset
+    assert ord('A') in charset and 0x10ffff in charset
+    assert parse('[a^]').charset == CharSet.from_chars('a^')
+
+
+def test_parse_class_escapes():
+    assert parse(r'\d').charset == CharSet.from_chars(digits)
+    assert ord('5') not in parse(r'\D').charset
+    assert parse(r'\t').value == '\t'
+    assert parse(r'\x7e').value == '~'
+
+
+@pytest.mark.parametrize('pattern', ['[abc', '[', '[]', '[z-a]', r'[\d-z]',
+                                     '\\', r'\x4', r'\xzz', 'a[^'])
+def test_parse_malformed_class(pattern):
+    with pytest.raises(ValueError):
+        parse(pattern)
+
+
+def test_parse_counted_repetition():
+    for pattern, bounds in (('a{3}', (3, 3)), ('a{2,}', (2, None)),
+                            ('a{,4}', (0, 4)), ('a{2,5}', (2, 5))):
+        expr = parse(pattern)
+        assert isinstance(expr, RepeatExpr)
+        assert (expr.min, expr.max) == bounds
+        assert expr.repetand == LiteralExpr('a')
+    expr = parse('(ab){2}c')
+    assert isinstance(expr.left, RepeatExpr)
+    assert isinstance(expr.left.repetand, ConcatExpr)
+    assert list(level_first_walk(parse('a{2}'))) == [
+        'RepeatExpr', (2, 2), 'LiteralExpr', 'a']
+
+
+@pytest.mark.parametrize('pattern', ['a{', 'a{2', 'a{x}', 'a{,}', 'a{3,2}',
+                                     'a{1001}', 'a{1,2,3}'])
+def test_parse_malformed_repetition(pattern):
+    with pytest.raises(ValueError):
+        parse(pattern)
+
+
+def test_alternation_inside_group_ends_at_the_group():
+    expr = parse('x(a|b)y|z')
+    assert isinstance(expr, ChoiceExpr)
+    assert expr.right == LiteralExpr('z')
+    assert list(walk_tree(expr.left)) == [
+        ('x', 'LiteralExpr'), 'ConcatExpr', ('a', 'LiteralExpr'),
+        'ChoiceExpr', ('b', 'LiteralExpr'), 'ConcatExpr',
+        ('y', 'LiteralExpr')]
+
+
+def test_empty_branches_and_groups():
+    assert parse('a|') == ChoiceExpr(LiteralExpr('a'), NullString())
+    assert parse('|a') == ChoiceExpr(NullString(), LiteralExpr('a'))
+    assert parse('()') == NullString()
+    assert parse('a|b|c') == ChoiceExpr(
+        LiteralExpr('a'), ChoiceExpr(LiteralExpr('b'), LiteralExpr('c')))
+
+
+@pytest.mark.parametrize('pattern', ['(a', 'a)', '(a))', '((a)', '*a', 'a|*',
+                                     '(+)'])
+def test_parse_malformed_groups_and_quantifiers(pattern):
+    with pytest.raises(ValueError):
+        parse(pattern)
+
+
+def test_parse_deep_and_long_patterns():
+    depth = 10 * sys.getrecursionlimit()
+    expr = parse('(' * depth + 'a' + ')' * depth)
+    assert expr == LiteralExpr('a')
+    expr = parse('ab' * depth)
+    assert len(list(walk_tree(expr))) == 4 * depth - 1
+    assert sum(1 for _ in level_first_walk(expr)) == 6 * depth - 1
+
+
+def test_parse_captures():
+    a, b = LiteralExpr('a'), LiteralExpr('b')
+    assert parse('(a)(b)', captures=True) == ConcatExpr(GroupExpr(a, 1),
+                                                        GroupExpr(b, 2))
+    # groups are numbered by their opening parenthesis
+    assert parse('((a)|b)', captures=True) == GroupExpr(
+        ChoiceExpr(GroupExpr(a, 2), b), 1)
+    assert parse('()', captures=True) == GroupExpr(NullString(), 1)
+    assert parse('(a)(b)') == ConcatExpr(a, b)
+    assert list(walk_tree(parse('(a)', captures=True))) == [
+        ('a', 'LiteralExpr'), 'GroupExpr', 1]
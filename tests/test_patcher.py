@@ -1,9 +1,11 @@
 import string
+import sys
 
 import pytest
 
 from rematch import (State, Arrow, Epsilon, DotArrow, patch, parse, TreeNode,
                      Regex, transition, E_set, partition)
+from rematch.patcher import reachable, clone
 
 CHARS = string.ascii_letters + string.digits
 
@@ -103,3 +105,44 @@ def test_epsilon_cycle_doesnt_recurse_forever():
     B.append(e2)
     e2.pointsAt = B
     assert set(E_set(A)) == {A, B}
+
+
+def test_counted_repetition_grows_linearly():
+    def size(pattern):
+        return len(reachable(patch(parse(pattern))[0]))
+    assert size('a{10}') < 3 * size('a') * 10
+    assert size('a{100}') <= 10 * size('a{10}') + 10
+    assert size('(ab|c){0,50}') <= 50 * size('ab|c') + 10
+    assert size('((ab){10}){10}') <= 100 * size('ab') + 20
+
+
+def test_clone_shares_nothing_with_the_original():
+    start, accept = patch(parse('(a|b)*c'))
+    copy_start, copy_accept = clone(start, accept)
+    original, copied = reachable(start), reachable(copy_start)
+    assert len(original) == len(copied)
+    assert not set(map(id, original)) & set(map(id, copied))
+    arrows = lambda states: {id(arrow) for state in states for arrow in state}
+    assert not arrows(original) & arrows(copied)
+    assert [copied.index(state) for state in copy_accept] == \
+        [original.index(state) for state in accept]
+
+
+def test_counted_repetition_state_limit():
+    with pytest.raises(ValueError):
+        patch(parse('((((a|b){1000}){1000}))'))
+
+
+def test_patch_deep_and_long_trees():
+    depth = 10 * sys.getrecursionlimit()
+    start, accept = patch(parse('a*' * depth + '(' * depth + 'b|c' +
+                                ')*' * depth))
+    assert len(reachable(start)) > 3 * depth
+
+
+def test_E_set_follows_long_chains():
+    depth = 10 * sys.getrecursionlimit()
+    states = [State() for _ in range(depth)]
+    for state, nxt in zip(states, states[1:]):
+        state.append(Epsilon(pointsAt=nxt))
+    assert set(E_set(states[0])) == set(states)
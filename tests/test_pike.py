@@ -0,0 +1,113 @@
+import random
+import re
+
+import pytest
+
+from rematch import Regex, PikeVM, parse
+
+
+def spans(pattern, text):
+    match = Regex(pattern).search(text)
+    return [match.span(group) for group in range(match.re.groups + 1)]
+
+
+def test_vm_match():
+    vm = PikeVM(parse('(a+)(b*)c?', captures=True))
+    assert vm.groups == 2
+    assert vm.match('aabbx') == (4, [(0, 2), (2, 4)])
+    assert vm.match('xaab', 1) == (4, [(1, 3), (3, 4)])
+    # forced to end early, the groups give way
+    assert vm.match('aabb', 0, 3) == (3, [(0, 2), (2, 3)])
+    assert vm.match('b') is None
+
+
+def test_groups_count():
+    assert Regex('abc').groups == 0
+    assert Regex('(a(b)|(c))+').groups == 3
+    # a group repeated zero times still counts
+    assert Regex('(a){0}b').groups == 1
+
+
+def test_alternatives_and_quantifiers_take_priority():
+    assert spans('(a|ab)(c|bcd)(d*)', 'abcd') == [(0, 4), (0, 1), (1, 4),
+                                                  (4, 4)]
+    assert spans('(a*)(a*)', 'aaa') == [(0, 3), (0, 3), (3, 3)]
+    assert spans('(a)|b', 'b') == [(0, 1), (-1, -1)]
+    # the last iteration of a repeated group wins
+    assert spans('(a|b)+', 'xabb') == [(1, 4), (3, 4)]
+    assert spans('(ab){2}', 'ababab') == [(0, 4), (2, 4)]
+
+
+def test_match_object():
+    regex = Regex(r'(\w+)@(\w+)\.(com|org)(x)?')
+    match = regex.search('mail joe@example.org now')
+    assert match.group() == 'joe@example.org'
+    assert match.group(1) == 'joe'
+    assert match.group(2, 3) == ('example', 'org')
+    assert match.group(4) is None
+    assert match.groups() == ('joe', 'example', 'org', None)
+    assert match.groups('') == ('joe', 'example', 'org', '')
+    assert match.start(2) == 9
+    assert match.end(3) == 20
+    for group in (5, -1, 'x'):
+        with pytest.raises(IndexError):
+            match.group(group)
+
+
+def test_regex_match_is_anchored():
+    regex = Regex('(a+)(b+)')
+    match = regex.match('xaabbb', 1)
+    assert match.span() == (1, 6)
+    assert match.groups() == ('aa', 'bbb')
+    assert regex.match('xaabbb') is None
+    # the longest match, not the whole string
+    assert Regex('(ab)*').match('ababx').span() == (0, 4)
+    assert Regex(b'a(b)c').match(b'abcd').group(1) == b'b'
+
+
+def test_finditer_groups():
+    regex = Regex(r'(\d+)-(\d+)')
+    assert [match.groups() for match in regex.finditer('1-2, 30-40')] == [
+        ('1', '2'), ('30', '40')]
+
+
+def test_agrees_with_re():
+    # for a given overall span, `re` tries the ways to split it in the same
+    # order; only empty iterations of repetitions are counted differently,
+    # so the patterns here don't repeat anything that can match nothing
+    rng = random.Random(19)
+
+    def pattern(depth):
+        """ A random pattern, and whether it matches the empty string. """
+        if depth == 0 or rng.random() < 0.3:
+            return rng.choice(['a', 'b', '[ab]', '.']), False
+        op = rng.choice(['ab', 'ab', 'a|b', '(a)', 'a*', 'a?', 'a+'])
+        x, empty = pattern(depth - 1)
+        if op == 'ab':
+            y, also_empty = pattern(depth - 1)
+            return x + y, empty and also_empty
+        if op == 'a|b':
+            y, also_empty = pattern(depth - 1)
+            return '({}|{})'.format(x, y), empty or also_empty
+        if op == '(a)' or empty and op in ('a*', 'a+'):
+            return '({})'.format(x), empty
+        return '({}){}'.format(x, op[1]), empty or op != 'a+'
+
+    for _ in range(300):
+        text = ''.join(rng.choice('abc') for _ in range(rng.randint(0, 10)))
+        regex = Regex(pattern(4)[0])
+        compiled = re.compile(regex.pattern)
+        match = regex.search(text)
+        if match is None:
+            assert compiled.search(text) is None
+            continue
+        expected = compiled.fullmatch(text, *match.span())
+        assert [match.span(group) for group in range(regex.groups + 1)] == \
+            list(expected.regs), (regex.pattern, text)
+
+
+def test_long_input_and_many_groups():
+    regex = Regex('(' * 50 + 'a' + ')*' * 50 + '(b)')
+    match = regex.search('a' * 5000 + 'b')
+    assert match.span(50) == (4999, 5000)
+    assert match.span(51) == (5000, 5001)
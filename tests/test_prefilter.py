@@ -0,0 +1,77 @@
+import pytest
+
+from rematch import Regex, parse
+from rematch.prefilter import prefilter, analyze
+
+
+def required(pattern):
+    return set(prefilter(parse(pattern))[0])
+
+
+def prefix(pattern):
+    return prefilter(parse(pattern))[1]
+
+
+def test_analyze_raises_for_unknown_object():
+    with pytest.raises(TypeError):
+        analyze(object())
+
+
+def test_literal_runs_are_required():
+    assert required('error.*timeout') == {'error', 'timeout'}
+    assert required('abc') == {'abc'}
+    assert required('a.b') == {'a', 'b'}
+
+
+def test_nothing_required_under_star_or_optional():
+    assert required('(abc)*') == set()
+    assert required('x*') == set()
+    assert required('') == set()
+
+
+def test_common_factors_of_choices():
+    assert required('(foo|bar)baz') == {'baz'}
+    assert required('(xerror.*|.*errory)z') == {'error', 'z'}
+    # the exact alternatives share a prefix and a suffix
+    assert required('(foobar|fooxbar)') == {'foo', 'bar'}
+
+
+def test_substrings_are_dropped():
+    assert required('(abcd.*|.*bc)') == {'bc'}
+
+
+def test_literal_prefix():
+    assert prefix('error.*timeout') == 'error'
+    assert prefix('ab+') == 'ab'
+    assert prefix('(abc|abd)x') == 'ab'
+    assert prefix('a*b') == ''
+    assert prefix('.a') == ''
+
+
+def test_regex_rejects_without_running_the_engine():
+    RE = Regex('error.*timeout')
+    assert RE.required == ('timeout', 'error')
+    assert not RE('error: no such file')
+    assert len(RE.dfa) == 2
+    assert RE('error: timeout')
+
+
+def test_search_uses_required_literals_and_prefix():
+    RE = Regex('error.*timeout')
+    line = 'x' * 1000 + 'error after timeout' + 'x' * 10
+    assert RE.search(line).span() == (1000, 1019)
+    assert RE.search('error' * 100) is None
+    assert Regex('ab+c').findall('xxabbcxabcxac') == ['abbc', 'abc']
+
+
+def test_counted_repetition():
+    assert required('(ab){3}c') == {'abababc'}
+    assert prefix('(ab){2,}c') == 'abab'
+    assert required('x(ab){0,3}y') == {'x', 'y'}
+    assert required('(ab|cb){2}') == {'b'}
+
+
+def test_literal_tries():
+    assert required('x(foo|fab|fun)y') == {'xf', 'y'}
+    words = ['ab{:03d}cd'.format(number) for number in range(100)]
+    assert required('|'.join(words)) == {'ab0', 'cd'}
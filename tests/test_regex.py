@@ -1,4 +1,7 @@
+import random
+import re
 import string
+import sys
 import pytest
 
 from rematch import Regex
@@ -94,3 +97,161 @@ def test_pathological():
     RE = Regex(pattern)
     assert RE(match)
     assert not RE(match + 'aa')
+
+
+def brute_force_search(RE, string, pos=0):
+    """ leftmost-longest by trying every span """
+    for start in range(pos, len(string) + 1):
+        for end in range(len(string), start - 1, -1):
+            if RE(string[start:end]):
+                return start, end
+    return None
+
+
+def test_search_finds_leftmost_longest():
+    RE = Regex('a|ab')
+    assert RE.search('xxab').span() == (2, 4)
+    RE = Regex('b*')
+    assert RE.search('abbb').span() == (0, 0)
+    RE = Regex('ab*c')
+    match = RE.search('zzabbbcabc')
+    assert match.span() == (2, 7)
+    assert match.group() == 'abbbc'
+    assert RE.search('zzabbb') is None
+
+
+def test_search_agrees_with_brute_force():
+    strings = ['', 'a', 'abcabc', 'cabbage', 'bbbaaac', 'abacabad', 'dcba']
+    for pattern in ('ab*', 'a(b|c)', '(a|b)*c', 'b?a', 'c.a', 'a*b*', 'ba+d'):
+        RE = Regex(pattern)
+        for string in strings:
+            for pos in range(len(string) + 1):
+                match = RE.search(string, pos)
+                expected = brute_force_search(RE, string, pos)
+                assert (match and match.span()) == expected, (pattern, string)
+
+
+def test_findall():
+    assert Regex('ab*').findall('abbxaab') == ['abb', 'a', 'ab']
+    assert Regex('x').findall('abc') == []
+    # empty matches behave as they do in `re`
+    assert Regex('a*').findall('baab') == ['', 'aa', '', '']
+    assert Regex('a*').findall('ab') == ['a', '', '']
+
+
+def test_finditer_spans():
+    spans = [m.span() for m in Regex('(a|b)+').finditer('ab-ba--a')]
+    assert spans == [(0, 2), (3, 5), (7, 8)]
+
+
+def test_finditer_converts_the_text_once(monkeypatch):
+    import rematch.alphabet
+    calls = []
+
+    def counting(data):
+        calls.append(data)
+        return code_array(data)
+    code_array = rematch.alphabet.code_array
+    for module in ('rematch.regex', 'rematch.compact', 'rematch.pike'):
+        monkeypatch.setattr(module + '.code_array', counting)
+    RE = Regex('x(a|b)+')
+    text = 'xab-xba--xa' * 50
+    matches = list(RE.finditer(text))
+    assert len(matches) == 150
+    assert [m.group(1) for m in matches[:3]] == ['b', 'a', 'a']
+    assert len(calls) == 1
+
+
+@pytest.mark.parametrize('mode', ['lazy', 'dfa', 'nfa', 'glushkov'])
+def test_pos_is_clamped_like_re(mode):
+    for pattern in ('ab', 'foo|bar', 'a*', 'x(a|b)'):
+        RE, compiled = Regex(pattern, mode=mode), re.compile(pattern)
+        for string in ('xxabcfoo', 'ab', 'xa', ''):
+            for pos in (-100, -1, 0, len(string), len(string) + 1, 100):
+                found = RE.search(string, pos)
+                expected = compiled.search(string, pos)
+                assert (found and found.span()) == \
+                    (expected and expected.span()), (pattern, string, pos)
+                found = RE.match(string, pos)
+                expected = compiled.match(string, pos)
+                assert (found and found.span()) == \
+                    (expected and expected.span()), (pattern, string, pos)
+                assert RE.findall(string, pos) == \
+                    [m.group() for m in compiled.finditer(string, pos)]
+    RE = Regex(b'ab')
+    assert RE.search(memoryview(b'xab'), -5).span() == (1, 3)
+    assert RE.search(b'xab', 10) is None
+
+
+@pytest.mark.parametrize('mode', ['lazy', 'nfa', 'glushkov'])
+def test_fullmatch(mode):
+    RE = Regex('x(a|b)+', mode=mode)
+    found = RE.fullmatch('xab')
+    assert found.span() == (0, 3) and found.group(1) == 'b'
+    assert RE.fullmatch('xabc') is None
+    assert RE.match('xabc').span() == (0, 3)
+    assert RE.fullmatch('--xba', 2).span() == (2, 5)
+    assert RE.fullmatch('--xba', -9) is None
+    assert RE.fullmatch('--xbac', 2) is None
+
+
+def test_search_is_linear():
+    # every offset starts a candidate that only dies at the very end
+    RE = Regex('a*b')
+    assert RE.search('a' * 20000) is None
+    assert RE.search('a' * 20000 + 'b').span() == (0, 20001)
+
+
+@pytest.mark.parametrize('mode', ['lazy', 'dfa', 'nfa'])
+def test_char_classes_agree_with_re(mode):
+    rng = random.Random(14)
+    alphabet = 'abcxyz-]^09 Ѐ\U0001f600'
+    for pattern in ('[a-c]+', '[^a-c]*x', r'[\]\-^]+', r'[\d ]*z',
+                    r'\w+\s?\S', r'[Ѐ-\U0001f600]+a', r'[^\x00-￿]'):
+        RE = Regex(pattern, mode=mode)
+        compiled = re.compile(pattern, re.ASCII)
+        for _ in range(100):
+            text = ''.join(rng.choice(alphabet)
+                             for _ in range(rng.randrange(6)))
+            assert RE(text) == bool(compiled.fullmatch(text)), \
+                (pattern, text)
+
+
+def test_huge_class_compiles_to_ranges():
+    RE = Regex(r'[\x00-￿]+')
+    assert len(RE.alphabet) <= 3
+    assert RE('￿\x00abc')
+    assert not RE('\U00010000')
+
+
+@pytest.mark.parametrize('mode', ['lazy', 'dfa', 'nfa'])
+def test_counted_repetition_agrees_with_re(mode):
+    rng = random.Random(15)
+    for pattern in ('a{3}', 'a{2,}b', 'a{,2}b', '(ab){1,3}', '(a|b){2,4}c',
+                    '(a?){3}a{3}', '((ab){2}c){1,2}', '(a*b){2}', 'x{0}a',
+                    '[ab]{2,3}(c|a){0,2}'):
+        RE = Regex(pattern, mode=mode)
+        compiled = re.compile(pattern)
+        for _ in range(200):
+            text = ''.join(rng.choice('abcx')
+                           for _ in range(rng.randrange(10)))
+            assert RE(text) == bool(compiled.fullmatch(text)), \
+                (pattern, text)
+
+
+def test_large_counts_compile_quickly():
+    RE = Regex(r'\d{1,64}x{300}')
+    assert RE.program.n < 1000
+    assert RE('1' * 64 + 'x' * 300)
+    assert not RE('1' * 65 + 'x' * 300)
+
+
+def test_long_patterns_compile():
+    length = 10 * sys.getrecursionlimit()
+    text = ''.join(random.Random(16).choice('abc') for _ in range(length))
+    RE = Regex(text + '|' + '|'.join(['x*y'] * (length // 10)))
+    assert RE(text) and RE('xxy')
+    assert not RE(text[:-1])
+    RE = Regex('(' * length + text + ')' * length)
+    assert RE(text)
+    assert RE.prefix == text[:len(RE.prefix)]
@@ -0,0 +1,38 @@
+from rematch import Regex, RegexSet
+
+from conftest import all_strings
+
+PATTERNS = ['ab*', 'a(b|c)', '(a|b)*c', 'ca', 'b?a', '']
+
+
+def test_match_agrees_with_separate_regexes():
+    regexes = [Regex(pattern) for pattern in PATTERNS]
+    regex_set = RegexSet(PATTERNS)
+    assert len(regex_set) == len(PATTERNS)
+    for string in all_strings('abc', 5):
+        expected = [i for i, RE in enumerate(regexes) if RE(string)]
+        assert regex_set.match(string) == expected, string
+
+
+def test_search_agrees_with_separate_regexes():
+    regexes = [Regex(pattern) for pattern in PATTERNS[:-1]]
+    regex_set = RegexSet(PATTERNS[:-1])
+    for string in all_strings('abc', 5):
+        expected = [i for i, RE in enumerate(regexes) if RE.search(string)]
+        assert regex_set.search(string) == expected, string
+
+
+def test_search_first_hit_stops_early():
+    regex_set = RegexSet(['needle', 'x+y', 'hay'])
+    haystack = 'hay' + 'x' * 50 + 'y' + 'needle'
+    assert regex_set.search(haystack) == [0, 1, 2]
+    assert regex_set.search(haystack, first=True) == [2]
+    assert regex_set.search('nothing here') == []
+
+
+def test_one_pass_for_many_patterns():
+    words = ['word{}'.format(n) for n in range(200)]
+    regex_set = RegexSet(words)
+    assert regex_set.match('word123') == [123]
+    assert regex_set.search('a word7 and a word42') == [4, 7, 42]
+    assert regex_set.match('word') == []
@@ -0,0 +1,186 @@
+import asyncio
+import subprocess
+import sys
+
+import pytest
+
+from rematch import Regex, write_bundle
+from rematch.server import (Client, RemoteError, Server, HEADER,
+                            read_message, write_message)
+
+
+def serve(tmp_path, test, **options):
+    path = str(tmp_path / 'rematch.sock')
+
+    async def main():
+        async with Server(path, **options) as server:
+            async with await Client.connect(path) as client:
+                return await test(server, client)
+    return asyncio.run(main())
+
+
+def test_requests(tmp_path):
+    async def test(server, client):
+        assert await client.match('ab*c', 'abbc') is True
+        assert await client.match('ab*c', 'abx') is False
+        assert await client.search('error.*timeout',
+                                   'an error and a timeout!') == (3, 22)
+        assert await client.search('x+', 'abc') is None
+        assert await client.search('a', 'aXa', pos=1) == (2, 3)
+        assert await client.findall('[0-9]+', 'a1b22c333') == ['1', '22',
+                                                               '333']
+        assert await client.match('(a|b)*abb', 'babb', mode='dfa')
+        assert server.compile('(a|b)*abb', 'dfa').mode == 'dfa'
+        assert server.requests == 7
+    serve(tmp_path, test)
+
+
+def test_errors(tmp_path):
+    async def test(server, client):
+        with pytest.raises(RemoteError, match='ValueError'):
+            await client.match('(ab', 'ab')
+        with pytest.raises(RemoteError, match='unknown op'):
+            await client.request('replace', 'a', 'a')
+        with pytest.raises(RemoteError, match='mode'):
+            await client.match('a', 'a', mode='backtrack')
+        with pytest.raises(RemoteError, match='strings'):
+            await client.match(['a'], 'a')
+        # the connection is still good
+        assert await client.match('a', 'a')
+    serve(tmp_path, test)
+
+
+def test_unexpected_errors_are_answered(tmp_path, monkeypatch):
+    import rematch.server
+
+    def broken(regex, request):
+        if request['text'] == 'boom':
+            raise RuntimeError('engine failure')
+        return regex(request['text'])
+    monkeypatch.setattr(rematch.server, 'run', broken)
+
+    async def test(server, client):
+        with pytest.raises(RemoteError, match='RuntimeError'):
+            await client.match('a', 'boom')
+        assert await client.match('a', 'a')
+        # a failed compile answers the whole batch
+        server.compile = lambda pattern, mode=None: 1 // 0
+        with pytest.raises(RemoteError, match='ZeroDivisionError'):
+            await client.match('b', 'b')
+    serve(tmp_path, test)
+
+
+def test_pipelined_requests_are_batched(tmp_path):
+    async def test(server, client):
+        texts = ['line {} {}'.format(n, 'ok' if n % 3 else 'fail')
+                 for n in range(200)]
+        results = await asyncio.gather(*(client.match('line [0-9]+ ok', text)
+                                         for text in texts))
+        assert results == [n % 3 != 0 for n in range(200)]
+        assert server.requests == 200
+        assert server.batches < 20
+    serve(tmp_path, test)
+
+
+def test_several_clients(tmp_path):
+    async def test(server, client):
+        others = [await Client.connect(server.path) for _ in range(5)]
+        try:
+            results = await asyncio.gather(*(
+                other.search('[a-z]+@[a-z]+', 'mail joe@example now')
+                for other in others))
+        finally:
+            for other in others:
+                await other.close()
+        assert results == [(5, 16)] * 5
+    serve(tmp_path, test)
+
+
+def test_bundle(tmp_path):
+    bundle = str(tmp_path / 'rules.rmx')
+    write_bundle(bundle, [Regex('GET /[a-z]+', mode='dfa')])
+
+    async def test(server, client):
+        assert await client.match('GET /[a-z]+', 'GET /index')
+        assert server.compile('GET /[a-z]+').mode == 'dfa'
+        assert not server._compiled
+    serve(tmp_path, test, bundle=bundle)
+
+
+def test_raw_protocol(tmp_path):
+    async def test(server, client):
+        reader, writer = await asyncio.open_unix_connection(server.path)
+        write_message(writer, {'id': 'a', 'op': 'match', 'pattern': 'x',
+                               'text': 'x'})
+        write_message(writer, ['not', 'a', 'request'])
+        # answers come as requests finish, not necessarily in order
+        replies = [await read_message(reader), await read_message(reader)]
+        replies.sort(key=lambda reply: reply['id'] is None)
+        assert replies[0] == {'id': 'a', 'result': True}
+        assert replies[1]['id'] is None and 'error' in replies[1]
+        # an oversized message drops the connection
+        writer.write(HEADER.pack(2 ** 31))
+        assert await read_message(reader) is None
+        writer.close()
+    serve(tmp_path, test)
+
+
+def test_truncated_message(tmp_path):
+    async def test(server, client):
+        errors = []
+        asyncio.get_running_loop().set_exception_handler(
+            lambda loop, context: errors.append(context))
+        reader, writer = await asyncio.open_unix_connection(server.path)
+        # the client hangs up partway through a message
+        writer.write(HEADER.pack(100) + b'{"id": 1, "op"')
+        await writer.drain()
+        writer.close()
+        await writer.wait_closed()
+        for _ in range(100):
+            if len(server._connections) == 1:
+                break
+            await asyncio.sleep(0.01)
+        assert len(server._connections) == 1
+        assert await client.match('a', 'a')
+        assert errors == []
+    serve(tmp_path, test)
+
+
+def test_client_skips_replies_that_are_not_objects(tmp_path):
+    path = str(tmp_path / 'odd.sock')
+
+    async def odd(reader, writer):
+        request = await read_message(reader)
+        write_message(writer, ['not', 'a', 'reply'])
+        write_message(writer, 7)
+        write_message(writer, {'id': request['id'], 'result': True})
+        await writer.drain()
+        await read_message(reader)
+        writer.close()
+
+    async def main():
+        server = await asyncio.start_unix_server(odd, path=path)
+        async with server:
+            async with await Client.connect(path) as client:
+                return await client.match('a', 'a')
+    assert asyncio.run(main()) is True
+
+
+def test_main(tmp_path):
+    path = str(tmp_path / 'main.sock')
+    process = subprocess.Popen([sys.executable, '-m', 'rematch.server',
+                                '--socket', path])
+    try:
+        async def main():
+            for _ in range(100):
+                try:
+                    client = await Client.connect(path)
+                    break
+                except OSError:
+                    await asyncio.sleep(0.05)
+            async with client:
+                return await client.findall('b+', 'abbcb')
+        assert asyncio.run(main()) == ['bb', 'b']
+    finally:
+        process.terminate()
+        process.wait()
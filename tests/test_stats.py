@@ -0,0 +1,95 @@
+import pickle
+import random
+
+import pytest
+
+from rematch import Regex, Stats
+
+
+@pytest.mark.parametrize('mode', ['lazy', 'dfa', 'nfa', 'codegen',
+                                  'glushkov'])
+def test_stats_agree_with_matching(mode):
+    rng = random.Random(13)
+    # nothing to prefilter on, so every string reaches the engine
+    plain = Regex('(a|b)*(c|d)', mode=mode)
+    counted = Regex('(a|b)*(c|d)', mode=mode)
+    stats = counted.enable_stats()
+    assert isinstance(stats, Stats)
+    assert counted.stats is stats
+    strings = [''.join(rng.choice('abcd') for _ in range(rng.randrange(10)))
+               for _ in range(100)]
+    for string in strings:
+        assert counted(string) == plain(string), string
+    assert stats.calls == len(strings)
+    assert stats.matches == sum(map(plain, strings))
+    assert stats.consumed <= sum(map(len, strings))
+    assert stats.early_exits > 0
+    assert stats.transitions > 0
+    assert stats.nfa_states == counted.program.n
+
+
+def test_stats_count_lazy_cache():
+    RE = Regex('(a|b)*abb')
+    stats = RE.enable_stats()
+    RE('abababb')
+    misses = stats.cache_misses
+    assert misses and stats.transitions and stats.closures
+    RE('abababb')
+    assert stats.cache_misses == misses
+    assert stats.cache_hits + stats.cache_misses == 14
+    assert sum(stats.active_sizes.values()) == 14
+    assert stats.consumed == 14
+
+
+def test_stats_stop_at_dead_state():
+    RE = Regex('ab*c', mode='nfa')
+    stats = RE.enable_stats()
+    assert not RE('acxxxxxx')
+    assert stats.consumed == 3
+    assert stats.early_exits == 1
+    assert sum(stats.active_sizes.values()) == 3
+
+
+def test_stats_count_glushkov_steps():
+    RE = Regex('ab*c', mode='glushkov')
+    stats = RE.enable_stats()
+    assert not RE('acxxxxxx')
+    # one bit-parallel step per character, from one active position each
+    assert stats.consumed == stats.transitions == 3
+    assert stats.early_exits == 1
+    assert stats.active_sizes == {1: 3}
+    assert stats.closures == 0
+    assert RE('abbc') and stats.matches == 1
+    RE.disable_stats()
+    assert RE._match == RE.glushkov.match
+
+
+def test_stats_hook():
+    seen = []
+    RE = Regex('ab*')
+    RE.enable_stats(hook=lambda regex, stats: seen.append(
+        (regex.pattern, stats.as_dict()['calls'])))
+    RE('abb')
+    RE('a')
+    assert seen == [('ab*', 1), ('ab*', 2)]
+
+
+def test_disable_stats():
+    RE = Regex('ab*')
+    RE.enable_stats()
+    RE('abbb')
+    stats = RE.disable_stats()
+    assert stats.consumed == 4
+    assert RE.stats is None
+    assert RE('abbb') and stats.consumed == 4
+    assert RE.dfa.step == RE.program.step
+    stats.reset()
+    assert stats.as_dict()['consumed'] == 0
+
+
+def test_stats_are_not_pickled():
+    RE = Regex('ab*', mode='dfa')
+    RE.enable_stats()
+    copy = pickle.loads(pickle.dumps(RE))
+    assert copy.stats is None
+    assert copy('abb')
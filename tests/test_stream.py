@@ -0,0 +1,85 @@
+import random
+
+import pytest
+
+from rematch import Regex, Stream
+
+
+def chunks(string, size):
+    return [string[i:i + size] for i in range(0, len(string), size)]
+
+
+@pytest.mark.parametrize('mode', ['lazy', 'dfa', 'nfa'])
+def test_stream_agrees_with_call(mode):
+    rng = random.Random(5)
+    for pattern in ('(a|b)*abb', 'ab*(c|d)?', 'a.c', '(ab)*'):
+        RE = Regex(pattern, mode=mode)
+        for _ in range(50):
+            string = ''.join(rng.choice('abcd')
+                             for _ in range(rng.randrange(12)))
+            stream = RE.stream()
+            assert isinstance(stream, Stream)
+            for chunk in chunks(string, rng.randrange(1, 4)):
+                stream.feed(chunk)
+            assert stream.finish() == RE(string), (pattern, string)
+            assert stream.consumed == len(string)
+
+
+@pytest.mark.parametrize('mode', ['lazy', 'dfa', 'nfa'])
+def test_stream_reports_dead_early(mode):
+    stream = Regex('ab*c', mode=mode).stream()
+    assert stream.feed('abb') is None
+    assert not stream.decided
+    assert stream.feed('x') is False
+    assert stream.decided
+    assert stream.feed('bbc') is False
+    assert stream.finish() is False
+
+
+@pytest.mark.parametrize('mode', ['lazy', 'dfa', 'nfa'])
+def test_stream_reports_universal_acceptance_early(mode):
+    stream = Regex('error.*', mode=mode).stream()
+    assert stream.feed('err') is None
+    assert stream.feed('or: anything at all') is True
+    assert stream.matched is True
+    assert stream.finish() is True
+
+
+def test_matched_is_none_until_known():
+    stream = Regex('a*').stream()
+    # 'a*' accepts now, but a 'b' would still make it fail
+    assert stream.matched is None
+    stream.feed('aaa')
+    assert stream.matched is None
+    assert stream.finish() is True
+    assert Regex('.*').stream().matched is True
+
+
+def test_stream_is_constant_memory():
+    RE = Regex('(a|b)*abb')
+    stream = RE.stream()
+    for _ in range(1000):
+        stream.feed('ab' * 50)
+    stream.feed('abb')
+    assert stream.finish()
+    assert len(RE.dfa) < 10
+
+
+def test_cannot_feed_finished_stream():
+    stream = Regex('a').stream()
+    stream.finish()
+    with pytest.raises(ValueError):
+        stream.feed('a')
+
+
+def test_stream_survives_cache_flushes():
+    pattern = '(a|b)*a(a|b)(a|b)(a|b)(a|b)'
+    RE = Regex(pattern, cache_size=4)
+    rng = random.Random(7)
+    for _ in range(30):
+        string = ''.join(rng.choice('ab') for _ in range(20))
+        stream = RE.stream()
+        for chunk in chunks(string, 3):
+            stream.feed(chunk)
+        assert stream.finish() == Regex(pattern, mode='nfa')(string)
+    assert RE.dfa.flushes > 0
@@ -0,0 +1,124 @@
+import pickle
+import random
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from threading import Barrier
+
+import pytest
+
+from rematch import Bundle, Regex, State, write_bundle
+from rematch.dfa import LazyDFA
+
+THREADS = 8
+
+
+@pytest.fixture(autouse=True)
+def switch_often():
+    # hand the GIL over every few bytecodes, so threads interleave inside
+    # the engines rather than between whole matches
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(interval)
+
+
+def together(func, count=THREADS):
+    """ Run `func(number)` on `count` threads released at the same moment,
+    returning the results in order.
+    """
+    barrier = Barrier(count)
+
+    def run(number):
+        barrier.wait()
+        return func(number)
+    with ThreadPoolExecutor(count) as pool:
+        return list(pool.map(run, range(count)))
+
+
+def texts(seed, count=200):
+    rng = random.Random(seed)
+    return [''.join(rng.choice('abc') for _ in range(rng.randrange(30)))
+            for _ in range(count)]
+
+
+def test_state_ids_are_unique_across_threads():
+    made = together(lambda number: [State().id for _ in range(2000)])
+    ids = [id for ids in made for id in ids]
+    assert len(ids) == len(set(ids))
+
+
+@pytest.mark.parametrize('cache_size', [2, 4, 1024])
+def test_shared_lazy_dfa(cache_size):
+    # small caches flush while other threads are still matching in them
+    pattern = '(a|b)*a(a|b)(a|b)(a|b)c*'
+    shared = Regex(pattern, cache_size=cache_size)
+    nfa = Regex(pattern, mode='nfa')
+
+    def check(number):
+        return [(text, shared(text)) for text in texts(number)]
+    for results in together(check):
+        for text, found in results:
+            assert found == nfa(text), text
+    assert shared.dfa.flushes or cache_size == 1024
+
+
+def test_lazy_dfa_publishes_interned_states():
+    shared = Regex('(a|b|c)*c(a|b|c){4}')
+    dfa = shared.dfa
+
+    def walk(number):
+        for text in texts(number):
+            cache, sid = dfa.feed(dfa.start_position(), text.encode())
+            # a transition is only published once its target is interned
+            assert sid < len(cache.sets) == len(cache.accepting)
+        return True
+    assert all(together(walk))
+    cache = dfa._cache
+    for row in cache.trans:
+        assert all(target < len(cache.sets) for target in row.values()
+                   if target is not None)
+
+
+@pytest.mark.parametrize('mode', ['dfa', 'codegen', 'glushkov', 'nfa'])
+def test_shared_regex(mode):
+    pattern = '(a|b)*a(a|b)c*'
+    shared = Regex(pattern, mode=mode)
+    nfa = Regex(pattern, mode='nfa')
+
+    def check(number):
+        return [(text, shared(text), shared.findall(text))
+                for text in texts(number, 50)]
+    for results in together(check):
+        for text, found, every in results:
+            assert found == nfa(text)
+            assert every == nfa.findall(text)
+
+
+def test_lazy_attributes_are_built_once():
+    regex = Regex('x(a|b)*y')
+    dfas = together(lambda number: regex.full_dfa)
+    pikes = together(lambda number: regex.pike)
+    assert all(dfa is dfas[0] for dfa in dfas)
+    assert all(pike is pikes[0] for pike in pikes)
+
+
+def test_unpickled_lazy_dfa_gets_a_lock():
+    dfa = Regex('(a|b)*abb').dfa
+    dfa.match(b'abb')
+    copy = pickle.loads(pickle.dumps(dfa))
+    assert isinstance(copy, LazyDFA)
+    # the cache is left behind, and refills on use
+    assert len(copy) == 2
+    assert together(lambda number: copy.match(b'aabb')) == [True] * THREADS
+
+
+def test_bundle_loads_each_pattern_once(tmp_path):
+    path = str(tmp_path / 'rules.rmx')
+    patterns = ['error.*timeout', '(a|b)*abb', 'foo|bar|baz']
+    write_bundle(path, [Regex(pattern) for pattern in patterns])
+    with Bundle(path) as bundle:
+        found = together(lambda number:
+                         bundle.get(patterns[number % len(patterns)]))
+        for number, regex in enumerate(found):
+            assert regex is bundle.get(patterns[number % len(patterns)])
+        assert found[1]('aabb')
@@ -0,0 +1,98 @@
+import pickle
+import random
+
+from rematch import Regex, Trie
+
+
+def test_failure_links():
+    trie = Trie(['he', 'she', 'his', 'hers'])
+    goto, fail = trie.goto, trie.fail
+
+    def node(string):
+        current = 0
+        for ch in string:
+            current = goto[current][ord(ch)]
+        return current
+
+    assert fail[node('she')] == node('he')
+    assert fail[node('sh')] == node('h')
+    assert fail[node('hers')] == node('s')
+    assert fail[node('his')] == node('s')
+    # 'she' ends with 'he', which is one of the strings too
+    assert trie.ends[node('she')] == 3
+    assert trie.ends[node('sh')] == 0
+
+
+def test_search_is_leftmost_longest():
+    trie = Trie(['bc', 'abcd', 'cde'])
+    assert trie.search('xabcdex') == (1, 5)
+    assert trie.search('xabcx') == (2, 4)
+    assert trie.search('xabcx', 3) is None
+    trie = Trie(['a', 'ab', 'abc'])
+    assert trie.search('zabcd') == (1, 4)
+    assert trie.search('zabd') == (1, 3)
+
+
+def test_search_bytes():
+    trie = Trie(['\xff\x00', 'ab'])
+    assert trie.search(b'xx\xff\x00') == (2, 4)
+    assert trie.search(bytearray(b'zab')) == (1, 3)
+
+
+def test_agrees_with_program_search():
+    rng = random.Random(3)
+    for _ in range(300):
+        words = {''.join(rng.choice('abc') for _ in range(rng.randint(1, 4)))
+                 for _ in range(rng.randint(2, 8))}
+        pattern = '|'.join(words)
+        plain = Regex(pattern, optimize=False)
+        trie = Trie(words)
+        text = ''.join(rng.choice('abcx') for _ in range(rng.randint(0, 12)))
+        for pos in range(len(text) + 1):
+            expected = plain.search(text, pos)
+            assert trie.search(text, pos) == (expected and expected.span())
+
+
+def test_regex_uses_trie_for_literal_alternations():
+    words = ['w{:05d}x'.format(number) for number in range(5000)]
+    regex = Regex('|'.join(words))
+    assert len(regex.trie) == 5000
+    assert regex.findall('a w00042x b w04999x w5000x') == ['w00042x',
+                                                            'w04999x']
+    assert regex('w01234x')
+    assert not regex('w01234')
+    # the trie shares prefixes: a few states per alternative, not a dozen
+    assert regex.program.n < 5 * len(words)
+    assert Regex('a|b.').trie is None
+    assert Regex('foo|bar', optimize=False).trie is None
+
+
+def test_pickle():
+    trie = Trie(['foo', 'bar'])
+    copy = pickle.loads(pickle.dumps(trie))
+    assert copy.search('xxbar') == (2, 5)
+    regex = pickle.loads(pickle.dumps(Regex('foo|bar')))
+    assert regex.trie.words == ('bar', 'foo')
+    assert regex.search('a foo').span() == (2, 5)
+
+
+def test_negative_pos_counts_as_zero():
+    trie = Trie(['foo', 'bar'])
+    assert trie.search('xxabcfoo', -100) == (5, 8)
+    assert trie.search('foox', -1) == (0, 3)
+
+
+def test_finditer_converts_the_text_once(monkeypatch):
+    import rematch.alphabet
+    calls = []
+
+    def counting(data):
+        calls.append(data)
+        return code_array(data)
+    code_array = rematch.alphabet.code_array
+    for module in ('rematch.regex', 'rematch.trie'):
+        monkeypatch.setattr(module + '.code_array', counting)
+    RE = Regex('foo|bar')
+    assert RE.trie is not None
+    assert RE.findall('xxfooxbarx' * 100) == ['foo', 'bar'] * 100
+    assert len(calls) == 1
@@ -0,0 +1,74 @@
+import pytest
+
+from rematch import Regex
+
+np = pytest.importorskip('numpy')
+
+WORDS = ['', 'a', 'ab', 'abb', 'aabb', 'babb', 'abba', 'abbb', 'cabb', 'x' * 9]
+
+
+@pytest.mark.parametrize('mode', ['lazy', 'dfa', 'nfa'])
+def test_match_array_str(mode):
+    RE = Regex('(a|b)*abb', mode=mode)
+    mask = RE.match_array(np.array(WORDS))
+    assert mask.dtype == bool
+    assert mask.tolist() == [RE(word) for word in WORDS]
+
+
+def test_match_array_bytes():
+    RE = Regex(b'(a|b)*abb')
+    data = [word.encode() for word in WORDS]
+    assert RE.match_array(np.array(data)).tolist() == [RE(d) for d in data]
+
+
+def test_match_array_every_byte_named():
+    # 257 classes: too many for one byte each
+    RE = Regex(b'[\x00-\xfe]\xff|' +
+               ''.join('\\x%02x' % i for i in range(256)).encode())
+    codes = np.zeros((3, 256), dtype=np.uint8)
+    codes[0] = np.arange(256)
+    codes[1, :2] = [7, 255]
+    codes[2, :2] = [255, 255]
+    lengths = np.array([256, 2, 2])
+    assert RE.match_array(codes, lengths=lengths).tolist() == [
+        True, True, False]
+
+
+def test_match_array_padded_codes():
+    RE = Regex(b'ab*')
+    codes = np.zeros((4, 5), dtype=np.uint8)
+    for row, word in enumerate([b'a', b'abbbb', b'ba', b'']):
+        codes[row, :len(word)] = list(word)
+    assert RE.match_array(codes).tolist() == [True, True, False, False]
+
+
+def test_explicit_lengths_keep_trailing_nuls():
+    RE = Regex(b'a\x00*')
+    codes = np.array([[97, 0, 0], [97, 0, 0]], dtype=np.uint8)
+    lengths = np.array([3, 1])
+    assert RE.match_array(codes, lengths=lengths).tolist() == [True, True]
+    assert not Regex(b'a\x00')(b'a')
+    mask = Regex(b'a\x00').match_array(codes, lengths=np.array([2, 1]))
+    assert mask.tolist() == [True, False]
+
+
+def test_match_array_unicode_classes():
+    RE = Regex('é.*\U0001f600')
+    words = ['éx\U0001f600', 'é', 'e\U0001f600']
+    assert RE.match_array(np.array(words)).tolist() == [True, False, False]
+
+
+def test_match_array_rejects_wrong_dtype():
+    with pytest.raises(TypeError):
+        Regex('a').match_array(np.array([b'a']))
+    with pytest.raises(TypeError):
+        Regex(b'a').match_array(np.array(['a']))
+    with pytest.raises(TypeError):
+        Regex('a').match_array(np.array([1, 2]))
+
+
+def test_full_dfa_is_built_once():
+    RE = Regex('ab*')
+    assert RE.full_dfa is RE.full_dfa
+    dfa_re = Regex('ab*', mode='dfa')
+    assert dfa_re.full_dfa is dfa_re.dfa